@@ -0,0 +1,4 @@
+"""Performance benchmarks for the ZW parser, serializer and validators.
+
+Run with `python -m bench.run` from the repository root.
+"""
@@ -0,0 +1,176 @@
+# bench/corpus.py
+"""Deterministic generator of realistic ZW / ZWX corpora.
+
+Blocks are modelled on zw_mcp/prompts/blender_scene.zw and zw_mcp/mesh/*.zw:
+ZW-MESH parts with PARAMS/MATERIAL/METADATA, ZW-OBJECT, ZW-LIGHT, ZW-STAGE
+tracks with keyframe lists, ZW-COMPOSE attachments, `#` and `//` comments and
+`///` separators. The same (lines, seed) always produces the same text.
+"""
+import random
+from pathlib import Path
+from typing import Iterator, List
+
+MESH_TYPES = ("cube", "ico_sphere", "cylinder", "cone", "plane")
+TAGS = ("crystal", "stone", "ancient", "radiant", "platform", "sturdy", "small", "blue", "red", "magical")
+TRACK_TYPES = ("VISIBILITY", "PROPERTY_ANIM", "MATERIAL_OVERRIDE", "SHADER_SWITCH")
+COLLECTIONS = ("ModularParts_Structural", "ModularParts_Crystals", "StagingFX", "ShrineParts", "Scenery")
+
+
+def _vec(rng: random.Random, lo: float = -20.0, hi: float = 20.0) -> str:
+    return f"({rng.uniform(lo, hi):.2f}, {rng.uniform(lo, hi):.2f}, {rng.uniform(lo, hi):.2f})"
+
+
+def _hex(rng: random.Random) -> str:
+    return f'"#{rng.randrange(0x1000000):06X}"'
+
+
+def _mesh(rng: random.Random, i: int) -> List[str]:
+    mesh_type = rng.choice(MESH_TYPES)
+    lines = [
+        "ZW-MESH:",
+        f"  NAME: Part_{mesh_type}_{i}",
+        f"  TYPE: {mesh_type}",
+        "  PARAMS:",
+    ]
+    if mesh_type in ("cylinder", "cone"):
+        lines += [f"    VERTICES: {rng.choice((6, 8, 12, 24, 32))}",
+                  f"    RADIUS: {rng.uniform(0.1, 2):.2f}",
+                  f"    DEPTH: {rng.uniform(0.2, 3):.2f} // height"]
+    elif mesh_type == "ico_sphere":
+        lines += [f"    SUBDIVISIONS: {rng.randint(1, 4)}", f"    RADIUS: {rng.uniform(0.1, 2):.2f}"]
+    else:
+        lines += [f"    SIZE: {rng.uniform(0.5, 4):.1f}"]
+    lines += [
+        "  MATERIAL:",
+        f"    NAME: Mat_{i}",
+        f"    BASE_COLOR: {_hex(rng)}",
+        f"    EMISSION: {rng.uniform(0, 3):.2f}",
+        "    BSDF:",
+        f"      ROUGHNESS: {rng.random():.2f}",
+        f"  LOCATION: {_vec(rng)}",
+        f"  ROTATION: {_vec(rng, 0, 360)}",
+        f"  SCALE: {_vec(rng, 0.2, 3)}",
+        "  METADATA:",
+        f"    TAGS: [{', '.join(rng.sample(TAGS, 3))}]",
+        f'    DESCRIPTION: "Generated part {i}."',
+        f"  COLLECTION: {rng.choice(COLLECTIONS)}",
+    ]
+    return lines
+
+
+def _object(rng: random.Random, i: int) -> List[str]:
+    return [
+        "ZW-OBJECT:",
+        f"  TYPE: {rng.choice(('Cube', 'Sphere', 'Cylinder'))}",
+        f"  NAME: Object_{i}",
+        f"  LOCATION: {_vec(rng)}",
+        f"  MATERIAL: Mat_{rng.randrange(max(i, 1))}",
+        f"  COLOR: {_hex(rng)}",
+        f"  COLLECTION: {rng.choice(COLLECTIONS)}",
+    ]
+
+
+def _light(rng: random.Random, i: int) -> List[str]:
+    return [
+        "ZW-LIGHT:",
+        f"  NAME: Light_{i}",
+        f"  TYPE: {rng.choice(('POINT', 'SUN', 'SPOT', 'AREA'))}",
+        f"  LOCATION: {_vec(rng)}",
+        f"  ENERGY: {rng.randint(10, 2000)}",
+        f"  COLOR: {_hex(rng)}",
+    ]
+
+
+def _stage(rng: random.Random, i: int) -> List[str]:
+    lines = ["ZW-STAGE:", f'  NAME: "Stage_{i}"', "  TRACKS:"]
+    for t in range(rng.randint(1, 4)):
+        lines += [
+            f"    - TYPE: {rng.choice(TRACK_TYPES)}",
+            f'      TARGET: "Object_{rng.randrange(max(i, 1))}"',
+            '      PROPERTY_PATH: "data.energy"',
+            "      KEYFRAMES:",
+        ]
+        for frame in sorted(rng.sample(range(1, 250), 3)):
+            lines += [f"        - FRAME: {frame}", f"          VALUE: {rng.uniform(0, 1000):.1f}"]
+        lines.append("")
+    return lines
+
+
+def _compose(rng: random.Random, i: int) -> List[str]:
+    lines = [
+        "ZW-COMPOSE:",
+        f"  NAME: Assembly_{i}",
+        f"  BASE_MODEL: Part_cube_{rng.randrange(max(i, 1))}",
+        f"  LOCATION: {_vec(rng)}",
+        "  ATTACHMENTS:",
+    ]
+    for a in range(rng.randint(1, 3)):
+        lines += [
+            f"    - OBJECT: Part_cone_{rng.randrange(max(i, 1))}",
+            f"      LOCATION: {_vec(rng, -2, 2)}",
+            f"      ROTATION: {_vec(rng, 0, 90)}",
+            f"      SCALE: {_vec(rng, 0.5, 1.5)}",
+        ]
+        if rng.random() < 0.3:
+            lines += ["      MATERIAL_OVERRIDE:", f"        NAME: Override_{i}_{a}",
+                      f"        BASE_COLOR: {_hex(rng)}"]
+    return lines
+
+
+_BLOCKS = ((_mesh, 5), (_object, 3), (_light, 1), (_stage, 1), (_compose, 1))
+
+
+def iter_zw_lines(lines: int, seed: int = 0) -> Iterator[str]:
+    """Yields about `lines` lines of ZW (stopping at the first block boundary past it)."""
+    rng = random.Random(seed)
+    makers = [maker for maker, weight in _BLOCKS for _ in range(weight)]
+    emitted = 0
+    i = 0
+    yield "// Generated ZW benchmark corpus"
+    emitted += 1
+    while emitted < lines:
+        block = rng.choice(makers)(rng, i)
+        if rng.random() < 0.1:
+            block.insert(0, f"# block {i}")
+        block.append("///" if rng.random() < 0.5 else "")
+        for line in block:
+            yield line
+        emitted += len(block)
+        i += 1
+
+
+def generate_zw(lines: int, seed: int = 0) -> str:
+    return "\n".join(iter_zw_lines(lines, seed)) + "\n"
+
+
+def _zwx_header(lines: int) -> str:
+    return (
+        "ZW-INTENT:\n"
+        "  TARGET_SYSTEM: blender\n"
+        "  ROUTE_FILE: inline\n"
+        f'  DESCRIPTION: "Generated benchmark scene ({lines} lines)"\n'
+        "---\n"
+    )
+
+
+def generate_zwx(lines: int, seed: int = 0) -> str:
+    """A .zwx file: ZW-INTENT header, `---`, then a generated payload."""
+    return _zwx_header(lines) + generate_zw(lines, seed)
+
+
+def generate_intent_block(lines: int, seed: int = 0) -> str:
+    """An intent block with an inline, indented ZW-PAYLOAD, as validate_zw_intent_block sees it."""
+    payload = "\n".join("    " + line if line else "" for line in iter_zw_lines(lines, seed))
+    return f"TARGET_SYSTEM: Blender\nDESCRIPTION: Generated\nZW-PAYLOAD:\n{payload}\nPRIORITY: HIGH\n"
+
+
+def write_corpus(path, lines: int, seed: int = 0) -> Path:
+    """Writes a corpus file without holding it in memory (.zwx gets an intent header)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        if path.suffix == ".zwx":
+            f.write(_zwx_header(lines))
+        for line in iter_zw_lines(lines, seed):
+            f.write(line + "\n")
+    return path
@@ -0,0 +1,174 @@
+# bench/run.py
+"""Benchmark runner for parse_zw, to_zw, validate_zw and validate_zw_intent_block.
+
+Usage (from the repository root):
+    python -m bench.run                      # compare against bench/baseline.json
+    python -m bench.run --sizes 1000 1000000 # pick corpus sizes (lines)
+    python -m bench.run --update-baseline    # record the current numbers
+
+Throughput is the best single run out of at least --repeat runs that together
+take --min-seconds; peak memory is measured in a separate tracemalloc pass so it
+does not slow the timed runs. Any benchmark on a corpus of GATE_MIN_LINES or more
+that is more than --tolerance slower (or bigger) than the baseline fails the run.
+Smaller corpora finish in a few milliseconds, where timer and scheduler noise
+swamp real changes, so they are reported but never gated.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT / "zw_mcp"))
+sys.path.insert(0, str(PROJECT_ROOT / "tools"))
+
+import zw_parser  # noqa: E402
+from intent_utils import validate_zw_intent_block  # noqa: E402
+
+from bench.corpus import generate_intent_block, generate_zw  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_SIZES = (1000, 10000, 100000)
+GATE_MIN_LINES = 10000
+
+
+class Corpus:
+    def __init__(self, lines: int, seed: int):
+        self.lines = lines
+        self.text = generate_zw(lines, seed)
+        self.intent = generate_intent_block(lines, seed)
+        # Every block of the corpus, with repeated keys as lists, so to_zw writes all of it
+        self.tree = {}
+        for block in zw_parser.iter_zw_blocks(self.text):
+            self.tree.setdefault(block.key, []).append(block.value)
+        self.nbytes = len(self.text.encode("utf-8"))
+        self.nlines = self.text.count("\n")
+
+
+# name -> function(corpus); each one must do the full piece of work once
+BENCHMARKS = {
+    "parse_zw": lambda c: zw_parser.parse_zw(c.text, use_cache=False),
+    "iter_zw_blocks": lambda c: sum(1 for _ in zw_parser.iter_zw_blocks(c.text)),
+    "iter_zw_documents": lambda c: list(zw_parser.iter_zw_documents(c.text)),
+    "parse_zw_typed": lambda c: zw_parser.parse_zw(c.text, use_cache=False, typed=True),
+    "to_zw": lambda c: zw_parser.to_zw(c.tree),
+    "validate_zw": lambda c: zw_parser.validate_zw(c.text),
+    "validate_zw_intent_block": lambda c: validate_zw_intent_block(c.intent),
+}
+
+
+def measure(fn, corpus: Corpus, repeat: int, min_seconds: float) -> dict:
+    best = float("inf")
+    runs = 0
+    deadline = time.perf_counter() + min_seconds
+    while runs < repeat or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn(corpus)
+        best = min(best, time.perf_counter() - start)
+        runs += 1
+
+    tracemalloc.start()
+    try:
+        fn(corpus)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": round(best, 6),
+        "lines_per_s": round(corpus.nlines / best, 1),
+        "mb_per_s": round(corpus.nbytes / best / 1e6, 3),
+        "peak_kb": round(peak / 1024, 1),
+        "runs": runs,
+    }
+
+
+def run(sizes, repeat: int, seed: int, only=None, min_seconds: float = 0.5) -> dict:
+    results = {}
+    # Measure cold parses: nothing should be served from the shared parse cache
+    saved_min_bytes = zw_parser.PARSE_CACHE_MIN_BYTES
+    zw_parser.PARSE_CACHE_MIN_BYTES = float("inf")
+    try:
+        for lines in sizes:
+            corpus = Corpus(lines, seed)
+            print(f"\n📦 Corpus: {corpus.nlines} lines, {corpus.nbytes / 1e6:.2f} MB (seed {seed})")
+            for name, fn in BENCHMARKS.items():
+                if only and name not in only:
+                    continue
+                result = measure(fn, corpus, repeat, min_seconds)
+                results[f"{name}@{lines}"] = result
+                print(f"  {name:<26} {result['lines_per_s']:>13,.0f} lines/s "
+                      f"{result['mb_per_s']:>8.2f} MB/s   peak {result['peak_kb']:>10,.1f} KB")
+    finally:
+        zw_parser.PARSE_CACHE_MIN_BYTES = saved_min_bytes
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Returns a list of human-readable regressions against the baseline."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base or int(key.rsplit("@", 1)[1]) < GATE_MIN_LINES:
+            continue
+        if result["lines_per_s"] < base["lines_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: {result['lines_per_s']:,.0f} lines/s vs baseline {base['lines_per_s']:,.0f}")
+        # Ignore tiny absolute growth; tracemalloc noise dominates small corpora
+        if (result["peak_kb"] > base["peak_kb"] * (1 + tolerance)
+                and result["peak_kb"] - base["peak_kb"] > 64):
+            regressions.append(
+                f"{key}: peak {result['peak_kb']:,.1f} KB vs baseline {base['peak_kb']:,.1f} KB")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ZW parser/serializer benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Corpus sizes in lines (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="Minimum timed runs per benchmark (best is kept)")
+    parser.add_argument("--min-seconds", type=float, default=0.5,
+                        help="Keep timing each benchmark until this much time has passed (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus generator seed")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="Allowed slowdown / memory growth as a fraction (default: %(default)s)")
+    parser.add_argument("--update-baseline", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--json", type=Path, help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, args.seed, args.only, args.min_seconds)
+    report = {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(), "seed": args.seed},
+        "results": results,
+    }
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"\n📁 Baseline written to: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"\n[!] No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    regressions = compare(results, baseline.get("results", {}), args.tolerance)
+    if regressions:
+        print(f"\n❌ PERFORMANCE REGRESSION ({len(regressions)}) vs {args.baseline}:")
+        for line in regressions:
+            print(f"   - {line}")
+        return 1
+    print(f"\n✅ No regressions vs {args.baseline} "
+          f"(tolerance {args.tolerance:.0%}, corpora of {GATE_MIN_LINES:,}+ lines)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,12 @@
 import argparse
+import json
+import os
 import subprocess
 import sys
 import tempfile
 from pathlib import Path
 from typing import Optional
 #from tools.intent_utils import validate_zw_intent_block
-import datetime # Added for logging timestamp - UNCOMMENT THIS
 
 # Corrected sys.path modification:
 PROJECT_ROOT = Path(__file__).parent.parent.resolve()  # UNCOMMENT THIS
@@ -25,17 +26,43 @@ BLENDER_EXECUTABLE_PATH = "/home/tran/Downloads/blender-4.4.3-linux-x64/blender"
 LOG_DIR = PROJECT_ROOT / "zw_mcp" / "logs"  # This needs PROJECT_ROOT
 LOG_FILE = LOG_DIR / "orbit_exec.log"
 
+# Structural digest of the last payload routed per (target, source file); with --skip-unchanged
+# a re-save that only touches whitespace or comments does not relaunch Blender
+ROUTED_DIGESTS_FILE = PROJECT_ROOT / "zw_mcp" / "cache" / "orbit_routed.json"
+
+sys.path.insert(0, str(PROJECT_ROOT / "zw_mcp"))
+from zw_parser import iter_zw_blocks, zw_hash  # noqa: E402
+from zw_log import log_event  # noqa: E402
+
 def ensure_log_dir_exists():
     LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 def log_orbit_event(message: str):
-    ensure_log_dir_exists()
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"[{timestamp}] {message}\n"
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(log_entry)
+    # Queued for zw_log's writer thread; flushed at exit
+    log_event(LOG_FILE, "orbit", message=message)
 # --- End Logging Setup ---
 
+def payload_digest(zw_payload: str) -> str:
+    """Structural hash of a payload; repeated blocks are kept in order."""
+    return zw_hash([{block.key: block.value} for block in iter_zw_blocks(zw_payload or "")])
+
+
+def load_routed_digests() -> dict:
+    try:
+        return json.loads(ROUTED_DIGESTS_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def remember_routed_digest(route_key: str, digest: str):
+    digests = load_routed_digests()
+    digests[route_key] = digest
+    ROUTED_DIGESTS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = ROUTED_DIGESTS_FILE.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(digests, indent=2), encoding="utf-8")
+    os.replace(tmp_path, ROUTED_DIGESTS_FILE)
+
+
 def parse_zwx_file_and_extract_raw_intent(filepath: Path) -> tuple[Optional[str], dict, Optional[str]]:
     try:
         content = filepath.read_text(encoding="utf-8")
@@ -67,9 +94,16 @@ def parse_zwx_file_and_extract_raw_intent(filepath: Path) -> tuple[Optional[str]
     return raw_intent_str, intent_dict, payload_str
 
 
-def route_to_blender(zw_payload: str, source_file_name: str):
-    print("[EngAIn-Orbit] Routing to Blender...")
+def route_to_blender(zw_payload: str, source_file_name: str, skip_unchanged: bool = False):
     zw_payload_content = zw_payload if zw_payload is not None else ""
+    route_key = f"blender:{Path(source_file_name).resolve()}"
+    digest = payload_digest(zw_payload_content)
+    if skip_unchanged and load_routed_digests().get(route_key) == digest:
+        print(f"[EngAIn-Orbit] Payload unchanged since last run ({digest[:12]}), skipping Blender.")
+        log_orbit_event(f"⏭ Unchanged: {source_file_name} → Blender ({digest[:12]})")
+        return
+
+    print("[EngAIn-Orbit] Routing to Blender...")
     with tempfile.NamedTemporaryFile("w", suffix=".zw", delete=False, encoding='utf-8') as temp:
         temp.write(zw_payload_content)
         temp_path = temp.name
@@ -88,7 +122,8 @@ def route_to_blender(zw_payload: str, source_file_name: str):
             str(temp_path),
         ], check=True)
 
-        log_orbit_event(f"✔ Routed: {source_file_name} → Blender")
+        remember_routed_digest(route_key, digest)
+        log_orbit_event(f"✔ Routed: {source_file_name} → Blender ({digest[:12]})")
     except subprocess.CalledProcessError as e:
         print(f"[ERROR] Blender execution failed: {e}")
         log_orbit_event(f"❌ Execution FAILED: {source_file_name} → Blender - {e}")
@@ -107,7 +142,7 @@ def route_to_godot(zw_payload: str, source_file_name: str):
     log_orbit_event(f"🚧 Stubbed: {source_file_name} → Godot - Not implemented yet.")
 
 
-def execute_orbit(zwx_file: Path):
+def execute_orbit(zwx_file: Path, skip_unchanged: bool = False):
     raw_intent_str, parsed_intent_dict, payload_str = parse_zwx_file_and_extract_raw_intent(zwx_file)
 
     source_file_name = str(zwx_file) # For logging
@@ -144,7 +179,7 @@ def execute_orbit(zwx_file: Path):
         if payload_str and not raw_intent_str:
             print("[EngAIn-Orbit] Running direct ZW payload (no explicit ZW-INTENT block, defaulting to Blender)...")
             # Log for direct payload routing will be handled by route_to_blender
-            route_to_blender(payload_str, source_file_name)
+            route_to_blender(payload_str, source_file_name, skip_unchanged)
             return
         else:
             error_message = f"No TARGET_SYSTEM found in intent block: {source_file_name}"
@@ -161,7 +196,7 @@ def execute_orbit(zwx_file: Path):
     actual_payload_for_routing = payload_str if payload_str is not None else ""
 
     if target_system == "blender":
-        route_to_blender(actual_payload_for_routing, source_file_name)
+        route_to_blender(actual_payload_for_routing, source_file_name, skip_unchanged)
     elif target_system == "godot":
         route_to_godot(actual_payload_for_routing, source_file_name)
     else:
@@ -173,6 +208,8 @@ def execute_orbit(zwx_file: Path):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="EngAIn-Orbit ZWX Execution Router")
     parser.add_argument("zwx_file", type=Path, help="Path to the .zwx or .zw file to execute")
+    parser.add_argument("--skip-unchanged", action="store_true",
+                        help="Do not relaunch Blender if the payload is structurally unchanged since the last run")
     # Optional: Add --no-log flag if desired
     # parser.add_argument("--no-log", action="store_true", help="Disable logging to orbit_exec.log")
     args = parser.parse_args()
@@ -189,6 +226,6 @@ if __name__ == "__main__":
         log_orbit_event(f"❌ Startup Error: {err_msg}")
         sys.exit(1)
 
-    execute_orbit(args.zwx_file)
+    execute_orbit(args.zwx_file, skip_unchanged=args.skip_unchanged)
 
 # ---- End of modified code for tools/engain_orbit.py ----
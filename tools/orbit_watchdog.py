@@ -4,7 +4,6 @@ import time
 import subprocess
 from pathlib import Path
 import argparse
-import datetime
 import sys # For sys.exit
 
 # --- Path Definitions ---
@@ -36,19 +35,16 @@ ENGAIN_ORBIT_SCRIPT = PROJECT_ROOT / ENGAIN_ORBIT_SCRIPT_NAME
 
 POLL_INTERVAL = 3  # seconds
 
+sys.path.insert(0, str(PROJECT_ROOT / "zw_mcp"))
+from zw_log import log_event  # noqa: E402
+
 # --- Logging Setup ---
 def ensure_logging_setup():
     LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 def log_watchdog_event(message: str):
-    ensure_logging_setup()
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"[{timestamp}] {message}\n"
-    try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(log_entry)
-    except Exception as e:
-        print(f"Error writing to log file {LOG_FILE}: {e}", file=sys.stderr)
+    # Queued for zw_log's writer thread, so a slow disk does not stall the poll loop
+    log_event(LOG_FILE, "watchdog", message=message)
 
 # --- Directory Setup ---
 def ensure_directories():
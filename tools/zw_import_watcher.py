@@ -11,20 +11,21 @@ WATCH_FOLDER = Path("zw_drop_folder/experimental_patterns")
 VALIDATED_FOLDER = Path("zw_drop_folder/validated_patterns")
 RESEARCH_LOG = Path("zw_drop_folder/research_notes/what_worked.md")
 
-# Placeholder validation logic (replace with real ZWValidator call)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "zw_mcp"))
+from zw_schema import check_zw_file  # noqa: E402
+
+# Errors reported per rejected file; validation stops reading the file after this many
+MAX_REPORTED_ERRORS = 5
+
 def validate_zw_template(file_path):
+    """Streams the file through the ZW schema validator; returns (ok, message)."""
     try:
-        with file_path.open("r", encoding="utf-8") as f:
-            lines = f.readlines()
-            if any("ENTROPY:" in line for line in lines):
-                return True, "Entropy field detected."
-            # Corrected iteration for tags: check if any tag is present in any line
-            elif any(tag in line for line in lines for tag in ("ZW-OBJECT:", "TYPE:", "ZW-STAGE:")):
-                return True, "Basic ZW structure detected."
-            else:
-                return False, "Missing entropy or structural tags."
+        errors = check_zw_file(file_path, max_errors=MAX_REPORTED_ERRORS)
     except Exception as e:
         return False, f"Error: {str(e)}"
+    if errors:
+        return False, "; ".join(str(error) for error in errors)
+    return True, "Schema validation passed."
 
 def watch_folder():
     print(f"🔍 Watching folder: {WATCH_FOLDER.resolve()}")
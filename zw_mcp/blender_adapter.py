@@ -1,4 +1,5 @@
 from __future__ import annotations
+from collections.abc import Mapping
 # ... (existing imports and setup code remains the same)
 
 # --- New Asset Import Helpers ---
@@ -46,7 +47,7 @@ def link_blend_objects(blend_path: str, object_names: list, collection: bpy.type
 
 def apply_basic_modifiers(obj: bpy.types.Object, modifiers_spec: dict):
     """Apply basic modifiers to an object based on a specification dictionary."""
-    if not modifiers_spec or not isinstance(modifiers_spec, dict):
+    if not modifiers_spec or not isinstance(modifiers_spec, Mapping):
         return
     
     # Subdivision surface modifier
@@ -81,7 +82,7 @@ def add_geometry_nodes(obj: bpy.types.Object, node_group_name: str, inputs: dict
     mod = obj.modifiers.new(node_group_name, 'NODES')
     mod.node_group = bpy.data.node_groups[node_group_name]
     
-    if inputs and isinstance(inputs, dict):
+    if inputs and isinstance(inputs, Mapping):
         for key, value in inputs.items():
             try:
                 # Try to set the input value
@@ -156,7 +157,7 @@ def handle_zw_mesh_block(mesh_data: dict, current_bpy_collection: bpy.types.Coll
             
             # Apply modifiers if specified
             modifiers = mesh_data.get("MODIFIERS") or mesh_data.get("APPLY") or {}
-            if isinstance(modifiers, dict):
+            if isinstance(modifiers, Mapping):
                 apply_basic_modifiers(mesh_obj, modifiers)
             
             # Apply geometry nodes if specified
@@ -167,7 +168,7 @@ def handle_zw_mesh_block(mesh_data: dict, current_bpy_collection: bpy.types.Coll
             
             # Apply material if specified
             material_def = mesh_data.get("MATERIAL")
-            if isinstance(material_def, dict):
+            if isinstance(material_def, Mapping):
                 if ZW_MESH_UTILS_IMPORTED and APPLY_ZW_MATERIAL_FUNC:
                     APPLY_ZW_MATERIAL_FUNC(mesh_obj, material_def)
                 else:
@@ -175,7 +176,7 @@ def handle_zw_mesh_block(mesh_data: dict, current_bpy_collection: bpy.types.Coll
             
             # Apply metadata if specified
             metadata_dict = mesh_data.get("METADATA")
-            if isinstance(metadata_dict, dict):
+            if isinstance(metadata_dict, Mapping):
                 handle_zw_metadata_block(metadata_dict, target_obj_name=mesh_obj.name)
             
             print(f"    ✅ Successfully imported asset: {mesh_name} from {source}")
@@ -229,7 +230,7 @@ def handle_zw_mesh_block(mesh_data: dict, current_bpy_collection: bpy.types.Coll
     
     # Apply material properties
     material_def = mesh_data.get("MATERIAL")
-    if isinstance(material_def, dict):
+    if isinstance(material_def, Mapping):
         mat_name = material_def.get("NAME", f"{mesh_name}_Material")
         mat = bpy.data.materials.get(mat_name)
         if not mat: 
@@ -270,7 +271,7 @@ def handle_zw_mesh_block(mesh_data: dict, current_bpy_collection: bpy.types.Coll
 
     # Apply Metadata (if any)
     metadata_dict = mesh_data.get("METADATA")
-    if isinstance(metadata_dict, dict):
+    if isinstance(metadata_dict, Mapping):
         handle_zw_metadata_block(metadata_dict, target_obj_name=mesh_obj.name)
 
     # Link to collection
@@ -294,7 +295,7 @@ def handle_zw_light_block(light_data: dict, current_bpy_collection=None):
     if not bpy:
         return None
     
-    if not isinstance(light_data, dict):
+    if not isinstance(light_data, Mapping):
         print(f"{P_WARN} ZW-LIGHT data should be a dict, got {type(light_data)}")
         return None
     
@@ -368,7 +369,7 @@ def handle_zw_camera_block(camera_data: dict, current_bpy_collection=None):
     if not bpy:
         return None
     
-    if not isinstance(camera_data, dict):
+    if not isinstance(camera_data, Mapping):
         print(f"{P_WARN} ZW-CAMERA data should be a dict, got {type(camera_data)}")
         return None
     
@@ -425,28 +426,20 @@ def handle_zw_camera_block(camera_data: dict, current_bpy_collection=None):
         if os.path.join(REPO_ROOT, "zw_mcp") not in sys.path:
             sys.path.append(os.path.join(REPO_ROOT, "zw_mcp"))
 
-        # Import parser and parse the scene
-        from zw_mcp.zw_parser import parse_zw
-        with open(ZW_INPUT, "r", encoding="utf-8") as f:
-            zw_text = f.read()
-        data = parse_zw(zw_text)
-
-        # Prefer the adapter's own dispatcher if present
-        if 'process_zw_structure' in globals():
-            process_zw_structure(data)
-        else:
-            # Minimal fallback: handle ZW-MESH blocks so we see output
-            import bpy
-            coll = bpy.context.scene.collection
-            if isinstance(data, dict):
-                for k, v in data.items():
-                    if k.strip().upper() == "ZW-MESH":
-                        if isinstance(v, list):
-                            for item in v:
-                                try: handle_zw_mesh_block(item, coll)
-                                except Exception: traceback.print_exc()
-                        elif isinstance(v, dict):
-                            handle_zw_mesh_block(v, coll)
+        # Import parser and stream the scene block by block
+        # (cached on disk when ZW_PARSE_CACHE_DIR is set in the environment)
+        from zw_mcp.zw_parser import iter_zw_file_blocks
+        import bpy
+        coll = bpy.context.scene.collection
+        # typed=True decodes vectors/colors/numbers once here instead of in every handler
+        for block in iter_zw_file_blocks(ZW_INPUT, typed=True):
+            # Prefer the adapter's own dispatcher if present
+            if 'process_zw_structure' in globals():
+                process_zw_structure({block.key: block.value})
+            elif block.key.strip().upper() == "ZW-MESH" and isinstance(block.value, Mapping):
+                # Minimal fallback: handle ZW-MESH blocks so we see output
+                try: handle_zw_mesh_block(block.value, coll)
+                except Exception: traceback.print_exc()
 
         print("[ZW->Blender][SUCCESS] --- ZW Blender Adapter Finished Successfully ---")
     except SystemExit:
@@ -15,12 +15,12 @@ except ImportError:
 # Robust import of to_zw from zw_mcp.zw_parser
 try:
     # Assumes zw_mcp is in PYTHONPATH or script is run from project root where zw_mcp is a subdir
-    from zw_parser import to_zw
+    from zw_parser import to_zw, dump_zw
 except ImportError:
     print("[!] Could not import 'to_zw' from 'zw_mcp.zw_parser'.")
     # Attempt fallback for direct execution if script is in zw_mcp folder
     try:
-        from zw_parser import to_zw
+        from zw_parser import to_zw, dump_zw
     except ImportError:
         print("[!] Fallback import of 'to_zw' also failed.")
         print("[!] Ensure 'zw_parser.py' is accessible.")
@@ -34,8 +34,13 @@ except ImportError:
             for key, value in d.items():
                 error_message += f"# {key}: {value}\n"
             return error_message.strip()
+
+        def dump_zw(d: dict, fp, current_indent_level: int = 0) -> None:
+            fp.write(to_zw(d, current_indent_level) + "\n")
         # sys.exit(1) # Or exit if to_zw is critical
 
+EXPORT_HEADER = "# Exported from Blender by ZW Exporter v0.1"
+
 def format_vector_to_zw(vector, precision=3) -> str:
     if vector is None:
         return ""
@@ -74,6 +79,48 @@ def get_object_zw_type(blender_obj) -> str:
 
     return "Mesh" # Generic fallback if no specific type is found
 
+def object_to_zw_attributes(obj) -> dict:
+    attributes_dict = {}
+    attributes_dict["TYPE"] = get_object_zw_type(obj)
+    attributes_dict["NAME"] = obj.name
+
+    loc_str = format_vector_to_zw(obj.location)
+    if loc_str: attributes_dict["LOCATION"] = loc_str
+
+    scale_str = format_vector_to_zw(obj.scale)
+    if scale_str: attributes_dict["SCALE"] = scale_str
+
+    rot_str = format_vector_to_zw(obj.rotation_euler) # Radians
+    if rot_str: attributes_dict["ROTATION_EULER_XYZ_RADIANS"] = rot_str # Clarify unit
+
+    if obj.data.materials and obj.data.materials[0]:
+        mat = obj.data.materials[0]
+        attributes_dict["MATERIAL"] = mat.name
+        if mat.use_nodes and mat.node_tree:
+            principled_bsdf = mat.node_tree.nodes.get("Principled BSDF")
+            if principled_bsdf:
+                base_color_input = principled_bsdf.inputs.get("Base Color")
+                if base_color_input:
+                    color_hex = format_color_to_zw_hex(base_color_input.default_value)
+                    if color_hex: attributes_dict["COLOR"] = color_hex
+                # Could add more BSDF properties here if needed
+                # e.g. METALLIC: principled_bsdf.inputs.get("Metallic").default_value
+
+    if obj.parent:
+        attributes_dict["PARENT"] = obj.parent.name
+
+    if obj.users_collection and obj.users_collection[0]:
+        # Only export collection if it's not the scene's master collection
+        # (or handle this logic based on how collections are typically used)
+        # For now, let's just export the first collection's name.
+        # More sophisticated logic might be needed for multi-collection objects
+        # or to decide which collection is "primary".
+        # Also, ensure it's not the default "Scene Collection" if that's not desired.
+        # For simplicity:
+        attributes_dict["COLLECTION"] = obj.users_collection[0].name
+
+    return attributes_dict
+
 def export_scene_to_zw(output_filepath_str: str, export_all_meshes: bool = False):
     if not bpy:
         print("[X] Blender (bpy) not available. Cannot export scene.")
@@ -82,8 +129,6 @@ def export_scene_to_zw(output_filepath_str: str, export_all_meshes: bool = False
     output_filepath = Path(output_filepath_str)
     output_filepath.parent.mkdir(parents=True, exist_ok=True)
 
-    zw_blocks = ["# Exported from Blender by ZW Exporter v0.1"]
-
     objects_to_export = []
     if not export_all_meshes and bpy.context.selected_objects:
         objects_to_export = [obj for obj in bpy.context.selected_objects if obj.type == 'MESH']
@@ -99,69 +144,25 @@ def export_scene_to_zw(output_filepath_str: str, export_all_meshes: bool = False
 
     if not objects_to_export:
         print("[!] No mesh objects found to export.")
-        zw_blocks.append("# No mesh objects found in the scene to export.")
     else:
         print(f"[*] Found {len(objects_to_export)} mesh objects to export.")
 
-    for obj in objects_to_export:
-        attributes_dict = {}
-        attributes_dict["TYPE"] = get_object_zw_type(obj)
-        attributes_dict["NAME"] = obj.name
-
-        loc_str = format_vector_to_zw(obj.location)
-        if loc_str: attributes_dict["LOCATION"] = loc_str
-
-        scale_str = format_vector_to_zw(obj.scale)
-        if scale_str: attributes_dict["SCALE"] = scale_str
-
-        rot_str = format_vector_to_zw(obj.rotation_euler) # Radians
-        if rot_str: attributes_dict["ROTATION_EULER_XYZ_RADIANS"] = rot_str # Clarify unit
-
-        if obj.data.materials and obj.data.materials[0]:
-            mat = obj.data.materials[0]
-            attributes_dict["MATERIAL"] = mat.name
-            if mat.use_nodes and mat.node_tree:
-                principled_bsdf = mat.node_tree.nodes.get("Principled BSDF")
-                if principled_bsdf:
-                    base_color_input = principled_bsdf.inputs.get("Base Color")
-                    if base_color_input:
-                        color_hex = format_color_to_zw_hex(base_color_input.default_value)
-                        if color_hex: attributes_dict["COLOR"] = color_hex
-                    # Could add more BSDF properties here if needed
-                    # e.g. METALLIC: principled_bsdf.inputs.get("Metallic").default_value
-
-        if obj.parent:
-            attributes_dict["PARENT"] = obj.parent.name
-
-        if obj.users_collection and obj.users_collection[0]:
-            # Only export collection if it's not the scene's master collection
-            # (or handle this logic based on how collections are typically used)
-            # For now, let's just export the first collection's name.
-            # More sophisticated logic might be needed for multi-collection objects
-            # or to decide which collection is "primary".
-            # Also, ensure it's not the default "Scene Collection" if that's not desired.
-            # For simplicity:
-            attributes_dict["COLLECTION"] = obj.users_collection[0].name
-
-        zw_object_data_for_to_zw = {"ZW-OBJECT": attributes_dict}
-
-        try:
-            zw_block_str = to_zw(zw_object_data_for_to_zw)
-            zw_blocks.append(zw_block_str)
-        except Exception as e_to_zw:
-            print(f"[!] Error converting object '{obj.name}' to ZW: {e_to_zw}")
-            zw_blocks.append(f"# ERROR: Could not convert object {obj.name} to ZW.\n# Attributes: {attributes_dict}")
-
-    final_zw_string = "\n///\n".join(zw_blocks)
-    if not final_zw_string.endswith("///") and zw_blocks: # Add trailing /// if content exists
-        if len(zw_blocks) > 1 or (len(zw_blocks) == 1 and zw_blocks[0].strip() != "# Exported from Blender by ZW Exporter v0.1"):
-             final_zw_string += "\n///"
-    elif not zw_blocks: # If only the initial comment was there
-        final_zw_string = "# No content exported."
-
+    # Each block is streamed to the file as soon as it is built, so memory use
+    # does not grow with the number of exported objects.
     try:
         with open(output_filepath, "w", encoding="utf-8") as f:
-            f.write(final_zw_string)
+            f.write(EXPORT_HEADER + "\n///\n")
+            if not objects_to_export:
+                f.write("# No mesh objects found in the scene to export.\n///\n")
+
+            for obj in objects_to_export:
+                attributes_dict = object_to_zw_attributes(obj)
+                try:
+                    dump_zw({"ZW-OBJECT": attributes_dict}, f)
+                except Exception as e_to_zw:
+                    print(f"[!] Error converting object '{obj.name}' to ZW: {e_to_zw}")
+                    f.write(f"# ERROR: Could not convert object {obj.name} to ZW.\n# Attributes: {attributes_dict}\n")
+                f.write("///\n")
         print(f"[*] Successfully exported ZW data to: {output_filepath.resolve()}")
     except Exception as e:
         print(f"[X] Error writing ZW output to file '{output_filepath}': {e}")
@@ -1,4 +1,5 @@
 # zw_mcp/client_example.py
+import codecs
 import socket
 import sys
 from pathlib import Path
@@ -34,23 +35,30 @@ def send_prompt(host: str, port: int, zw_file_path: str):
             s.sendall(prompt.encode("utf-8"))
             s.shutdown(socket.SHUT_WR) # Signal that sending is done
 
-            response_parts = []
+            print("\n🧠 ZW MCP Response:\n")
+            # Print pieces as the daemon streams them in
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            received = False
             while True:
                 try:
                     chunk = s.recv(BUFFER_SIZE)
+                    text = decoder.decode(chunk, final=not chunk)
+                    if text:
+                        received = True
+                        print(text, end="", flush=True)
                     if not chunk:
                         break
-                    response_parts.append(chunk.decode("utf-8"))
                 except socket.timeout:
-                    print("[!] Socket timeout waiting for response.")
+                    print("\n[!] Socket timeout waiting for response.")
                     break
                 except Exception as e:
-                    print(f"[!] Error receiving response chunk: {e}")
+                    print(f"\n[!] Error receiving response chunk: {e}")
                     break
 
-            if not response_parts:
+            if not received:
                 print("[!] No response received from server.")
                 return
+            print()
 
     except socket.error as e:
         print(f"[!] Socket error: {e}")
@@ -59,10 +67,6 @@ def send_prompt(host: str, port: int, zw_file_path: str):
         print(f"[!] An unexpected error occurred: {e}")
         return
 
-    full_response = "".join(response_parts)
-    print("\n🧠 ZW MCP Response:\n")
-    print(full_response)
-
 if __name__ == "__main__":
     host = DEFAULT_HOST
     port = DEFAULT_PORT
@@ -1,8 +1,15 @@
 # zw_mcp/ollama_agent.py
+import codecs
 import socket
 import json
 from pathlib import Path
-from datetime import datetime # Added for logging timestamp consistency
+
+try:
+    from zw_log import log_event
+    from zw_protocol import ProtocolError, RemoteError, ZWClient
+except ImportError:
+    from zw_mcp.zw_log import log_event
+    from zw_mcp.zw_protocol import ProtocolError, RemoteError, ZWClient
 
 CONFIG_PATH = Path("zw_mcp/agent_config.json") # Default config path for standalone runs
 BUFFER_SIZE = 4096 # Consistent with other scripts
@@ -42,7 +49,53 @@ def load_initial_prompt(path_str: str) -> str: # Renamed for clarity
         print(f"[!] Error loading initial prompt file '{prompt_path}': {e}")
         raise
 
-def send_to_daemon(host: str, port: int, prompt: str) -> str:
+# One framed connection per daemon, kept open across rounds
+_daemon_clients = {}
+
+def _drop_daemon_client(host: str, port: int):
+    client = _daemon_clients.pop((host, port), None)
+    if client is not None:
+        try:
+            client.close()
+        except OSError:
+            pass
+
+def send_to_daemon(host: str, port: int, prompt: str, on_token=None, priority: str = None) -> str:
+    """Sends one prompt over a persistent framed connection and returns the full response.
+
+    on_token(text) is called with each piece as the daemon streams it. priority is
+    "interactive", "agent" (the daemon's default for TCP) or "batch".
+    """
+    # The frame length marks the end of the prompt, so the `///` terminator is not needed
+    prompt = prompt.strip().rstrip("///").strip()
+    delivered = []
+
+    def forward(text):
+        delivered.append(text)
+        on_token(text)
+
+    for attempt in (1, 2):
+        try:
+            client = _daemon_clients.get((host, port))
+            if client is None:
+                client = _daemon_clients[(host, port)] = ZWClient(host, port)
+            return client.request(prompt, on_token=forward if on_token else None, priority=priority)
+        except RemoteError as e:
+            print(f"[!] Daemon error during round: {e}")
+            return f"ERROR: Daemon error during round - {e}"
+        except (OSError, ProtocolError) as e:
+            _drop_daemon_client(host, port)
+            # A kept-alive connection may have gone stale (daemon restarted); retry once on a fresh one
+            if attempt == 1 and not delivered:
+                continue
+            print(f"[!] Socket error during round: {e}")
+            return f"ERROR: Socket error during round - {e}"
+
+def send_to_daemon_legacy(host: str, port: int, prompt: str, on_token=None) -> str:
+    """Sends one `///` prompt on a new connection (the original protocol) and returns the full response.
+
+    The daemon streams the response; on_token(text) is called with each piece as it arrives.
+    """
     # print(f"[*] Connecting to ZW MCP Daemon at {host}:{port}...") # Reduced verbosity for loops
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -51,13 +104,19 @@ def send_to_daemon(host: str, port: int, prompt: str) -> str:
             s.sendall(prompt.encode("utf-8"))
             s.shutdown(socket.SHUT_WR)
 
+            # Incremental decoding, so a character split across two reads is not mangled
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
             response_parts = []
             while True:
                 try:
                     chunk = s.recv(BUFFER_SIZE)
+                    text = decoder.decode(chunk, final=not chunk)
+                    if text:
+                        response_parts.append(text)
+                        if on_token:
+                            on_token(text)
                     if not chunk:
                         break
-                    response_parts.append(chunk.decode("utf-8"))
                 except socket.timeout:
                     print("[!] Socket timeout waiting for response.")
                     break
@@ -82,19 +141,8 @@ def log_round_interaction(log_path_str: str, round_num: int, prompt: str, respon
         # print("[*] Log path not configured. Skipping round logging.") # Can be noisy in loops
         return
 
-    log_file = Path(log_path_str)
-    log_file.parent.mkdir(parents=True, exist_ok=True)
-
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"--- ZW Agent Round {round_num} [{timestamp}] ---\n"
-    log_entry += f">>> Prompt:\n{prompt}\n"
-    log_entry += f"<<< Response:\n{response}\n---\n"
-
-    try:
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(log_entry)
-    except Exception as e:
-        print(f"[!] Error writing to round log file '{log_file}': {e}")
+    # Queued for zw_log's writer thread so the agent loop never waits on the disk
+    log_event(log_path_str, "agent_round", round=round_num, prompt=prompt, response=response)
 
 def append_to_memory(memory_path_str: str, round_num: int, prompt: str, response: str): # Renamed for clarity
     if not memory_path_str:
@@ -219,9 +267,10 @@ def main():
         print(f"[*] Sending prompt for round {round_num}...")
         # print(f"Current prompt to send:\n{current_prompt}") # For debugging
 
-        response = send_to_daemon(host, port, current_prompt)
-
-        print(f"\n🧠 Response (Round {round_num}):\n{response}")
+        print(f"\n🧠 Response (Round {round_num}):")
+        response = send_to_daemon(host, port, current_prompt,
+                                  on_token=lambda text: print(text, end="", flush=True))
+        print()
 
         if log_path:
             log_round_interaction(log_path, round_num, current_prompt, response)
@@ -1,31 +1,426 @@
+import json
 import os
+import random
+import threading
+import time
 import requests
-from typing import List, Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any, Iterator, Optional
+
+try:
+    from zw_metrics import OLLAMA as METRICS
+except ImportError:
+    from zw_mcp.zw_metrics import OLLAMA as METRICS
 
 # Allow override; default to the healthy port you verified
 OLLAMA_BASE = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
+# Several inference boxes: "http://gpu1:11434,http://gpu2:11434" (see BackendPool)
+OLLAMA_BASES = [url.strip().rstrip("/") for url in os.getenv("OLLAMA_BASE_URLS", OLLAMA_BASE).split(",") if url.strip()]
 
-# Endpoints
-GEN_URL  = f"{OLLAMA_BASE}/api/generate"  # one-shot prompt
-CHAT_URL = f"{OLLAMA_BASE}/api/chat"      # multi-turn messages
+# Endpoints, relative to a backend's base URL
+GEN_PATH  = "/api/generate"  # one-shot prompt
+CHAT_PATH = "/api/chat"      # multi-turn messages
 
 # Default model (keep small for 1050 Ti)
 DEFAULT_MODEL = os.getenv("ZW_MCP_MODEL", "llama3.2")
 
-def _post(url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-    print(f"[OLLAMA] POST {url} :: {payload.get('model')}", flush=True)
-    r = requests.post(url, json=payload, timeout=120)
-    if r.status_code != 200:
-        raise RuntimeError(f"Ollama error {r.status_code}: {r.text[:800]}")
-    return r.json()
+# Connection handling (see OllamaClient)
+POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "8"))
+CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "120"))
+MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "2"))
+RETRY_BACKOFF = 0.25       # seconds; doubles per attempt, with full jitter
+RETRY_BACKOFF_MAX = 4.0
+RETRY_STATUSES = {502, 503, 504}  # Ollama answers 503 while it is busy or loading
+BREAKER_THRESHOLD = int(os.getenv("OLLAMA_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("OLLAMA_BREAKER_RESET", "30"))
+PROBE_INTERVAL = float(os.getenv("OLLAMA_PROBE_INTERVAL", "10"))  # seconds between health probes
+PROBE_TIMEOUT = float(os.getenv("OLLAMA_PROBE_TIMEOUT", "2"))
+AFFINITY_WEIGHT = float(os.getenv("OLLAMA_AFFINITY_WEIGHT", "2"))  # a cold model load ~ this many queued calls
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling Ollama while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Ollama unavailable; not retrying for another {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class UpstreamError(RuntimeError):
+    """Ollama answered with an error status."""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+class CircuitBreaker:
+    """Opens after `threshold` failed calls in a row and fails fast for
+    `reset_timeout` seconds; then one trial call decides whether to close again."""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset_timeout: float = BREAKER_RESET_SECONDS,
+                 clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.clock() >= self.opened_at + self.reset_timeout else "open"
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_timeout - self.clock()
+            if remaining > 0:
+                raise CircuitOpenError(remaining)
+            if self._trial:
+                raise CircuitOpenError(1.0)  # someone else is making the trial call
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+            self._trial = False
+
+
+class OllamaClient:
+    """Pooled keep-alive session with connect/read timeouts, retries and a circuit breaker.
+
+    Only failures that happen before Ollama starts answering are retried:
+    refused or reset connections, connect timeouts and 502/503/504. A read
+    timeout means a generation was running, so it is not repeated.
+    """
+
+    def __init__(self, pool_size: int = POOL_SIZE, connect_timeout: float = CONNECT_TIMEOUT,
+                 read_timeout: float = READ_TIMEOUT, max_retries: int = MAX_RETRIES,
+                 backoff: float = RETRY_BACKOFF, breaker: Optional[CircuitBreaker] = None):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+
+    def _send(self, url: str, payload: Dict[str, Any], stream: bool) -> requests.Response:
+        """POSTs with retries; returns a 200 response or raises."""
+        self.breaker.before_call()
+        try:
+            r = self._post_with_retries(url, payload, stream)
+        except UpstreamError as e:
+            if e.status in RETRY_STATUSES:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()  # Ollama is up; the request itself was bad
+            raise
+        except Exception:
+            # Every outcome has to be recorded, or a half-open trial never ends and the circuit stays open
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return r
+
+    def _post_with_retries(self, url: str, payload: Dict[str, Any], stream: bool) -> requests.Response:
+        attempt = 0
+        while True:
+            try:
+                r = self.session.post(url, json=payload, timeout=self.timeout, stream=stream)
+            except requests.ConnectionError as e:  # includes connect timeouts, but not read timeouts
+                error = e
+            else:
+                if r.status_code == 200:
+                    return r
+                try:
+                    error = UpstreamError(f"Ollama error {r.status_code}: {r.text[:800]}", r.status_code)
+                finally:
+                    r.close()
+                if r.status_code not in RETRY_STATUSES:
+                    raise error
+
+            if attempt >= self.max_retries:
+                raise error
+            attempt += 1
+            METRICS.retries.inc()
+            time.sleep(random.uniform(0, min(RETRY_BACKOFF_MAX, self.backoff * 2 ** attempt)))
+
+    def post_json(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with self._send(url, payload, stream=False) as r:
+            data = r.json()
+        METRICS.observe_generation(payload.get("model"), data)
+        return data
+
+    def post_stream(self, url: str, payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        # Ollama streams one JSON object per line; the last one has "done": true plus the stats
+        r = self._send(url, payload, stream=True)
+        with r:
+            try:
+                for line in r.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise RuntimeError(f"Ollama error: {chunk['error']}")
+                    if chunk.get("done"):
+                        METRICS.observe_generation(payload.get("model"), chunk)
+                    yield chunk
+                    if chunk.get("done"):
+                        break
+            except requests.RequestException:
+                self.breaker.record_failure()  # dropped or stalled mid-generation
+                raise
+
+    def close(self):
+        self.session.close()
+
+
+def _model_name(name: Optional[str]) -> str:
+    # Ollama lists "llama3.2:latest" for a model requested as "llama3.2"
+    name = name or DEFAULT_MODEL
+    return name if ":" in name else f"{name}:latest"
+
+
+class Backend:
+    """One Ollama server in a BackendPool."""
+
+    def __init__(self, base_url: str, client: OllamaClient):
+        self.base_url = base_url
+        self.client = client
+        self.healthy = True     # cleared when a probe or a call cannot reach it, set again by a good probe
+        self.outstanding = 0    # calls running on it now
+        self.served = 0
+        self.models = set()     # installed (/api/tags); empty until the first probe
+        self.loaded = set()     # resident in memory (/api/ps), plus what we sent it since
+        self.last_error = None
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and self.client.breaker.state != "open"
+
+    def stats(self) -> dict:
+        return {
+            "url": self.base_url,
+            "available": self.available,
+            "breaker": self.client.breaker.state,
+            "outstanding": self.outstanding,
+            "served": self.served,
+            "loaded": sorted(self.loaded),
+            "last_error": self.last_error,
+        }
+
+
+# Failures that say nothing about the request itself, so another backend may well answer it
+_FAILOVER_ERRORS = (requests.ConnectionError, CircuitOpenError, UpstreamError)
+
+
+class BackendPool:
+    """Spreads calls over several Ollama servers.
 
-def generate(prompt: str, model: Optional[str] = None, stream: bool = False) -> Dict[str, Any]:
+    Each call goes to the available backend with the fewest calls outstanding,
+    where a backend that does not have the model loaded counts AFFINITY_WEIGHT
+    extra calls (so requests stick to warm models until that node is clearly
+    busier), and one that does not have it installed is a last resort. A call
+    that fails before Ollama starts answering moves on to the next backend.
+
+    A backend is ejected when it cannot be reached (or its circuit breaker
+    opens) and re-admitted by the next health probe that gets through. Probes
+    (/api/tags for installed models, /api/ps for loaded ones) run every
+    PROBE_INTERVAL seconds on a background thread when there is more than one
+    backend.
+    """
+
+    def __init__(self, base_urls: List[str], client_factory=OllamaClient, probe_interval: float = PROBE_INTERVAL,
+                 affinity_weight: float = AFFINITY_WEIGHT):
+        self.backends = [Backend(url.rstrip("/"), client_factory()) for url in base_urls]
+        self.probe_interval = probe_interval
+        self.affinity_weight = affinity_weight
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._prober = None
+
+    def start_probing(self):
+        if self._prober is None and len(self.backends) > 1 and self.probe_interval > 0:
+            self._prober = threading.Thread(target=self._probe_loop, name="ollama-probe", daemon=True)
+            self._prober.start()
+
+    def _probe_loop(self):
+        self.probe_all()
+        while not self._stop.wait(self.probe_interval):
+            self.probe_all()
+
+    # --- Health ---
+    def probe_all(self):
+        for backend in self.backends:
+            self.probe(backend)
+
+    def probe(self, backend: Backend) -> bool:
+        session, timeout = backend.client.session, (backend.client.timeout[0], PROBE_TIMEOUT)
+        try:
+            tags = session.get(f"{backend.base_url}/api/tags", timeout=timeout)
+            tags.raise_for_status()
+            ps = session.get(f"{backend.base_url}/api/ps", timeout=timeout)
+            ps.raise_for_status()
+            models = {_model_name(m.get("name")) for m in tags.json().get("models", [])}
+            loaded = {_model_name(m.get("name")) for m in ps.json().get("models", [])}
+        except (requests.RequestException, ValueError, AttributeError) as e:
+            self._eject(backend, f"health check failed: {e}")
+            return False
+        with self._lock:
+            backend.models = models
+            backend.loaded = loaded
+        if not backend.available:
+            print(f"[OLLAMA] {backend.base_url} is back; re-admitting", flush=True)
+        backend.healthy = True
+        backend.client.breaker.record_success()
+        METRICS.backend_up.labels(backend.base_url).set(1)
+        return True
+
+    def _eject(self, backend: Backend, reason: str):
+        backend.last_error = reason
+        if len(self.backends) == 1:
+            return  # nowhere else to go; the circuit breaker decides when to stop trying
+        if backend.healthy:
+            print(f"[OLLAMA] Ejecting {backend.base_url}: {reason}", flush=True)
+            METRICS.backend_ejections.labels(backend.base_url).inc()
+        backend.healthy = False
+        METRICS.backend_up.labels(backend.base_url).set(0)
+
+    # --- Routing ---
+    def _score(self, backend: Backend, model: str):
+        if model in backend.loaded:
+            penalty = 0.0
+        elif backend.models and model not in backend.models:
+            penalty = float("inf")
+        else:
+            penalty = self.affinity_weight
+        return backend.outstanding + penalty, penalty > 0, backend.served
+
+    def acquire(self, model: Optional[str], exclude=()) -> Backend:
+        """Picks a backend for one call and counts it as outstanding; pair with release()."""
+        model = _model_name(model)
+        with self._lock:
+            candidates = [b for b in self.backends if b.available and b not in exclude]
+            if not candidates:
+                raise CircuitOpenError(self._retry_after())
+            backend = min(candidates, key=lambda b: self._score(b, model))
+            backend.outstanding += 1
+            backend.served += 1
+            backend.loaded.add(model)  # it will be once this call starts
+        METRICS.backend_requests.labels(backend.base_url).inc()
+        METRICS.backend_outstanding.labels(backend.base_url).inc()
+        return backend
+
+    def release(self, backend: Backend):
+        with self._lock:
+            backend.outstanding -= 1
+        METRICS.backend_outstanding.labels(backend.base_url).dec()
+
+    def _retry_after(self) -> float:
+        waits = []
+        for backend in self.backends:
+            breaker = backend.client.breaker
+            if backend.healthy and breaker.opened_at is not None:
+                waits.append(breaker.opened_at + breaker.reset_timeout - breaker.clock())
+        return max(1.0, min(waits)) if waits else max(1.0, self.probe_interval)
+
+    def _failed(self, backend: Backend, error: Exception, tried: set) -> bool:
+        """Notes a failed call; True when another backend should get it."""
+        if isinstance(error, UpstreamError) and error.status not in RETRY_STATUSES:
+            return False  # Ollama is up; the request itself was bad
+        if isinstance(error, requests.ConnectionError):
+            self._eject(backend, str(error))
+        tried.add(backend)
+        return any(b.available and b not in tried for b in self.backends)
+
+    def post_json(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        tried = set()
+        while True:
+            backend = self.acquire(payload.get("model"), tried)
+            try:
+                return backend.client.post_json(backend.base_url + path, payload)
+            except _FAILOVER_ERRORS as e:
+                if not self._failed(backend, e, tried):
+                    raise
+            finally:
+                self.release(backend)
+
+    def post_stream(self, path: str, payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        tried = set()
+        while True:
+            backend = self.acquire(payload.get("model"), tried)
+            started = False
+            try:
+                for chunk in backend.client.post_stream(backend.base_url + path, payload):
+                    started = True
+                    yield chunk
+                return
+            except _FAILOVER_ERRORS as e:
+                # Once text went out the call cannot move; the caller already has half an answer
+                if started or not self._failed(backend, e, tried):
+                    raise
+            finally:
+                self.release(backend)
+
+    def stats(self) -> List[dict]:
+        return [backend.stats() for backend in self.backends]
+
+    def close(self):
+        self._stop.set()
+        for backend in self.backends:
+            backend.client.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> BackendPool:
+    # One shared pool, so every caller draws from the same connections and outstanding counts
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BackendPool(OLLAMA_BASES)
+            _pool.start_probing()
+        return _pool
+
+def backend_stats() -> List[dict]:
+    """Per-backend state, without creating the pool if nothing has called Ollama yet."""
+    return _pool.stats() if _pool is not None else []
+
+def _post(path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    print(f"[OLLAMA] POST {path} :: {payload.get('model')}", flush=True)
+    return get_pool().post_json(path, payload)
+
+def _post_stream(path: str, payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    print(f"[OLLAMA] POST {path} :: {payload.get('model')} (stream)", flush=True)
+    return get_pool().post_stream(path, payload)
+
+def generate(prompt: str, model: Optional[str] = None, stream: bool = False,
+             options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     payload = {
         "model": model or DEFAULT_MODEL,
         "prompt": prompt,
         "stream": stream,
     }
-    return _post(GEN_URL, payload)
+    if options:
+        payload["options"] = options  # temperature, seed, num_predict, ...
+    return _post(GEN_PATH, payload)
 
 def chat(messages: List[Dict[str, str]], model: Optional[str] = None, stream: bool = False) -> Dict[str, Any]:
     # messages like: [{"role":"user","content":"..."}]
@@ -34,10 +429,37 @@ def chat(messages: List[Dict[str, str]], model: Optional[str] = None, stream: bo
         "messages": messages,
         "stream": stream,
     }
-    return _post(CHAT_URL, payload)
+    return _post(CHAT_PATH, payload)
+
+def generate_stream(prompt: str, model: Optional[str] = None,
+                    options: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    payload = {
+        "model": model or DEFAULT_MODEL,
+        "prompt": prompt,
+        "stream": True,
+    }
+    if options:
+        payload["options"] = options
+    return _post_stream(GEN_PATH, payload)
+
+def chat_stream(messages: List[Dict[str, str]], model: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    payload = {
+        "model": model or DEFAULT_MODEL,
+        "messages": messages,
+        "stream": True,
+    }
+    return _post_stream(CHAT_PATH, payload)
 
 # What the daemon imports
-def query_ollama(prompt: str, model: Optional[str] = None) -> str:
-    data = generate(prompt, model=model, stream=False)
+def query_ollama(prompt: str, model: Optional[str] = None, options: Optional[Dict[str, Any]] = None) -> str:
+    data = generate(prompt, model=model, stream=False, options=options)
     # /api/generate returns {"response": "...", ...}
     return data.get("response", "")
+
+def stream_ollama(prompt: str, model: Optional[str] = None,
+                  options: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    # Same as query_ollama, but yields the text as Ollama produces it
+    for chunk in generate_stream(prompt, model=model, options=options):
+        text = chunk.get("response", "")
+        if text:
+            yield text
@@ -0,0 +1,215 @@
+# zw_mcp/test_ollama_handler.py
+import json
+import socket
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ollama_handler import BackendPool, CircuitBreaker, CircuitOpenError, OllamaClient
+from zw_metrics import OLLAMA
+
+
+@contextmanager
+def stub_ollama(script, tags=(), loaded=()):
+    """Local HTTP server answering POSTs from `script`: a list of (status, body) used in turn.
+
+    GET /api/tags and /api/ps list `tags` and `loaded`; they fail with 500 while state["down"] is set.
+    """
+    state = {"connections": 0, "requests": 0, "down": False}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def setup(self):
+            super().setup()
+            state["connections"] += 1
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            status, body = script[min(state["requests"], len(script) - 1)]
+            state["requests"] += 1
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            models = {"/api/tags": tags, "/api/ps": loaded}.get(self.path)
+            status = 404 if models is None else 500 if state["down"] else 200
+            data = json.dumps({"models": [{"name": name} for name in models or ()]}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/api/generate", state
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def closed_port_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}/api/generate"
+
+
+def test_reuses_connections():
+    with stub_ollama([(200, json.dumps({"response": "ok"}))]) as (url, state):
+        client = OllamaClient()
+        for _ in range(3):
+            assert client.post_json(url, {"prompt": "x"}) == {"response": "ok"}
+        client.close()
+    assert (state["connections"], state["requests"]) == (1, 3)
+
+
+def test_streams_ndjson():
+    lines = [{"response": "ZW-"}, {"response": "MESH:"}, {"response": "", "done": True, "eval_count": 2}]
+    with stub_ollama([(200, "\n".join(json.dumps(line) for line in lines) + "\n")]) as (url, _):
+        client = OllamaClient()
+        assert list(client.post_stream(url, {"prompt": "x"})) == lines
+        client.close()
+
+
+def test_records_generation_stats():
+    done = {"model": "stats-model", "response": "", "done": True, "eval_count": 40, "eval_duration": 2_000_000_000,
+            "prompt_eval_count": 12, "prompt_eval_duration": 500_000_000, "load_duration": 250_000_000}
+    lines = [{"response": "ZW"}, done]
+    with stub_ollama([(200, "\n".join(json.dumps(line) for line in lines) + "\n")]) as (url, _):
+        client = OllamaClient()
+        list(client.post_stream(url, {"model": "stats-model", "prompt": "x"}))
+        client.close()
+    assert OLLAMA.eval_tokens.labels("stats-model").value == 40
+    assert OLLAMA.prompt_tokens.labels("stats-model").value == 12
+    assert OLLAMA.load_seconds.labels("stats-model").value == 0.25
+    rate = OLLAMA.tokens_per_second.labels("stats-model")
+    assert rate.count == 1 and rate.sum == 20.0
+
+
+def test_retries_busy_then_succeeds():
+    script = [(503, "busy"), (503, "busy"), (200, json.dumps({"response": "ok"}))]
+    with stub_ollama(script) as (url, state):
+        client = OllamaClient(max_retries=2, backoff=0.001)
+        assert client.post_json(url, {})["response"] == "ok"
+        assert state["requests"] == 3 and client.breaker.state == "closed"
+
+        # Bad requests are not retried
+        state["requests"] = 0
+        script[:] = [(404, "model not found")]
+        with pytest.raises(RuntimeError, match="404"):
+            client.post_json(url, {})
+        assert state["requests"] == 1
+
+
+def test_circuit_breaker_fails_fast_then_recovers():
+    now = [0.0]
+    breaker = CircuitBreaker(threshold=2, reset_timeout=30, clock=lambda: now[0])
+    client = OllamaClient(max_retries=0, breaker=breaker)
+    down = closed_port_url()
+    for _ in range(2):
+        with pytest.raises(Exception) as info:
+            client.post_json(down, {})
+        assert not isinstance(info.value, CircuitOpenError)
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError) as info:
+        client.post_json(down, {})
+    assert info.value.retry_after == 30
+
+    # After the reset timeout one trial call goes through and closes the circuit
+    now[0] = 31
+    assert breaker.state == "half-open"
+    with stub_ollama([(200, json.dumps({"response": "back"}))]) as (url, _):
+        assert client.post_json(url, {})["response"] == "back"
+    assert breaker.state == "closed"
+
+    # A failed trial opens it again straight away
+    breaker.record_failure()
+    breaker.record_failure()
+    now[0] = 62
+    with pytest.raises(Exception):
+        client.post_json(down, {})
+    assert breaker.state == "open"
+
+
+def test_unexpected_error_in_half_open_trial_is_a_failure():
+    now = [0.0]
+    breaker = CircuitBreaker(threshold=1, reset_timeout=30, clock=lambda: now[0])
+    client = OllamaClient(max_retries=0, breaker=breaker)
+    with pytest.raises(Exception):
+        client.post_json(closed_port_url(), {})
+    assert breaker.state == "open"
+
+    # Neither is a connection error or an HTTP status; both must still end the trial
+    for url, payload in (("http://", {}), (closed_port_url(), {"options": object()})):
+        now[0] += 31
+        with pytest.raises(Exception) as info:
+            client.post_json(url, payload)
+        assert not isinstance(info.value, CircuitOpenError)
+        assert breaker.state == "open"
+
+    now[0] += 31
+    with stub_ollama([(200, json.dumps({"response": "back"}))]) as (url, _):
+        assert client.post_json(url, {})["response"] == "back"
+    assert breaker.state == "closed"
+
+
+def base_of(url):
+    return url.rsplit("/api/", 1)[0]
+
+
+def test_pool_prefers_loaded_model_then_least_outstanding():
+    with stub_ollama([(200, json.dumps({"response": "warm"}))], tags=["llama3.2:latest", "mistral:latest"],
+                     loaded=["llama3.2:latest"]) as (warm_url, _), \
+            stub_ollama([(200, json.dumps({"response": "cold"}))], tags=["llama3.2:latest"]) as (cold_url, _):
+        pool = BackendPool([base_of(warm_url), base_of(cold_url)], affinity_weight=2)
+        pool.probe_all()
+        warm, cold = pool.backends
+        assert warm.loaded == {"llama3.2:latest"} and cold.models == {"llama3.2:latest"}
+
+        # Sticks to the node that has the model loaded until it is clearly busier
+        held = [pool.acquire("llama3.2") for _ in range(3)]
+        assert held == [warm, warm, warm]
+        assert pool.post_json("/api/generate", {"model": "llama3.2"})["response"] == "cold"
+        for backend in held:
+            pool.release(backend)
+        assert "llama3.2:latest" in cold.loaded  # counted as warm from now on
+
+        # Only installed where it is installed
+        assert pool.acquire("mistral") is warm
+        pool.release(warm)
+        pool.close()
+    assert warm.outstanding == cold.outstanding == 0
+
+
+def test_pool_fails_over_ejects_and_readmits():
+    lines = [{"response": "ok"}, {"response": "", "done": True}]
+    with stub_ollama([(200, "\n".join(json.dumps(line) for line in lines) + "\n")],
+                     tags=["llama3.2:latest"]) as (url, state):
+        pool = BackendPool([base_of(closed_port_url()), base_of(url)],
+                           client_factory=lambda: OllamaClient(max_retries=0))
+        down, up = pool.backends
+        for _ in range(2):
+            assert list(pool.post_stream("/api/generate", {"model": "llama3.2"})) == lines
+        assert not down.available and down.served == 1  # ejected after the first failure
+        assert up.served == 2 and up.outstanding == 0
+
+        # A failing health check takes a node out; the next good one brings it back
+        state["down"] = True
+        assert not pool.probe(up)
+        with pytest.raises(CircuitOpenError):
+            pool.post_json("/api/generate", {"model": "llama3.2"})
+        state["down"] = False
+        assert pool.probe(up) and up.available
+        assert pool.stats()[1]["available"] is True
+        pool.close()
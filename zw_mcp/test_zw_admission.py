@@ -0,0 +1,35 @@
+# zw_mcp/test_zw_admission.py
+import pytest
+
+from zw_admission import AdmissionController, Overloaded
+
+
+def test_token_bucket_per_client():
+    now = [0.0]
+    admission = AdmissionController(2, 8, client_rate=0.5, client_burst=2, clock=lambda: now[0])
+    admission.check_client("hub")
+    admission.check_client("hub")
+    with pytest.raises(Overloaded) as info:
+        admission.check_client("hub")
+    assert info.value.status == 429 and info.value.retry_after == 2
+    admission.check_client("other-agent")  # separate bucket
+    now[0] = 2.0
+    admission.check_client("hub")
+    assert admission.stats()["rejected"] == {"rate_limited": 1}
+
+
+def test_rejects_on_full_queue_and_missed_deadline():
+    admission = AdmissionController(max_upstream=2, max_queue=4, deadline=30)
+    admission.admit(queued=3, ahead=3, running=2)  # no latency known yet: only the queue bound applies
+    with pytest.raises(Overloaded) as info:
+        admission.admit(queued=4, ahead=4, running=2)
+    assert info.value.status == 503 and info.value.reason == "queue_full"
+
+    admission.observe(20.0)
+    assert admission.expected_wait(ahead=0, running=1) == 0
+    assert admission.expected_wait(ahead=3, running=2) == 40.0  # four turns, two slots
+    admission.admit(queued=3, ahead=1, running=2)  # 20s wait fits the 30s deadline
+    with pytest.raises(Overloaded) as info:
+        admission.admit(queued=3, ahead=3, running=2)
+    assert info.value.reason == "deadline" and info.value.retry_after == 10
+    admission.admit(queued=3, ahead=3, running=2, deadline=45)  # the request's own deadline wins
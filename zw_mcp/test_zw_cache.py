@@ -0,0 +1,77 @@
+# zw_mcp/test_zw_cache.py
+import zw_parser
+from zw_cache import ParseCache, content_key, file_content_key
+
+SCENE = "".join(f"ZW-MESH:\n  NAME: Part_{i}\n  LOCATION: ({i}, 0, 0)\n" for i in range(200))
+
+
+def test_lru_evicts_oldest_and_counts():
+    cache = ParseCache(max_entries=2)
+    cache.put("a", {"A": "1"})
+    cache.put("b", {"B": "2"})
+    assert cache.get("a") == {"A": "1"}  # a is now most recent
+    cache.put("c", {"C": "3"})
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]) == (1, 1, 1, 2)
+
+
+def test_disk_tier_is_shared_between_instances(tmp_path):
+    first = ParseCache(cache_dir=tmp_path)
+    first.put("k", {"ZW-MESH": {"NAME": "A"}})
+    second = ParseCache(cache_dir=tmp_path)
+    assert second.get("k") == {"ZW-MESH": {"NAME": "A"}}
+    assert second.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_evicts_by_size(tmp_path):
+    cache = ParseCache(cache_dir=tmp_path, max_disk_bytes=4000)
+    for i in range(10):
+        cache.put(f"key{i:02d}", "x" * 1000)
+    assert cache.stats()["disk_bytes"] <= 4000
+    assert len(list(tmp_path.glob("*/*.pickle"))) < 10
+
+
+def test_parse_zw_hits_return_independent_trees(tmp_path):
+    zw_parser.PARSE_CACHE.clear()
+    first = zw_parser.parse_zw(SCENE)
+    first["ZW-MESH"]["NAME"] = "mutated"
+    second = zw_parser.parse_zw(SCENE)
+    assert second == zw_parser.parse_zw(SCENE, use_cache=False)
+    assert zw_parser.zw_cache_stats()["hits"] >= 1
+
+    path = tmp_path / "scene.zw"
+    path.write_text(SCENE, encoding="utf-8")
+    assert file_content_key(path, "parse_zw") == content_key(SCENE, "parse_zw")
+    assert zw_parser.parse_zw_file(path) == second
+
+
+def test_file_blocks_stream_before_the_cache_entry_is_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_parser, "PARSE_CACHE", ParseCache(cache_dir=tmp_path / "cache"))
+    path = tmp_path / "scene.zw"
+    path.write_text(SCENE, encoding="utf-8")
+
+    blocks = zw_parser.iter_zw_file_blocks(path)
+    first = next(blocks)
+    assert first.value["NAME"] == "Part_0"
+    assert not list((tmp_path / "cache").glob("*/*.pickle"))  # nothing is buffered up front
+    first.value["NAME"] = "mutated"
+    blocks.close()  # a caller that stops early leaves no partial entry
+    assert not list((tmp_path / "cache").glob("*/*.pickle"))
+
+    streamed = list(zw_parser.iter_zw_file_blocks(path))
+    monkeypatch.setattr(zw_parser, "PARSE_CACHE", ParseCache(cache_dir=tmp_path / "cache"))
+    streamed[0].value["NAME"] = "mutated"
+    cached = list(zw_parser.iter_zw_file_blocks(path))
+    assert zw_parser.PARSE_CACHE.stats()["disk_hits"] == 1
+    assert cached == list(zw_parser.iter_zw_file_blocks(path, use_cache=False))
+    assert cached[0].value["NAME"] == "Part_0"
+
+
+def test_file_blocks_over_the_size_cap_are_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_parser, "PARSE_CACHE", ParseCache(cache_dir=tmp_path / "cache"))
+    monkeypatch.setattr(zw_parser, "PARSE_CACHE_MAX_FILE_BYTES", len(SCENE) - 1)
+    path = tmp_path / "scene.zw"
+    path.write_text(SCENE, encoding="utf-8")
+    assert len(list(zw_parser.iter_zw_file_blocks(path))) == 200
+    assert not list((tmp_path / "cache").glob("*/*.pickle"))
@@ -0,0 +1,522 @@
+# zw_mcp/test_zw_daemon.py
+import asyncio
+import http.client
+import itertools
+import json
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+import zw_log
+import zw_mcp_daemon
+import ollama_agent
+from ollama_agent import send_to_daemon
+from ollama_handler import DEFAULT_MODEL, CircuitOpenError
+from zw_mcp_daemon import ZWDaemon
+from zw_protocol import (FRAME_DONE, FRAME_ERROR, FRAME_HEADER, FRAME_MAGIC, FRAME_REQUEST, RemoteError, ZWClient,
+                         encode_frame, recv_frame)
+from zw_response_cache import ResponseCache, cache_key, should_cache
+from zw_admission import AdmissionController
+
+
+@contextmanager
+def running_daemon(daemon: ZWDaemon):
+    """Serves daemon on free local ports from a background loop; yields (tcp_port, http_port)."""
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    ports = []
+
+    def run():
+        asyncio.set_event_loop(loop)
+        tcp, http = loop.run_until_complete(daemon.start("127.0.0.1", 0, "127.0.0.1", 0))
+        ports.extend([tcp.sockets[0].getsockname()[1], http.sockets[0].getsockname()[1]])
+        started.set()
+        loop.run_forever()
+        loop.run_until_complete(daemon.close())
+        # Finish off connection handlers that are still open
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert started.wait(5)
+    try:
+        yield tuple(ports)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+
+
+class FakeUpstream:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, prompt):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        return f"echo: {prompt}"
+
+    def stream(self, prompt):
+        text = self(prompt)
+        for i in range(0, len(text), 4):
+            yield text[i:i + 4]
+
+
+def tcp_request(port, payload: bytes) -> str:
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        # Dribble it in so the terminator and a multi-byte character span reads
+        for i in range(0, len(payload), 3):
+            sock.sendall(payload[i:i + 3])
+        sock.shutdown(socket.SHUT_WR)
+        data = b""
+        while chunk := sock.recv(4096):
+            data += chunk
+    return data.decode("utf-8")
+
+
+def test_tcp_protocol(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_mcp_daemon, "LOG_PATH", tmp_path / "daemon.log")
+    with running_daemon(ZWDaemon(query=FakeUpstream(), query_stream=None)) as (tcp_port, _):
+        assert tcp_request(tcp_port, "ZW-REQUEST:\n  SCOPE: café\n///".encode("utf-8")) == \
+            "echo: ZW-REQUEST:\n  SCOPE: café"
+    zw_log.flush_all()
+    records = [json.loads(line) for line in (tmp_path / "daemon.log").read_text(encoding="utf-8").splitlines()]
+    assert records[-1]["event"] == "exchange"
+    assert "SCOPE: café" in records[-1]["prompt"]
+
+
+def test_http_keep_alive(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_mcp_daemon, "LOG_PATH", tmp_path / "daemon.log")
+    with running_daemon(ZWDaemon(query=FakeUpstream(), query_stream=None)) as (_, http_port):
+        conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=10)
+        for i in range(3):
+            conn.request("POST", "/process_zw", body=json.dumps({"zw_data": f"ZW-X: {i}"}),
+                         headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            assert resp.status == 200
+            assert resp.getheader("Connection") == "keep-alive"
+            assert json.loads(resp.read()) == {"status": "success", "response": f"echo: ZW-X: {i}"}
+        # All three went over the one socket
+        assert conn.sock is not None
+
+        conn.request("POST", "/process_zw", body="not json")
+        resp = conn.getresponse()
+        assert resp.status == 400 and "bad json" in json.loads(resp.read())["error"]
+        conn.request("GET", "/nope")
+        resp = conn.getresponse()
+        assert resp.status == 404
+        resp.read()
+        conn.close()
+
+
+def test_upstream_cap_queues_the_rest(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_mcp_daemon, "LOG_PATH", tmp_path / "daemon.log")
+    upstream = FakeUpstream(delay=0.1)
+    results = []
+    daemon = ZWDaemon(query=upstream, query_stream=upstream.stream, max_upstream=2, max_queue=8)
+    with running_daemon(daemon) as (tcp_port, _):
+        threads = [threading.Thread(target=lambda i=i: results.append(tcp_request(tcp_port, f"P{i}///".encode())))
+                   for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+    assert sorted(results) == sorted(f"echo: P{i}" for i in range(8))
+    assert upstream.peak == 2
+
+
+def test_streams_before_generation_finishes(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_mcp_daemon, "LOG_PATH", tmp_path / "daemon.log")
+    first_seen = threading.Event()
+
+    def slow_stream(prompt):
+        yield "ZW-MESH:\n"
+        # Only finishes once the client has shown it got the first piece
+        assert first_seen.wait(5), "first piece was not delivered before the end of generation"
+        yield "  NAME: Cubé\n///"
+
+    pieces = []
+
+    def on_token(text):
+        pieces.append(text)
+        first_seen.set()
+
+    daemon = ZWDaemon(query=None, query_stream=slow_stream)
+    with running_daemon(daemon) as (tcp_port, http_port):
+        response = send_to_daemon("127.0.0.1", tcp_port, "ZW-REQUEST: x\n///", on_token=on_token)
+        assert response == "ZW-MESH:\n  NAME: Cubé\n///"
+        assert pieces[0] == "ZW-MESH:\n"
+
+        first_seen.clear()
+        conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=10)
+        conn.request("POST", "/process_zw", body=json.dumps({"zw_data": "ZW-REQUEST: x", "stream": True}))
+        resp = conn.getresponse()
+        assert resp.status == 200
+        assert resp.getheader("Content-Type") == "text/event-stream"
+        first = resp.read1().decode("utf-8")
+        assert first == 'data: {"response": "ZW-MESH:\\n"}\n\n'
+        first_seen.set()
+        events = [block for block in (first + resp.read().decode("utf-8")).split("\n\n") if block]
+        assert events[-1].startswith("event: done\n")
+        assert json.loads(events[-1].split("data: ", 1)[1])["response"] == "ZW-MESH:\n  NAME: Cubé\n///"
+
+        # Still usable after a chunked response
+        conn.request("POST", "/process_zw", body=json.dumps({"zw_data": "ZW-REQUEST: y", "stream": True}))
+        resp = conn.getresponse()
+        assert "event: done" in resp.read().decode("utf-8")
+        conn.close()
+
+
+def test_stream_error_is_an_event(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_mcp_daemon, "LOG_PATH", tmp_path / "daemon.log")
+
+    def broken(prompt):
+        yield "partial"
+        raise RuntimeError("model not found")
+
+    with running_daemon(ZWDaemon(query=None, query_stream=broken)) as (_, http_port):
+        conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=10)
+        conn.request("POST", "/process_zw", body=json.dumps({"zw_data": "ZW-REQUEST: x"}),
+                     headers={"Accept": "text/event-stream"})
+        body = conn.getresponse().read().decode("utf-8")
+        assert 'data: {"response": "partial"}' in body
+        assert 'event: error\ndata: {"error": "ollama: model not found"}' in body
+        conn.close()
+
+
+def test_response_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_mcp_daemon, "LOG_PATH", tmp_path / "daemon.log")
+    calls = []
+
+    def query(prompt, model=None, options=None):
+        calls.append((prompt, model, options))
+        return f"answer {len(calls)}"
+
+    def post(conn, payload):
+        conn.request("POST", "/process_zw", body=json.dumps(payload))
+        return json.loads(conn.getresponse().read())
+
+    cache = ResponseCache(path=tmp_path / "responses.sqlite")
+    daemon = ZWDaemon(query=query, query_stream=None, cache=cache)
+    with running_daemon(daemon) as (tcp_port, http_port):
+        conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=10)
+        seeded = {"zw_data": "ZW-REQUEST: cube", "options": {"seed": 7}}
+        assert post(conn, seeded)["response"] == "answer 1"
+        # Same prompt modulo trailing whitespace / CRLF: served from the cache
+        assert post(conn, {**seeded, "zw_data": "ZW-REQUEST: cube  \r\n"})["response"] == "answer 1"
+        # Different options, opted out, or sampled (not cached unless asked): all go upstream
+        assert post(conn, {**seeded, "options": {"seed": 8}})["response"] == "answer 2"
+        assert post(conn, {**seeded, "cache": False})["response"] == "answer 3"
+        assert post(conn, {"zw_data": "ZW-REQUEST: cube"})["response"] == "answer 4"
+        assert post(conn, {"zw_data": "ZW-REQUEST: cube"})["response"] == "answer 5"
+        # A sampled request can opt in
+        assert post(conn, {"zw_data": "ZW-REQUEST: sphere", "cache": True})["response"] == "answer 6"
+        assert post(conn, {"zw_data": "ZW-REQUEST: sphere", "cache": True})["response"] == "answer 6"
+        # Legacy TCP: the first line can opt in or out; it is not part of the prompt
+        assert tcp_request(tcp_port, b"#!cache\nZW-REQUEST: sphere\n///") == "answer 6"
+        assert tcp_request(tcp_port, b"#!NoCache\nZW-REQUEST: sphere\n///") == "answer 7"
+        assert calls[-1][0] == "ZW-REQUEST: sphere"
+
+        conn.request("GET", "/stats")
+        stats = json.loads(conn.getresponse().read())["cache"]
+        assert stats["hits"] == 3 and stats["bytes_saved"] == len("answer 1") + 2 * len("answer 6")
+        conn.close()
+    assert len(calls) == 7
+
+    # The SQLite tier survives a restart
+    reopened = ResponseCache(path=tmp_path / "responses.sqlite")
+    assert reopened.get(cache_key("ZW-REQUEST: cube", DEFAULT_MODEL, {"seed": 7})) == "answer 1"
+    reopened.close()
+
+
+def test_response_cache_lru_and_ttl():
+    cache = ResponseCache(max_entries=2, ttl=60)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")  # evicts b, the least recently used
+    assert cache.get("b") is None and cache.get("a") == "A"
+
+    expired = ResponseCache(ttl=-1)
+    expired.put("a", "A")
+    assert expired.get("a") is None
+
+
+def test_response_cache_sqlite_tier_is_bounded(tmp_path):
+    cache = ResponseCache(max_entries=2, path=tmp_path / "responses.sqlite", max_db_entries=10)
+    for i in range(50):
+        cache.put(f"k{i}", f"answer {i}")
+    assert cache.stats()["db_entries"] <= 10
+    cache.close()
+
+    reopened = ResponseCache(max_entries=2, path=tmp_path / "responses.sqlite", max_db_entries=10)
+    rows = reopened._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    assert rows == reopened.stats()["db_entries"] <= 10
+    assert reopened.get("k49") == "answer 49" and reopened.get("k0") is None  # oldest went first
+    reopened.close()
+
+
+def test_cache_policy_defaults_to_deterministic_requests():
+    assert should_cache({"seed": 1}) and should_cache({"temperature": 0})
+    assert not should_cache(None) and not should_cache({"temperature": 0.8})
+    assert should_cache({"temperature": 0.8}, requested=True) and not should_cache({"seed": 1}, requested=False)
+
+
+def test_identical_requests_share_one_upstream_call(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_mcp_daemon, "LOG_PATH", tmp_path / "daemon.log")
+    release = threading.Event()
+    calls = []
+
+    def stream(prompt, **kwargs):
+        calls.append(prompt)
+        yield "ZW-MESH:\n"
+        assert release.wait(5)
+        yield "  NAME: Shared\n///"
+
+    daemon = ZWDaemon(query=None, query_stream=stream, max_upstream=4)
+    results = []
+    with running_daemon(daemon) as (tcp_port, http_port):
+        clients = [threading.Thread(target=lambda: results.append(tcp_request(tcp_port, b"ZW-REQUEST: x\n///")))
+                   for _ in range(4)]
+
+        def http_client():
+            conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=10)
+            conn.request("POST", "/process_zw", body=json.dumps({"zw_data": "ZW-REQUEST: x"}))
+            results.append(json.loads(conn.getresponse().read())["response"])
+            conn.close()
+        clients.append(threading.Thread(target=http_client))
+
+        for t in clients:
+            t.start()
+        deadline = time.time() + 5
+        while daemon.coalesced < 4 and time.time() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for t in clients:
+            t.join(10)
+
+        # A request that asks for a fresh answer gets its own call
+        conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=10)
+        conn.request("POST", "/process_zw", body=json.dumps({"zw_data": "ZW-REQUEST: x", "cache": False}))
+        assert json.loads(conn.getresponse().read())["response"] == "ZW-MESH:\n  NAME: Shared\n///"
+        conn.close()
+
+    assert results == ["ZW-MESH:\n  NAME: Shared\n///"] * 5
+    assert len(calls) == 2 and daemon.coalesced == 4
+
+
+def test_open_circuit_is_503_with_retry_after(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_mcp_daemon, "LOG_PATH", tmp_path / "daemon.log")
+
+    def down(prompt):
+        raise CircuitOpenError(11.2)
+
+    with running_daemon(ZWDaemon(query=down, query_stream=None)) as (_, http_port):
+        conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=10)
+        conn.request("POST", "/process_zw", body=json.dumps({"zw_data": "ZW-REQUEST: x"}))
+        resp = conn.getresponse()
+        assert resp.status == 503 and resp.getheader("Retry-After") == "12"
+        assert json.loads(resp.read())["retry_after"] == 11.2
+        conn.close()
+
+
+def test_metrics_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_mcp_daemon, "LOG_PATH", tmp_path / "daemon.log")
+    with running_daemon(ZWDaemon(query=FakeUpstream(), query_stream=None)) as (_, http_port):
+        conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=10)
+        for body in ({"zw_data": "ZW-REQUEST: x", "priority": "batch"}, ["not", "an", "object"]):
+            conn.request("POST", "/process_zw", body=json.dumps(body))
+            conn.getresponse().read()
+        conn.request("GET", "/metrics")
+        resp = conn.getresponse()
+        assert resp.status == 200 and resp.getheader("Content-Type").startswith("text/plain; version=0.0.4")
+        lines = resp.read().decode("utf-8").splitlines()
+        conn.close()
+    assert 'zw_requests_total{transport="http"} 2' in lines
+    assert 'zw_request_errors_total{transport="http",reason="bad_request"} 1' in lines
+    assert 'zw_request_duration_seconds_count{transport="http"} 2' in lines
+    assert 'zw_queue_wait_seconds_bucket{priority="batch",le="+Inf"} 1' in lines
+    assert f'zw_upstream_duration_seconds_count{{model="{DEFAULT_MODEL}"}} 1' in lines
+    assert "zw_upstream_in_flight 0" in lines
+    assert "# TYPE zw_ollama_eval_tokens_total counter" in lines
+    # Totals are counters with the _total suffix, so rate() copes with restarts
+    for name in ("zw_coalesced_requests_total", "zw_cache_hits_total", "zw_cache_misses_total",
+                 "zw_blender_jobs_finished_total", "zw_log_dropped_records_total"):
+        assert f"# TYPE {name} counter" in lines
+    assert 'zw_blender_jobs_finished_total{state="succeeded"} 0' in lines
+
+
+def test_overload_is_refused_early(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_mcp_daemon, "LOG_PATH", tmp_path / "daemon.log")
+    release = threading.Event()
+
+    def query(prompt):
+        assert release.wait(5)
+        return prompt
+
+    def post(http_port, body, headers=None):
+        conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=10)
+        conn.request("POST", "/process_zw", body=json.dumps(body), headers=headers or {})
+        resp = conn.getresponse()
+        result = resp.status, resp.getheader("Retry-After"), json.loads(resp.read())
+        conn.close()
+        return result
+
+    daemon = ZWDaemon(query=query, query_stream=None, max_upstream=1, max_queue=1)
+    with running_daemon(daemon) as (tcp_port, http_port):
+        held = [threading.Thread(target=post, args=(http_port, {"zw_data": f"held {i}"})) for i in range(2)]
+        for i, t in enumerate(held, 1):
+            t.start()
+            deadline = time.time() + 5
+            while daemon.scheduler.queued + daemon.in_flight < i and time.time() < deadline:
+                time.sleep(0.005)
+
+        # One running, one queued: the next request is refused instead of waiting
+        status, retry_after, payload = post(http_port, {"zw_data": "one too many", "stream": True})
+        assert status == 503 and int(retry_after) >= 1 and "queue is full" in payload["error"]
+        with ZWClient("127.0.0.1", tcp_port, timeout=10) as client:
+            with pytest.raises(RemoteError) as info:
+                client.request("framed too")
+            assert info.value.status == 503 and info.value.retry_after >= 1
+        release.set()
+        for t in held:
+            t.join(10)
+    assert daemon.stats()["admission"]["rejected"] == {"queue_full": 2}
+
+    daemon = ZWDaemon(query=FakeUpstream(), query_stream=None,
+                      admission=AdmissionController(2, 8, client_rate=0.01, client_burst=1))
+    with running_daemon(daemon) as (_, http_port):
+        assert post(http_port, {"zw_data": "a"}, {"X-ZW-Client": "hub"})[0] == 200
+        status, retry_after, _ = post(http_port, {"zw_data": "b"}, {"X-ZW-Client": "hub"})
+        assert status == 429 and int(retry_after) > 1
+        assert post(http_port, {"zw_data": "c"}, {"X-ZW-Client": "agent-2"})[0] == 200
+
+
+def test_interactive_requests_jump_the_batch_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_mcp_daemon, "LOG_PATH", tmp_path / "daemon.log")
+    calls = []
+
+    def query(prompt):
+        calls.append(prompt)
+        time.sleep(0.05)
+        return prompt
+
+    def post(http_port, prompt, priority):
+        conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=10)
+        conn.request("POST", "/process_zw", body=json.dumps({"zw_data": prompt, "priority": priority}))
+        assert conn.getresponse().status == 200
+        conn.close()
+
+    daemon = ZWDaemon(query=query, query_stream=None, max_upstream=1)
+    with running_daemon(daemon) as (_, http_port):
+        batch = [threading.Thread(target=post, args=(http_port, f"batch {i}", "batch")) for i in range(5)]
+        for t in batch:
+            t.start()
+        deadline = time.time() + 5
+        while daemon.scheduler.queued < 4 and time.time() < deadline:
+            time.sleep(0.005)
+        post(http_port, "interactive", "interactive")
+        for t in batch:
+            t.join(10)
+
+        conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=10)
+        conn.request("POST", "/process_zw", body=json.dumps({"zw_data": "x", "priority": "urgent"}))
+        assert conn.getresponse().status == 400
+        conn.close()
+
+    assert calls.index("interactive") == 1
+    classes = daemon.stats()["scheduler"]["classes"]
+    assert classes["interactive"]["wait_max_ms"] < classes["batch"]["wait_max_ms"]
+
+
+def test_framed_protocol_pipelines_out_of_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_mcp_daemon, "LOG_PATH", tmp_path / "daemon.log")
+    release = threading.Event()
+
+    def stream(prompt, **kwargs):
+        if prompt == "slow":
+            assert release.wait(5)
+        yield f"{prompt} "
+        yield "done ///"
+
+    daemon = ZWDaemon(query=None, query_stream=stream, max_upstream=3)
+    with running_daemon(daemon) as (tcp_port, _):
+        with ZWClient("127.0.0.1", tcp_port, timeout=10) as client:
+            slow = client.submit("slow")
+            fast = client.submit("fast with /// inside and a ü")
+            # The later request finishes first while the earlier one is still generating
+            assert client.result(fast) == "fast with /// inside and a ü done ///"
+            release.set()
+            assert client.result(slow) == "slow done ///"
+
+            pieces = []
+            assert client.request("streamed", on_token=pieces.append) == "streamed done ///"
+            assert pieces == ["streamed ", "done ///"]
+
+            with pytest.raises(RemoteError, match="priority"):
+                client.request("x", priority="urgent")
+
+        # Rounds from the agent share one connection
+        assert send_to_daemon("127.0.0.1", tcp_port, "round 1\n///") == "round 1 done ///"
+        first = ollama_agent._daemon_clients[("127.0.0.1", tcp_port)]
+        assert send_to_daemon("127.0.0.1", tcp_port, "round 2\n///") == "round 2 done ///"
+        assert ollama_agent._daemon_clients[("127.0.0.1", tcp_port)] is first
+        ollama_agent._drop_daemon_client("127.0.0.1", tcp_port)
+
+        # Legacy clients still work on the same port
+        assert tcp_request(tcp_port, b"legacy\n///") == "legacy done ///"
+
+
+def test_framed_protocol_rejects_unknown_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_mcp_daemon, "LOG_PATH", tmp_path / "daemon.log")
+    with running_daemon(ZWDaemon(query=FakeUpstream(), query_stream=None)) as (tcp_port, _):
+        with socket.create_connection(("127.0.0.1", tcp_port), timeout=10) as sock:
+            frame = bytearray(encode_frame(FRAME_REQUEST, 1, {"prompt": "x"}))
+            frame[len(FRAME_MAGIC)] = 99  # version byte
+            sock.sendall(frame)
+            reply = sock.makefile("rb").read()
+        header = FRAME_HEADER.unpack(reply[:FRAME_HEADER.size])
+        assert header[3] == 0 and b"unsupported protocol version 99" in reply
+
+
+def test_framed_client_ignores_replies_to_cancelled_requests():
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        def daemon():
+            conn, _ = server.accept()
+            with conn:
+                rfile = conn.makefile("rb")
+                ids = [recv_frame(rfile).request_id for _ in range(3)]  # two requests and a cancel
+                conn.sendall(encode_frame(FRAME_ERROR, ids[0], {"error": "busy", "status": 503, "retry_after": 1}))
+                conn.sendall(encode_frame(FRAME_DONE, ids[1], {"response": "still fine"}))
+                recv_frame(rfile)
+
+        thread = threading.Thread(target=daemon)
+        thread.start()
+        with ZWClient(*server.getsockname(), timeout=10) as client:
+            dropped = client.submit("dropped")
+            kept = client.submit("kept")
+            client.cancel(dropped)
+            assert client.result(kept) == "still fine"
+        thread.join(5)
+
+
+def test_framed_client_never_uses_request_id_zero():
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        with ZWClient(*server.getsockname(), timeout=10) as client:
+            client._ids = itertools.count(0xFFFFFFFF)
+            client._pending[1] = object()  # still in flight from before the wrap
+            assert [client._next_id() for _ in range(3)] == [0xFFFFFFFF, 2, 3]
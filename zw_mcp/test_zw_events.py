@@ -0,0 +1,221 @@
+# zw_mcp/test_zw_events.py
+import io
+
+from zw_parser import (
+    ZW_END, ZW_START, ZW_VALUE, iter_zw_blocks, iter_zw_documents, iter_zw_events, parse_zw,
+)
+
+SAMPLE = """ZW-OBJECT:
+  NAME: Orb
+  MATERIAL:
+    BASE_COLOR: "#33AAFF"
+  # comment
+  LOCATION: (0, 0, 1)
+ZW-LIGHT:
+  NAME: Key
+"""
+
+
+def test_events_are_balanced_and_carry_line_numbers():
+    events = list(iter_zw_events(SAMPLE))
+    kinds = [e.kind for e in events]
+    assert kinds.count(ZW_START) == kinds.count(ZW_END) == 3
+    assert events[0] == (ZW_START, "ZW-OBJECT", None, 1, 0)
+    assert (ZW_VALUE, "BASE_COLOR", '"#33AAFF"', 4, 4) in events
+    assert (ZW_VALUE, "LOCATION", "(0, 0, 1)", 6, 2) in events
+
+
+def test_parse_zw_accepts_streams_and_split_utf8_chunks():
+    text = "ZW-NARRATIVE:\n  LINE: “I’ve been here before.”\n"
+    data = text.encode("utf-8")
+    chunks = [data[i:i + 3] for i in range(0, len(data), 3)]
+    expected = parse_zw(text)
+    assert expected == {"ZW-NARRATIVE": {"LINE": "“I’ve been here before.”"}}
+    assert parse_zw(chunks) == expected
+    assert parse_zw(io.BytesIO(data)) == expected
+    assert parse_zw(io.StringIO(text)) == expected
+
+
+def test_parse_zw_keeps_legacy_first_line_stripping():
+    # The first line's indentation is dropped, so B nests under A
+    assert parse_zw("\n   A:\n   B: 1\n") == {"A": {"B": "1"}}
+
+
+MULTI_DOC = """// Parts library
+ZW-MESH:
+  NAME: A
+///
+ZW-MESH:
+  NAME: B
+ZW-MESH:
+  NAME: C
+///
+///
+"""
+
+
+def test_iter_zw_documents_keeps_repeated_blocks():
+    docs = list(iter_zw_documents(io.StringIO(MULTI_DOC)))
+    assert docs == [
+        {"ZW-MESH": {"NAME": "A"}},
+        {"ZW-MESH": [{"NAME": "B"}, {"NAME": "C"}]},
+    ]
+
+
+def test_iter_zw_documents_is_lazy():
+    def chunks():
+        yield "ZW-MESH:\n  NAME: A\n///\n"
+        raise AssertionError("read past the first document")
+
+    assert next(iter_zw_documents(chunks())) == {"ZW-MESH": {"NAME": "A"}}
+
+
+def test_iter_zw_blocks_reports_document_index():
+    blocks = [(b.key, b.value["NAME"], b.document) for b in iter_zw_blocks(MULTI_DOC)]
+    assert blocks == [("ZW-MESH", "A", 0), ("ZW-MESH", "B", 1), ("ZW-MESH", "C", 1)]
+
+
+TYPED = """ZW-MESH:
+  NAME: Pillar
+  LOCATION: "(0,0,-0.25)" // sits low
+  SCALE: 2
+  ROTATION: (not, a, vector)
+  PARAMS:
+    VERTICES: 12
+    DEPTH: 2.0 // height
+  MATERIAL:
+    BASE_COLOR: "#FF0000"
+    EMISSION_COLOR: (0, 1, 0)
+"""
+
+
+def test_typed_mode_decodes_schema_fields_once():
+    mesh = parse_zw(TYPED, typed=True)["ZW-MESH"]
+    assert mesh["NAME"] == "Pillar"
+    assert mesh["LOCATION"] == (0.0, 0.0, -0.25)
+    assert mesh["SCALE"] == 2.0
+    assert mesh["ROTATION"] == "(not, a, vector)"  # undecodable values stay strings
+    assert mesh["PARAMS"] == {"VERTICES": 12, "DEPTH": 2.0}
+    assert mesh["MATERIAL"]["BASE_COLOR"] == (1.0, 0.0, 0.0, 1.0)
+    assert mesh["MATERIAL"]["EMISSION_COLOR"] == (0.0, 1.0, 0.0, 1.0)
+    assert parse_zw(TYPED)["ZW-MESH"]["SCALE"] == "2"
+
+
+def test_typed_mode_custom_schema_and_blocks():
+    schema = {"NAME": str.lower, "PARAMS/*": "number"}
+    mesh = parse_zw(TYPED, typed=schema)["ZW-MESH"]
+    assert mesh["NAME"] == "pillar" and mesh["PARAMS"]["VERTICES"] == 12
+    assert mesh["LOCATION"] == '"(0,0,-0.25)" // sits low'
+    block = next(iter_zw_blocks(TYPED, typed=True))
+    assert block.value["LOCATION"] == (0.0, 0.0, -0.25)
+
+
+def test_handlers_accept_pre_decoded_values():
+    from utils import parse_color, safe_eval
+
+    assert safe_eval((1.0, 2.0, 3.0), (0, 0, 0)) == (1.0, 2.0, 3.0)
+    assert safe_eval("(0, 0, 1)", None) == (0, 0, 1)
+    assert safe_eval("[a, b]", "default") == "default"
+    assert parse_color((1.0, 0.5, 0.0)) == (1.0, 0.5, 0.0, 1.0)
+
+
+def test_parse_number_only_takes_plain_numbers():
+    from utils import parse_number, safe_eval
+
+    assert [parse_number(text) for text in ("12", "-3", "+4", "1.5", ".5", "2.", "1e3", "-2.5E-2")] == \
+        [12, -3, 4, 1.5, 0.5, 2.0, 1000.0, -0.025]
+    assert isinstance(parse_number("12"), int) and isinstance(parse_number("1e3"), float)
+    for text in ("nan", "inf", "-Infinity", "1_000", " 12 ", "0x10", "1e", ".", "", "12abc"):
+        assert parse_number(text) is None, text
+    assert safe_eval("inf", "default") == "default"
+    assert safe_eval("nan", "default") == "default"
+    assert safe_eval(" 12 ", None) == 12
+
+
+def test_dump_zw_streams_lists_with_item_syntax():
+    from zw_parser import dump_zw, iterencode, to_zw
+
+    stage = {"ZW-STAGE": {
+        "NAME": "Show",
+        "TRACKS": [
+            {"TYPE": "VISIBILITY", "KEYFRAMES": [{"FRAME": 1, "VALUE": 0}]},
+            {"TYPE": "MATERIAL_OVERRIDE"},
+        ],
+        "TAGS": ["crystal", "blue"],
+    }}
+    expected = """ZW-STAGE:
+  NAME: Show
+  TRACKS:
+    - TYPE: VISIBILITY
+      KEYFRAMES:
+        - FRAME: 1
+          VALUE: 0
+    - TYPE: MATERIAL_OVERRIDE
+  TAGS:
+    - crystal
+    - blue
+"""
+    out = io.StringIO()
+    dump_zw(stage, out)
+    assert out.getvalue() == expected
+    assert "".join(iterencode(stage)) == expected
+    assert to_zw(stage) + "\n" == expected
+
+
+def test_parse_zw_parallel_matches_serial_order(tmp_path, monkeypatch):
+    import zw_parser
+
+    monkeypatch.setattr(zw_parser, "PARALLEL_MIN_CHUNK_BYTES", 64)
+    text = "".join(f"ZW-OBJECT:\n  NAME: Obj{i}\n  LOCATION: ({i}, 0, 0)\n///\n" for i in range(40))
+    path = tmp_path / "many.zw"
+    path.write_text(text + "ZW-LIGHT:\n  NAME: Last\n", encoding="utf-8")
+
+    ranges = zw_parser.split_zw_documents(path, 8)
+    assert len(ranges) > 1 and ranges[0][0] == 0 and ranges[-1][1] == path.stat().st_size
+    assert all(text.encode()[end - 4:end] == b"///\n" for _, end in ranges[:-1])
+
+    expected = list(iter_zw_documents(text + "ZW-LIGHT:\n  NAME: Last\n"))
+    assert zw_parser.parse_zw_parallel(path, workers=2) == expected
+    assert zw_parser.parse_zw_parallel(path, workers=2, typed=True)[3]["ZW-OBJECT"]["LOCATION"] == (3, 0, 0)
+
+
+def test_structural_hash_ignores_layout_and_finds_changed_nodes():
+    from zw_parser import zw_changed_paths, zw_hash, zw_hash_tree
+
+    old = parse_zw(SAMPLE)
+    reordered = parse_zw("""ZW-LIGHT:
+  NAME: Key
+ZW-OBJECT:
+  LOCATION: ( 0,0,1 )  // moved later
+  MATERIAL:
+    BASE_COLOR: "#33AAFF"
+  NAME: Orb
+""")
+    assert zw_hash(old) == zw_hash(reordered)
+    typed = parse_zw(SAMPLE, typed=True)["ZW-OBJECT"]["LOCATION"]
+    assert zw_hash(typed) == zw_hash(old["ZW-OBJECT"]["LOCATION"])
+
+    new = parse_zw(SAMPLE.replace("#33AAFF", "#FF0000") + "ZW-CAMERA:\n  NAME: Cam\n")
+    old_tree, new_tree = zw_hash_tree(old), zw_hash_tree(new)
+    assert old_tree.children["ZW-LIGHT"].digest == new_tree.children["ZW-LIGHT"].digest
+    assert sorted(zw_changed_paths(old_tree, new_tree)) == [
+        ("ZW-CAMERA",), ("ZW-OBJECT", "MATERIAL", "BASE_COLOR"),
+    ]
+
+
+def test_diff_zw_addresses_blocks_by_name_and_patch_round_trips():
+    from zw_parser import ZWSnapshot, apply_zw_patch, diff_zw, zw_hash
+
+    old = SAMPLE + "ZW-OBJECT:\n  NAME: Cube\n  SCALE: (1, 1, 1)\n"
+    new = SAMPLE.replace("(0, 0, 1)", "(0, 0, 2)").replace("  NAME: Key\n", "  NAME: Key\n  ENERGY: 500\n")
+
+    patch = diff_zw(ZWSnapshot(old), new)
+    assert patch == [
+        {"op": "remove", "block": "ZW-OBJECT", "name": "Cube", "path": []},
+        {"op": "replace", "block": "ZW-OBJECT", "name": "Orb", "path": ["LOCATION"], "value": "(0, 0, 2)"},
+        {"op": "add", "block": "ZW-LIGHT", "name": "Key", "path": ["ENERGY"], "value": "500"},
+    ]
+    patched = apply_zw_patch(old, patch)
+    assert zw_hash(patched) == zw_hash(parse_zw(new))
+    assert diff_zw(patched, new) == []
+    assert diff_zw(old, old.replace("(1, 1, 1)", "(1,1,1)")) == []
@@ -0,0 +1,61 @@
+# zw_mcp/test_zw_index.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from zw_index import build_index, index_path_for, load_block, open_index
+
+LIBRARY = """// Parts library
+ZW-MESH:
+  NAME: Pillar_A
+  PARAMS:
+    NAME: not-the-block-name
+    DEPTH: 2.0
+///
+ZW-MESH:
+  NAME: "Crystal_B" // glowing
+  LOCATION: (0, 0, 1)
+ZW-STAGE:
+  NAME: Crystal_B
+"""
+
+
+def test_load_block_reads_only_the_named_block(tmp_path):
+    path = tmp_path / "parts.zw"
+    path.write_text(LIBRARY, encoding="utf-8")
+
+    assert load_block(path, "Pillar_A") == {"NAME": "Pillar_A", "PARAMS": {"NAME": "not-the-block-name", "DEPTH": "2.0"}}
+    assert load_block(path, "Crystal_B", "ZW-MESH", typed=True)["LOCATION"] == (0.0, 0.0, 1.0)
+    assert load_block(path, "Crystal_B", "ZW-STAGE") == {"NAME": "Crystal_B"}
+    assert index_path_for(path).exists()
+    try:
+        load_block(path, "Missing")
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("expected KeyError")
+
+
+def test_index_is_rebuilt_when_the_file_changes(tmp_path):
+    path = tmp_path / "parts.zw"
+    path.write_text(LIBRARY, encoding="utf-8")
+    with open_index(path) as index:
+        assert [e.name for e in index.blocks("ZW-MESH")] == ["Pillar_A", "Crystal_B"]
+
+    # Touched but unchanged: still fresh after re-hashing
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    with open_index(path) as index:
+        assert index.meta()["mtime_ns"] == str(path.stat().st_mtime_ns)
+
+    path.write_text(LIBRARY + "ZW-MESH:\n  NAME: Added_C\n", encoding="utf-8")
+    assert load_block(path, "Added_C") == {"NAME": "Added_C"}
+
+
+def test_concurrent_builds_do_not_share_a_temp_file(tmp_path):
+    path = tmp_path / "parts.zw"
+    path.write_text(LIBRARY * 200, encoding="utf-8")
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda _: build_index(path), range(8)))
+    with open_index(path) as index:
+        assert len(index.blocks("ZW-MESH")) == 400
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["parts.zw", "parts.zw.zwi"]
@@ -0,0 +1,110 @@
+# zw_mcp/test_zw_jobs.py
+import asyncio
+import http.client
+import json
+import sys
+import time
+
+import zw_mcp_daemon
+from test_zw_daemon import FakeUpstream, running_daemon
+from zw_jobs import BlenderJobQueue
+from zw_mcp_daemon import ZWDaemon
+
+# Stands in for engain_orbit: records the payload it was given, then takes a moment
+FAKE_ORBIT = "import sys, time; print(open(sys.argv[1]).read()); time.sleep(0.2)"
+
+# Stands in for engain_orbit launching Blender: a grandchild that outlives its parent unless the group dies
+HANGING_ORBIT = ("import subprocess, sys, time; "
+                 "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)']); "
+                 "open(sys.argv[1], 'w').write(str(child.pid)); time.sleep(60)")
+
+
+def fake_orbit(path):
+    return [sys.executable, "-c", FAKE_ORBIT, str(path)]
+
+
+def get_json(conn, path):
+    conn.request("GET", path)
+    resp = conn.getresponse()
+    return resp.status, json.loads(resp.read())
+
+
+def test_route_to_blender_runs_queued_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw_mcp_daemon, "LOG_PATH", tmp_path / "daemon.log")
+    jobs = BlenderJobQueue(workers=1, spool_dir=tmp_path / "spool", command=fake_orbit,
+                           log_path=tmp_path / "jobs.log")
+    with running_daemon(ZWDaemon(query=FakeUpstream(), query_stream=None, jobs=jobs)) as (_, http_port):
+        conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=10)
+        ids = []
+        for i in range(2):
+            body = {"zw_data": f"ZW-MESH:\n  NAME: cube{i}", "route_to_blender": True, "cache": False}
+            conn.request("POST", "/process_zw", body=json.dumps(body))
+            job = json.loads(conn.getresponse().read())["blender_job"]
+            assert job["url"] == f"/jobs/{job['id']}"
+            ids.append(job["id"])
+        assert ids[0] != ids[1]
+
+        # One worker: the second job waits for the first
+        assert get_json(conn, f"/jobs/{ids[1]}")[1]["state"] == "queued"
+        deadline = time.time() + 10
+        while get_json(conn, f"/jobs/{ids[1]}")[1]["state"] != "succeeded" and time.time() < deadline:
+            time.sleep(0.05)
+        first, second = (get_json(conn, f"/jobs/{job_id}")[1] for job_id in ids)
+        assert first["state"] == second["state"] == "succeeded"
+        assert "NAME: cube1" in second["output"]
+        assert second["started"] >= first["finished"]
+        assert first["run_seconds"] >= 0.2 and second["wait_seconds"] >= 0.2
+        assert get_json(conn, "/jobs/nope")[0] == 404
+        conn.close()
+    assert not list((tmp_path / "spool").glob("*.zw"))
+
+
+def test_recovers_spooled_payloads(tmp_path):
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    (spool / "web_zw_left0ver.zw").write_text("ZW-MESH:\n  NAME: leftover\n", encoding="utf-8")
+
+    async def main():
+        jobs = BlenderJobQueue(workers=2, spool_dir=spool, command=fake_orbit, log_path=tmp_path / "jobs.log")
+        await jobs.start()
+        assert await jobs.recover() == 1
+        assert await jobs.recover() == 0  # already queued, or done and unspooled
+        job = jobs.get("left0ver")
+        while not job.done:
+            await asyncio.sleep(0.05)
+        await jobs.close()
+        return job
+
+    job = asyncio.run(main())
+    assert job.state == "succeeded" and "leftover" in job.output
+    assert not (spool / "web_zw_left0ver.zw").exists()
+
+
+def test_timeout_kills_the_whole_process_group(tmp_path):
+    async def main():
+        jobs = BlenderJobQueue(workers=1, spool_dir=tmp_path / "spool", timeout=1,
+                               command=lambda path: [sys.executable, "-c", HANGING_ORBIT, str(tmp_path / "pid")],
+                               log_path=tmp_path / "jobs.log")
+        await jobs.start()
+        job = await jobs.submit("ZW-MESH:\n  NAME: stuck\n")
+        while not job.done:
+            await asyncio.sleep(0.05)
+        await jobs.close()
+        return job
+
+    job = asyncio.run(asyncio.wait_for(main(), 20))
+    assert job.state == "timed_out"
+    grandchild = int((tmp_path / "pid").read_text())
+    deadline = time.time() + 5
+    while _alive(grandchild) and time.time() < deadline:
+        time.sleep(0.05)
+    assert not _alive(grandchild)
+
+
+def _alive(pid):
+    # A killed grandchild may linger as a zombie until init reaps it
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,84 @@
+# zw_mcp/test_zw_log.py
+import gzip
+import json
+import threading
+
+from zw_log import LogWriter, get_writer, log_event
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_writes_jsonl_in_background(tmp_path):
+    path = tmp_path / "logs" / "daemon.log"
+    writer = LogWriter(path)
+    writer.write("exchange", prompt="SCOPE: café", response="ok")
+    writer.write("exchange", prompt="second", response={"nested": 1})
+    assert writer.flush()
+    records = read_records(path)
+    assert [r["prompt"] for r in records] == ["SCOPE: café", "second"]
+    assert records[1]["response"] == {"nested": 1}
+    assert all("ts" in r and r["event"] == "exchange" for r in records)
+    writer.close()
+    assert writer.stats()["written"] == 2
+
+
+def test_rotates_by_size_and_keeps_gzipped_backups(tmp_path):
+    path = tmp_path / "orbit_exec.log"
+    writer = LogWriter(path, max_bytes=200, rotate_seconds=0, backups=2)
+    for i in range(12):
+        writer.write("orbit", message=f"routed payload {i} " + "x" * 100)
+        writer.flush()
+    writer.close()
+    backups = sorted(tmp_path.glob("orbit_exec.log.*.gz"))
+    assert writer.rotations >= 3
+    assert len(backups) == 2
+    with gzip.open(backups[-1], "rt", encoding="utf-8") as f:
+        assert json.loads(f.readline())["event"] == "orbit"
+
+
+def test_rotates_by_age(tmp_path):
+    now = [1000.0]
+    path = tmp_path / "watchdog.log"
+    writer = LogWriter(path, max_bytes=0, rotate_seconds=60, clock=lambda: now[0])
+    writer.write("watchdog", message="first")
+    writer.flush()
+    now[0] += 61
+    writer.write("watchdog", message="second")
+    writer.flush()
+    writer.close()
+    assert writer.rotations == 1
+    assert len(list(tmp_path.glob("watchdog.log.*.gz"))) == 1
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path, monkeypatch):
+    path = tmp_path / "slow.log"
+    writer = LogWriter(path, queue_size=2)
+    gate = threading.Event()
+    real_write = writer._write
+
+    def slow_write(records):
+        gate.wait(5)
+        real_write(records)
+    monkeypatch.setattr(writer, "_write", slow_write)
+
+    writer.write("held")  # picked up by the writer thread, which then blocks
+    for _ in range(50):
+        writer.write("burst")
+    assert writer.stats()["dropped"] > 0
+    gate.set()
+    writer.flush()
+    writer.write("after")
+    writer.flush()
+    writer.close()
+    dropped = [r for r in read_records(path) if r["event"] == "log_dropped"]
+    assert sum(r["dropped"] for r in dropped) == writer.dropped
+
+
+def test_shared_writer_per_path(tmp_path):
+    path = tmp_path / "agent.log"
+    assert get_writer(path) is get_writer(str(path))
+    log_event(path, "agent_round", round=1)
+    get_writer(path).close()
+    assert read_records(path)[0]["round"] == 1
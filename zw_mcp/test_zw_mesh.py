@@ -0,0 +1,81 @@
+# zw_mcp/test_zw_mesh.py
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+from zw_parser import parse_zw_compact
+
+SCENE = """ZW-MESH:
+  NAME: Tiled
+  MATERIAL:
+    NAME: Tiles
+    BASE_COLOR: "#FF0000"
+    TEXTURE:
+      TYPE: noise
+      SCALE: 4
+"""
+
+
+class _Sockets(dict):
+    def __missing__(self, name):
+        socket = self[name] = types.SimpleNamespace(default_value=None)
+        return socket
+
+
+class _Node:
+    def __init__(self, type):
+        self.type = type
+        self.inputs = _Sockets()
+        self.outputs = _Sockets()
+
+
+class _Nodes(list):
+    def new(self, type):
+        node = _Node({"ShaderNodeBsdfPrincipled": "BSDF_PRINCIPLED"}.get(type, "OUTPUT_MATERIAL"))
+        self.append(node)
+        return node
+
+
+class _Links(list):
+    def new(self, from_socket, to_socket):
+        self.append((from_socket, to_socket))
+
+
+@pytest.fixture
+def zw_mesh(monkeypatch):
+    """zw_mesh with just enough of bpy/mathutils in place to import it and build a material."""
+    materials = {}
+
+    def new_material(name):
+        material = materials[name] = types.SimpleNamespace(
+            name=name, use_nodes=False, node_tree=types.SimpleNamespace(nodes=_Nodes(), links=_Links()))
+        return material
+
+    bpy = types.ModuleType("bpy")
+    bpy.types = types.SimpleNamespace(Object=object, ShaderNode=object)
+    bpy.data = types.SimpleNamespace(materials=types.SimpleNamespace(get=materials.get, new=new_material))
+    mathutils = types.ModuleType("mathutils")
+    mathutils.Vector = tuple
+    monkeypatch.setitem(sys.modules, "bpy", bpy)
+    monkeypatch.setitem(sys.modules, "mathutils", mathutils)
+    monkeypatch.syspath_prepend(str(Path(__file__).resolve().parents[1]))  # for `zw_mcp.utils`
+    monkeypatch.delitem(sys.modules, "zw_mesh", raising=False)
+    import zw_mesh
+    return zw_mesh
+
+
+def test_apply_material_takes_texture_from_a_compact_tree(zw_mesh, monkeypatch):
+    applied = []
+    monkeypatch.setattr(zw_mesh, "apply_texture_to_material_nodes",
+                        lambda bsdf, texture, obj: applied.append(dict(texture)))
+    obj = types.SimpleNamespace(name="Tiled", data=types.SimpleNamespace(materials=[]))
+    material = parse_zw_compact(SCENE)["ZW-MESH"]["MATERIAL"]
+    assert not isinstance(material["TEXTURE"], dict)  # a ZWBMapping, not a plain dict
+
+    zw_mesh.apply_material(obj, material)
+    assert applied == [{"TYPE": "noise", "SCALE": "4"}]
+    assert obj.data.materials[0].name == "Tiles"
+    bsdf = obj.data.materials[0].node_tree.nodes[0]
+    assert bsdf.inputs["Base Color"].default_value is None  # the texture drives the base color
@@ -0,0 +1,32 @@
+# zw_mcp/test_zw_metrics.py
+import pytest
+
+from zw_metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_renders_prometheus_text():
+    registry = Registry()
+    calls = Counter("calls_total", "Calls.", ["route"], registry)
+    depth = Gauge("depth", "Queue depth.", [], registry)
+    latency = Histogram("latency_seconds", "Latency.", ["route"], registry, buckets=(0.1, 1))
+    calls.labels('a "quoted"\nroute').inc()
+    depth.set(3)
+    for value in (0.05, 0.1, 0.5, 7):
+        latency.labels("a").observe(value)
+    assert registry.render().splitlines() == [
+        "# HELP calls_total Calls.",
+        "# TYPE calls_total counter",
+        'calls_total{route="a \\"quoted\\"\\nroute"} 1',
+        "# HELP depth Queue depth.",
+        "# TYPE depth gauge",
+        "depth 3",
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="a",le="0.1"} 2',
+        'latency_seconds_bucket{route="a",le="1"} 3',
+        'latency_seconds_bucket{route="a",le="+Inf"} 4',
+        'latency_seconds_sum{route="a"} 7.65',
+        'latency_seconds_count{route="a"} 4',
+    ]
+    with pytest.raises(ValueError):
+        calls.labels("a", "b")
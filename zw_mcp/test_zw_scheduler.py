@@ -0,0 +1,114 @@
+# zw_mcp/test_zw_scheduler.py
+import asyncio
+
+from zw_scheduler import UpstreamScheduler, parse_model_limits
+
+
+async def _grant_order(scheduler, tickets):
+    """Holds one slot, queues `tickets` ((model, priority) pairs), then records the order they run in."""
+    order = []
+
+    async def run(name, model, priority):
+        async with scheduler.ticket(model, priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    blocker = scheduler.ticket("llama3.2", "batch")
+    await blocker.acquire()
+    tasks = [asyncio.create_task(run(f"{model}/{priority}", model, priority)) for model, priority in tickets]
+    await asyncio.sleep(0)
+    blocker.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_priority_classes():
+    scheduler = UpstreamScheduler(1)
+    order = asyncio.run(_grant_order(scheduler, [
+        ("llama3.2", "batch"), ("llama3.2", "agent"), ("llama3.2", "batch"), ("llama3.2", "interactive"),
+    ]))
+    assert order == ["llama3.2/interactive", "llama3.2/agent", "llama3.2/batch", "llama3.2/batch"]
+    stats = scheduler.stats()["classes"]
+    assert stats["batch"]["served"] == 3 and stats["interactive"]["served"] == 1
+    assert stats["batch"]["wait_max_ms"] >= stats["interactive"]["wait_max_ms"]
+
+
+def test_model_affinity_within_a_class():
+    # The slot holder used llama3.2, so queued llama3.2 work goes before the earlier mistral request
+    order = asyncio.run(_grant_order(UpstreamScheduler(1), [
+        ("mistral", "agent"), ("llama3.2", "agent"), ("llama3.2", "interactive"),
+    ]))
+    assert order == ["llama3.2/interactive", "llama3.2/agent", "mistral/agent"]
+
+
+def test_aging_lets_batch_through():
+    now = [0.0]
+    scheduler = UpstreamScheduler(1, aging=10, clock=lambda: now[0])
+
+    async def main():
+        blocker = scheduler.ticket("m", "agent")
+        await blocker.acquire()
+        old = asyncio.create_task(scheduler.ticket("m", "batch").acquire())
+        await asyncio.sleep(0)
+        now[0] = 25  # two classes' worth of waiting: batch now ranks as interactive
+        new = asyncio.create_task(scheduler.ticket("m", "agent").acquire())
+        await asyncio.sleep(0)
+        blocker.release()
+        await asyncio.sleep(0)
+        assert old.done() and not new.done()
+        new.cancel()
+
+    asyncio.run(main())
+    assert scheduler.queued == 0
+
+
+def test_per_model_limit_and_reserved_interactive():
+    async def main():
+        scheduler = UpstreamScheduler(3, model_limits={"big": 1}, reserved_interactive=1)
+        first = scheduler.ticket("big", "batch")
+        await first.acquire()
+        second = asyncio.create_task(scheduler.ticket("big", "batch").acquire())
+        other = asyncio.create_task(scheduler.ticket("small", "batch").acquire())
+        await asyncio.sleep(0)
+        assert not second.done() and other.done()  # "big" is at its cap of 1
+
+        # Two slots busy out of three, and one is reserved: only interactive work gets it
+        batch = asyncio.create_task(scheduler.ticket("small", "batch").acquire())
+        interactive = asyncio.create_task(scheduler.ticket("small", "interactive").acquire())
+        await asyncio.sleep(0)
+        assert interactive.done() and not batch.done()
+        assert scheduler.stats()["running"] == {"big": 1, "small": 2}
+        for task in (second, batch):
+            task.cancel()
+        await asyncio.gather(second, batch, return_exceptions=True)
+        assert scheduler.queued == 0
+
+    asyncio.run(main())
+
+
+def test_promote_waiting_ticket():
+    async def main():
+        scheduler = UpstreamScheduler(1)
+        order = []
+
+        async def run(ticket, name):
+            async with ticket:
+                order.append(name)
+
+        blocker = scheduler.ticket("m", "agent")
+        await blocker.acquire()
+        shared = scheduler.ticket("m", "batch")
+        tasks = [asyncio.create_task(run(shared, "shared")),
+                 asyncio.create_task(run(scheduler.ticket("m", "agent"), "agent"))]
+        await asyncio.sleep(0)
+        shared.promote("interactive")  # an interactive request joined this call
+        blocker.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ["shared", "agent"]
+
+
+def test_parse_model_limits():
+    assert parse_model_limits("llama3.2=1, mistral:7b=2,") == {"llama3.2": 1, "mistral:7b": 2}
+    assert parse_model_limits("") == {}
@@ -0,0 +1,196 @@
+# zw_mcp/test_zw_schema.py
+import random
+from pathlib import Path
+
+import pytest
+
+from zw_parser import ZW_END, ZW_SEPARATOR, ZW_START, ZW_VALUE, iter_zw_events, validate_zw
+from zw_schema import _BLOCK_KEY_RE, COMPILED_SCHEMA, ZWValidationError, check_zw, check_zw_file, iter_zw_errors
+
+PROMPTS = Path(__file__).resolve().parent / "prompts"
+ZWX_SUITE = Path(__file__).resolve().parent.parent / "zwx-test-suite"
+
+BAD = """Sure! Here is your scene:
+ZW-LIGHT:
+  TYPE: laser
+  ENERGY: lots
+  LOCATION: (1, 2)
+///
+ZW-MESH:
+  PARAMS:
+    RADIUS: big
+  MATERIAL:
+    BASE_COLOR: "#GG0000"
+ZW-STAGE:
+  TRACKS: none
+ZW-INTENT:
+  TARGET_SYSTEM: blender
+"""
+
+
+def test_shipped_prompts_pass_the_schema():
+    for path in sorted(PROMPTS.glob("*.zw*")):
+        assert check_zw_file(path) == [], path.name
+
+
+def test_zwx_intent_accepts_inline_payload_after_separator():
+    for path in sorted(ZWX_SUITE.glob("*/*.zwx")):
+        errors = [e.path for e in check_zw_file(path)]
+        assert errors == (["TARGET_SYSTEM"] if path.name.startswith("invalid_") else []), path.name
+    assert check_zw("ZW-INTENT:\n  TARGET_SYSTEM: blender\n---\n")[0].message.startswith("needs one of")
+
+
+def test_errors_carry_line_numbers_and_paths():
+    errors = [(e.line, e.block, e.path) for e in check_zw(BAD)]
+    assert errors == [
+        (1, None, ""),
+        (3, "ZW-LIGHT", "TYPE"),
+        (4, "ZW-LIGHT", "ENERGY"),
+        (5, "ZW-LIGHT", "LOCATION"),
+        (9, "ZW-MESH", "PARAMS/RADIUS"),
+        (11, "ZW-MESH", "MATERIAL/BASE_COLOR"),
+        (7, "ZW-MESH", "NAME"),  # reported when the block closes
+        (13, "ZW-STAGE", "TRACKS"),
+        (14, "ZW-INTENT", ""),
+    ]
+    assert str(check_zw(BAD)[2]) == "line 4: ZW-LIGHT.ENERGY: expected a number, got 'lots'"
+
+
+def test_validation_stops_reading_at_max_errors():
+    consumed = []
+
+    def lines():
+        for line in BAD.splitlines(keepends=True) + ["ZW-OBJECT:\n"] * 1000:
+            consumed.append(line)
+            yield line
+
+    assert len(check_zw(lines(), max_errors=2)) == 2
+    assert len(consumed) < 10
+
+
+def test_validate_zw_uses_the_schema():
+    assert validate_zw("ZW-LIGHT:\n  NAME: Key\n  ENERGY: 500\n")
+    assert not validate_zw("ZW-LIGHT:\n  NAME: Key\n  ENERGY: bright\n")
+    assert not validate_zw("")
+    assert next(iter_zw_errors("")).message == "no ZW blocks found"
+
+
+def errors_from_events(source):
+    """The validator as first written on top of iter_zw_events: slow, but it reads lines the parser's way."""
+    stack = []
+    block = block_type = None
+    block_line = blocks = 0
+    seen_keys = set()
+    deferred = []
+    deferred_separator = None
+    payload_started = False
+
+    for event in iter_zw_events(source, documents=True):
+        kind = event.kind
+        if deferred and kind != ZW_END and not stack:
+            if kind == ZW_SEPARATOR and event.key == deferred_separator:
+                payload_started = True
+                continue
+            if not payload_started or kind == ZW_SEPARATOR:
+                yield from deferred
+            deferred = []
+
+        if kind == ZW_VALUE:
+            if not stack:
+                blocks += 1
+                if not _BLOCK_KEY_RE.match(event.key):
+                    yield ZWValidationError(event.line, None, "", f"not a ZW block: {event.key!r}")
+                continue
+            level, path = stack[-1]
+            if len(stack) == 1:
+                seen_keys.add(event.key)
+            if level is None:
+                continue
+            check = level.checks.get(event.key) or level.wildcard
+            if check is not None:
+                message = check(event.value)
+                if message:
+                    yield ZWValidationError(event.line, block_type, path + event.key, message)
+            elif event.key in level.block_keys:
+                yield ZWValidationError(event.line, block_type, path + event.key, "expected a nested block")
+
+        elif kind == ZW_START:
+            if not stack:
+                blocks += 1
+                if not _BLOCK_KEY_RE.match(event.key):
+                    yield ZWValidationError(event.line, None, "", f"not a ZW block: {event.key!r}")
+                block_type, block_line = event.key, event.line
+                block = COMPILED_SCHEMA.get(event.key)
+                seen_keys = set()
+                stack.append((block.level if block else None, ""))
+                continue
+            level, path = stack[-1]
+            if len(stack) == 1:
+                seen_keys.add(event.key)
+            child = None
+            if level is not None:
+                child = level.children.get(event.key)
+                if child is None and event.key in level.checks:
+                    yield ZWValidationError(event.line, block_type, path + event.key,
+                                            "expected a value, got a nested block")
+            stack.append((child, f"{path}{event.key}/"))
+
+        elif kind == ZW_END:
+            stack.pop()
+            if not stack and block is not None:
+                for key in block.required:
+                    if key not in seen_keys:
+                        yield ZWValidationError(block_line, block_type, key, "required key is missing")
+                for group in block.one_of:
+                    if not seen_keys.intersection(group):
+                        error = ZWValidationError(block_line, block_type, "", f"needs one of {', '.join(group)}")
+                        if block.inline_payload:
+                            deferred.append(error)
+                        else:
+                            yield error
+                deferred_separator, payload_started = block.inline_payload, False
+                block = None
+
+    yield from deferred
+    if not blocks:
+        yield ZWValidationError(1, None, "", "no ZW blocks found")
+
+
+MUTATIONS = (
+    lambda rng, line: "",                                    # drop the line
+    lambda rng, line: "  " + line,                           # indent deeper
+    lambda rng, line: line[2:] if line.startswith("  ") else line,  # dedent
+    lambda rng, line: line.split(":")[0] + ": " + rng.choice(("lots", "(1, 2)", "#GG0000", "-", "1e3"))
+    if ":" in line else line,                                # bad value
+    lambda rng, line: line.rstrip(": 0123456789.()\"#,") + ":",  # value turned into a block
+    lambda rng, line: rng.choice(("///", "---", "// note", "# note", "Sure! Here it is:")),
+)
+
+
+def mutated(text, seed):
+    rng = random.Random(seed)
+    lines = text.splitlines()
+    for i in rng.sample(range(len(lines)), k=min(len(lines), 12)):
+        lines[i] = rng.choice(MUTATIONS)(rng, lines[i])
+    return "\n".join(lines) + "\n"
+
+
+@pytest.fixture
+def corpus(monkeypatch):
+    monkeypatch.syspath_prepend(str(Path(__file__).resolve().parents[1]))  # for `bench`
+    from bench.corpus import generate_zw, generate_zwx
+    return generate_zw, generate_zwx
+
+
+def test_streaming_validator_agrees_with_iter_zw_events(corpus):
+    generate_zw, generate_zwx = corpus
+    texts = [BAD, "", "   \n", "ZW-INTENT:\n  TARGET_SYSTEM: blender\n---\n"]
+    texts += [path.read_text(encoding="utf-8") for path in sorted(PROMPTS.glob("*.zw*"))]
+    texts += [path.read_text(encoding="utf-8") for path in sorted(ZWX_SUITE.glob("*/*.zwx"))]
+    texts += [generate_zw(200, seed) for seed in range(5)] + [generate_zwx(200, seed) for seed in range(5)]
+    texts += [mutated(text, seed) for seed, text in enumerate(texts * 4) if text.strip()]
+
+    for text in texts:
+        expected = list(errors_from_events(text))
+        assert list(iter_zw_errors(text)) == expected, text
+        assert validate_zw(text) is (not expected)
@@ -0,0 +1,96 @@
+# zw_mcp/test_zwb.py
+import gc
+import tracemalloc
+
+import pytest
+
+from zw_parser import compile_zwb, iter_zw_documents, open_zwb, parse_zw_compact
+
+LIBRARY = """// parts
+ZW-MESH:
+  NAME: Pillar
+  LOCATION: (0, 0, 1.5)
+  PARAMS:
+    VERTICES: 12
+    DEPTH: 2.0
+  MATERIAL:
+    BASE_COLOR: "#FF0000"
+///
+ZW-MESH:
+  NAME: “Crystal”
+  SCALE: 2
+///
+ZW-LIGHT:
+  NAME: Key
+  TYPE: POINT
+"""
+
+
+def test_compile_and_open_round_trip(tmp_path):
+    src = tmp_path / "parts.zw"
+    src.write_text(LIBRARY, encoding="utf-8")
+    root = open_zwb(compile_zwb(src))
+    try:
+        assert list(root) == ["ZW-MESH", "ZW-LIGHT"]
+        meshes = root["ZW-MESH"]
+        assert len(meshes) == 2
+        assert meshes[0]["LOCATION"] == (0.0, 0.0, 1.5)
+        assert meshes[0]["PARAMS"]["VERTICES"] == 12
+        assert meshes[0]["MATERIAL"]["BASE_COLOR"] == (1.0, 0.0, 0.0, 1.0)
+        assert meshes[-1]["NAME"] == "“Crystal”" and meshes[1]["SCALE"] == 2.0
+        assert root["ZW-LIGHT"].get("TYPE") == "POINT"
+        assert root.get("ZW-CAMERA") is None
+    finally:
+        root.zwb_file.close()
+
+
+def test_numpy_vectors_outlive_the_file(tmp_path):
+    pytest.importorskip("numpy")
+    src = tmp_path / "parts.zw"
+    src.write_text(LIBRARY, encoding="utf-8")
+    root = open_zwb(compile_zwb(src), vectors="numpy")
+    location = root["ZW-MESH"][0]["LOCATION"]
+    root.zwb_file.close()  # must not raise BufferError while `location` is alive
+    assert location.tolist() == [0.0, 0.0, 1.5]
+
+
+def test_untyped_compile_matches_document_reader(tmp_path):
+    src = tmp_path / "parts.zw"
+    src.write_text(LIBRARY.replace("///\n", ""), encoding="utf-8")
+    root = open_zwb(compile_zwb(src, tmp_path / "out.zwb", typed=False))
+    try:
+        assert root.to_dict() == next(iter_zw_documents(LIBRARY.replace("///\n", "")))
+    finally:
+        root.zwb_file.close()
+
+
+def _retained_bytes(build):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        value = build()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return value, current
+
+
+def test_compact_tree_reads_like_dicts_within_memory_budget():
+    objects = 2000
+    scene = "".join(
+        f"ZW-OBJECT:\n  NAME: Obj{i}\n  TYPE: Cube\n  LOCATION: ({i}, 0, 1)\n  SCALE: (1, 1, 1)\n"
+        f"  MATERIAL:\n    BASE_COLOR: \"#33AAFF\"\n    ROUGHNESS: 0.4\n///\n"
+        for i in range(objects))
+
+    compact, compact_bytes = _retained_bytes(lambda: parse_zw_compact(scene))
+    dicts, dict_bytes = _retained_bytes(lambda: next(iter_zw_documents(scene.replace("///\n", ""))))
+
+    assert compact == dicts
+    obj = compact["ZW-OBJECT"][42]
+    assert obj.get("NAME") == "Obj42" and obj.get("MISSING", "x") == "x"
+    assert obj.get("MATERIAL").get("ROUGHNESS") == "0.4"
+    assert parse_zw_compact(scene, typed=True)["ZW-OBJECT"][42]["LOCATION"] == (42.0, 0.0, 1.0)
+
+    assert compact_bytes / objects < 200
+    assert compact_bytes * 5 < dict_bytes
@@ -1,18 +1,86 @@
 import ast
+import re
+
+# Plain decimal numbers only: no nan/inf, underscores, hex or surrounding spaces
+NUMBER_PATTERN = r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?"
+_NUMBER_RE = re.compile(NUMBER_PATTERN)
+
+
+def clean_literal(str_val: str) -> str:
+    """Drops a trailing `//` comment and surrounding quotes from a ZW scalar."""
+    val = str_val
+    if "//" in val:
+        val = val.split("//", 1)[0]
+    val = val.strip()
+    if len(val) >= 2 and val[0] == val[-1] and val[0] in "\"'":
+        val = val[1:-1].strip()
+    return val
+
+
+def parse_number(str_val: str):
+    """Fast int/float decoder; returns None if the text is not a plain number."""
+    if _NUMBER_RE.fullmatch(str_val) is None:
+        return None
+    if str_val.lstrip("+-").isdecimal():  # digits only, after the sign
+        return int(str_val)
+    return float(str_val)
+
+
+def parse_vector(str_val: str):
+    """Fast decoder for flat numeric tuples/lists like `(0, 0, 1)` or `[1.5, 2]`.
+
+    Returns a tuple of ints/floats, or None for anything else (nested, non-numeric).
+    """
+    val = str_val.strip()
+    if len(val) < 2 or (val[0], val[-1]) not in (("(", ")"), ("[", "]")):
+        return None
+    body = val[1:-1].strip()
+    if not body:
+        return ()
+    items = []
+    for part in body.split(","):
+        part = part.strip()
+        if not part:
+            continue  # trailing comma, as in "(1,)"
+        num = parse_number(part)
+        if num is None:
+            return None
+        items.append(num)
+    return tuple(items) if val[0] == "(" else items
 
 
 def safe_eval(str_val, default_val):
-    """Safely evaluate a string to a Python literal."""
+    """Safely evaluate a string to a Python literal.
+
+    Values that are already decoded (typed parse mode) are returned unchanged.
+    """
     if not isinstance(str_val, str):
-        return default_val
+        if str_val is None or isinstance(str_val, dict):
+            return default_val
+        return str_val
+    # Numbers and flat vectors are the common case; skip ast for them
+    val = str_val.strip()
+    num = parse_number(val)
+    if num is not None:
+        return num
+    vec = parse_vector(val)
+    if vec is not None:
+        return vec
     try:
-        return ast.literal_eval(str_val)
+        return ast.literal_eval(val)
     except (ValueError, SyntaxError):
         return default_val
 
 
 def parse_color(color_val, default=(1.0, 1.0, 1.0, 1.0)):
     """Parse a color definition from hex or tuple string formats."""
+    if isinstance(color_val, (list, tuple)) or hasattr(color_val, "shape"):
+        # Already decoded by the typed parse mode
+        if len(color_val) == 3:
+            return (float(color_val[0]), float(color_val[1]), float(color_val[2]), 1.0)
+        if len(color_val) == 4:
+            return (float(color_val[0]), float(color_val[1]), float(color_val[2]), float(color_val[3]))
+        return default
     if not isinstance(color_val, str):
         return default
 
@@ -28,8 +96,13 @@ def parse_color(color_val, default=(1.0, 1.0, 1.0, 1.0)):
             return default
 
     if val.startswith("(") and val.endswith(")"):
+        tup = parse_vector(val)
+        if tup is None:
+            try:
+                tup = ast.literal_eval(val)
+            except Exception:
+                return default
         try:
-            tup = ast.literal_eval(val)
             if isinstance(tup, (list, tuple)):
                 if len(tup) == 3:
                     return (float(tup[0]), float(tup[1]), float(tup[2]), 1.0)
@@ -0,0 +1,130 @@
+# zw_mcp/zw_admission.py
+"""Admission control for the daemon: turn requests away early instead of letting them time out.
+
+Three checks, each raising Overloaded with the HTTP status to answer and a
+Retry-After hint:
+
+- per-client token buckets (429): every client (peer address, or the name it
+  sends) gets ZW_MCP_CLIENT_RATE requests per second with bursts of up to
+  ZW_MCP_CLIENT_BURST; 0 turns this off;
+- a bounded upstream queue (503): at most max_queue requests wait for an
+  upstream slot;
+- a wait estimate against the request's deadline (503): the expected queue
+  time is the number of calls ahead of the request (by priority) times the
+  recent upstream latency, spread over the upstream slots. A request whose
+  deadline (its own "deadline" field, else ZW_MCP_DEADLINE seconds) is shorter
+  than that is refused straight away.
+
+Only work that needs a new upstream call is subject to the last two; cache
+hits and requests that join an identical call in progress always get through.
+"""
+import math
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Optional
+
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("ZW_MCP_DEADLINE", "60"))  # 0 = no deadline
+CLIENT_RATE = float(os.getenv("ZW_MCP_CLIENT_RATE", "0"))  # requests per second per client; 0 = unlimited
+CLIENT_BURST = float(os.getenv("ZW_MCP_CLIENT_BURST", "10"))
+LATENCY_SMOOTHING = 0.2  # weight of the newest upstream call in the latency average
+MAX_TRACKED_CLIENTS = 4096
+
+
+class Overloaded(Exception):
+    """The daemon will not take this request now; retry after `retry_after` seconds."""
+
+    def __init__(self, status: int, reason: str, message: str, retry_after: float):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Takes one token; returns 0, or the seconds until one is available (nothing taken)."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    def __init__(self, max_upstream: int, max_queue: int, deadline: float = DEFAULT_DEADLINE_SECONDS,
+                 client_rate: float = CLIENT_RATE, client_burst: float = CLIENT_BURST, clock=time.monotonic):
+        self.max_upstream = max_upstream
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.client_rate = client_rate
+        self.client_burst = max(1.0, client_burst)
+        self.clock = clock
+        self.latency = None  # smoothed seconds per upstream call; None until the first one finishes
+        self.rejected = Counter()  # reason -> requests turned away
+        self._buckets = OrderedDict()  # client -> TokenBucket, least recently seen first
+
+    def observe(self, seconds: float):
+        """Feeds the duration of a finished upstream call into the latency average."""
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += LATENCY_SMOOTHING * (seconds - self.latency)
+
+    def expected_wait(self, ahead: int, running: int) -> float:
+        """Seconds until a new call gets a slot, with `ahead` calls queued before it and `running` running."""
+        if self.latency is None:
+            return 0.0
+        turns = ahead + running + 1 - self.max_upstream  # slots that must free up first
+        return max(0, turns) * self.latency / self.max_upstream
+
+    def check_client(self, client: str):
+        if self.client_rate <= 0:
+            return
+        now = self.clock()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.client_rate, self.client_burst, now)
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._buckets.popitem(last=False)  # a bucket that old has refilled anyway
+        else:
+            self._buckets.move_to_end(client)
+        wait = bucket.take(now)
+        if wait:
+            self._reject(429, "rate_limited", f"client {client} is over {self.client_rate:g} requests/s", wait)
+
+    def admit(self, queued: int, ahead: int, running: int, deadline: Optional[float] = None):
+        """Raises Overloaded unless a new upstream call can start within the deadline.
+
+        queued: all calls waiting for a slot; ahead: those that would be served before this one.
+        """
+        wait = self.expected_wait(ahead, running)
+        if queued >= self.max_queue:
+            self._reject(503, "queue_full", f"upstream queue is full ({queued} waiting)",
+                         wait or self.latency or 1.0)
+        deadline = self.deadline if deadline is None else deadline
+        if deadline and wait > deadline:
+            self._reject(503, "deadline", f"expected wait {wait:.1f}s is longer than the {deadline:g}s deadline",
+                         wait - deadline)
+
+    def _reject(self, status: int, reason: str, message: str, retry_after: float):
+        self.rejected[reason] += 1
+        raise Overloaded(status, reason, message, max(1, math.ceil(retry_after)))
+
+    def stats(self) -> dict:
+        return {
+            "upstream_latency_s": round(self.latency, 3) if self.latency is not None else None,
+            "deadline_s": self.deadline,
+            "client_rate": self.client_rate,
+            "clients": len(self._buckets),
+            "rejected": dict(self.rejected),
+        }
@@ -57,7 +57,8 @@ def run_single_agent_session(agent_name: str, agent_config_path_str: str, initia
     for round_num in range(1, max_rounds + 1):
         print(f"\n🔁 Agent '{agent_name}' - Round {round_num} of {max_rounds}")
 
-        response = send_to_daemon(config["host"], config["port"], current_round_prompt)
+        # Hub sessions are long-running background work; let interactive requests go first
+        response = send_to_daemon(config["host"], config["port"], current_round_prompt, priority="batch")
         final_output_from_agent = response
 
         print(f"\n🧠 Response (Agent '{agent_name}' - Round {round_num}):\n{response.strip()}")
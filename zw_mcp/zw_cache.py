@@ -0,0 +1,194 @@
+# zw_mcp/zw_cache.py
+"""Content-addressed cache for parsed ZW trees.
+
+Entries are keyed by a hash of the source text and stored pickled, so a hit
+costs a hash plus a fast C unpickle and every caller gets its own copy of the
+tree. An optional on-disk tier lets separate processes (the watchdog, orbit,
+Blender) reuse each other's parses.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+# Bump when the parser output changes so stale disk entries are never reused
+CACHE_FORMAT = 1
+
+_MISSING = object()
+
+
+def content_key(data: Union[str, bytes], namespace: str = "zw") -> str:
+    """Returns the cache key for a piece of ZW source text."""
+    if isinstance(data, str):
+        data = data.encode("utf-8", "surrogatepass")
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{namespace}:{CACHE_FORMAT}:".encode("ascii"))
+    h.update(data)
+    return h.hexdigest()
+
+
+def file_content_key(path: Union[str, Path], namespace: str = "zw", chunk_size: int = 1 << 20) -> str:
+    """Hashes a file in chunks; gives the same key as content_key on its bytes."""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{namespace}:{CACHE_FORMAT}:".encode("ascii"))
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ParseCache:
+    """Bounded in-memory LRU with an optional size-capped on-disk tier."""
+
+    def __init__(self, max_entries: int = 128, max_memory_bytes: int = 256 * 1024 * 1024,
+                 cache_dir: Optional[Union[str, Path]] = None, max_disk_bytes: int = 1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> pickled bytes
+        self._memory_bytes = 0
+        self._disk_bytes = None  # scanned lazily on first disk write
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def persistent(self) -> bool:
+        return self.cache_dir is not None
+
+    # --- Public API ---
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return pickle.loads(blob)
+
+        blob = self._disk_read(key)
+        with self._lock:
+            if blob is None:
+                self.misses += 1
+                return default
+            self.disk_hits += 1
+            self._remember(key, blob)
+        return pickle.loads(blob)
+
+    def put(self, key: str, value: Any) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remember(key, blob)
+        self._disk_write(key, blob)
+
+    def get_or_compute(self, key: str, compute) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self, disk: bool = False) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+        if disk and self.cache_dir and self.cache_dir.exists():
+            for path in self.cache_dir.glob("*/*.pickle"):
+                path.unlink(missing_ok=True)
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes or 0,
+            }
+
+    # --- Memory tier (caller holds the lock) ---
+    def _remember(self, key: str, blob: bytes) -> None:
+        if len(blob) > self.max_memory_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._entries[key] = blob
+        self._memory_bytes += len(blob)
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self._memory_bytes > self.max_memory_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    # --- Disk tier ---
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.pickle"
+
+    def _disk_read(self, key: str) -> Optional[bytes]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            blob = path.read_bytes()
+            os.utime(path)  # keeps eviction least-recently-used
+            return blob
+        except OSError:
+            return None
+
+    def _disk_write(self, key: str, blob: bytes) -> None:
+        if not self.cache_dir or len(blob) > self.max_disk_bytes:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temp file first so readers in other processes never see half a pickle
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_name, path)
+        except OSError as e:
+            print(f"[!] ZW parse cache: could not write '{path}': {e}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(p.stat().st_size for p in self.cache_dir.glob("*/*.pickle"))
+            else:
+                self._disk_bytes += len(blob)
+            over_budget = self._disk_bytes > self.max_disk_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        """Deletes least recently used files until the tier is back under 90% of its budget."""
+        files = []
+        for path in self.cache_dir.glob("*/*.pickle"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+        with self._lock:
+            self._disk_bytes = total
@@ -0,0 +1,216 @@
+# zw_mcp/zw_index.py
+"""Sidecar block index for random access into large ZW files.
+
+build_index scans a ZW file once and records every top-level block as
+(block type, NAME, byte offset, length) in `<file>.zwi`, a small SQLite
+database indexed by NAME. load_block then seeks straight to one block and
+parses only that slice, so pulling one ZW-MESH out of a big parts library
+does not parse the rest of it.
+
+The index remembers the file's size, mtime and content hash. A size change
+always triggers a rebuild; a changed mtime with the same size is settled by
+re-hashing, so touching a file does not force a full re-index.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Union
+
+try:
+    from zw_parser import DOCUMENT_SEPARATORS, iter_zw_blocks
+    from utils import clean_literal
+except ImportError:
+    from zw_mcp.zw_parser import DOCUMENT_SEPARATORS, iter_zw_blocks
+    from zw_mcp.utils import clean_literal
+
+INDEX_SUFFIX = ".zwi"
+INDEX_VERSION = 1
+HASH_CHUNK_SIZE = 1 << 20
+
+
+class IndexEntry(NamedTuple):
+    block_type: str
+    name: Optional[str]
+    offset: int
+    length: int
+    line: int
+
+
+def index_path_for(path: Union[str, Path]) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def _file_hash(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def scan_blocks(path: Union[str, Path]):
+    """Yields an IndexEntry for every top-level `KEY:` block, in file order."""
+    separators = tuple(sep.encode("ascii") for sep in DOCUMENT_SEPARATORS)
+    offset = 0
+    current = None  # [block_type, name, start_offset, line, child_indent]
+
+    with open(path, "rb") as f:
+        for line_number, raw in enumerate(f, 1):
+            line_start = offset
+            offset += len(raw)
+            stripped = raw.strip()
+            if not stripped:
+                continue
+
+            indent = len(raw) - len(raw.lstrip())
+            if indent > 0:
+                if current is None:
+                    continue
+                if current[4] is None:
+                    current[4] = indent
+                if indent == current[4] and current[1] is None and stripped.startswith(b"NAME:"):
+                    current[1] = clean_literal(stripped[5:].decode("utf-8", "replace")) or None
+                continue
+
+            # Any line at indent 0 ends the open block
+            if current is not None:
+                yield IndexEntry(current[0], current[1], current[2], line_start - current[2], current[3])
+                current = None
+
+            if stripped in separators or stripped.startswith((b"#", b"//")):
+                continue
+            key, sep, value = stripped.partition(b":")
+            if sep and not value.strip():
+                current = [key.strip().decode("utf-8", "replace"), None, line_start, line_number, None]
+
+    if current is not None:
+        yield IndexEntry(current[0], current[1], current[2], offset - current[2], current[3])
+
+
+def build_index(path: Union[str, Path], index_path: Optional[Union[str, Path]] = None) -> Path:
+    """Scans path once and (re)writes its sidecar index."""
+    path = Path(path)
+    index_path = Path(index_path) if index_path else index_path_for(path)
+    st = path.stat()
+    content_hash = _file_hash(path)
+
+    # A unique temp name, so two processes indexing the same file never share a half-written database
+    fd, tmp_name = tempfile.mkstemp(dir=index_path.parent, prefix=index_path.name + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(tmp_name)
+        try:
+            with conn:
+                conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+                conn.execute("CREATE TABLE blocks (block_type TEXT, name TEXT, offset INTEGER, length INTEGER, line INTEGER)")
+                conn.executemany("INSERT INTO blocks VALUES (?, ?, ?, ?, ?)", scan_blocks(path))
+                conn.execute("CREATE INDEX blocks_by_name ON blocks (name, block_type)")
+                conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+                    ("version", str(INDEX_VERSION)),
+                    ("size", str(st.st_size)),
+                    ("mtime_ns", str(st.st_mtime_ns)),
+                    ("hash", content_hash),
+                ])
+        finally:
+            conn.close()
+        os.replace(tmp_name, index_path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return index_path
+
+
+class ZWIndex:
+    """An open sidecar index. Use open_index() to get one that is known to be fresh."""
+
+    def __init__(self, path: Union[str, Path], index_path: Union[str, Path]):
+        self.path = Path(path)
+        self.index_path = Path(index_path)
+        self._conn = sqlite3.connect(self.index_path)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def meta(self) -> dict:
+        return dict(self._conn.execute("SELECT key, value FROM meta"))
+
+    def find(self, name: str, block_type: Optional[str] = None) -> List[IndexEntry]:
+        if block_type is None:
+            rows = self._conn.execute(
+                "SELECT block_type, name, offset, length, line FROM blocks WHERE name = ? ORDER BY offset",
+                (name,))
+        else:
+            rows = self._conn.execute(
+                "SELECT block_type, name, offset, length, line FROM blocks"
+                " WHERE name = ? AND block_type = ? ORDER BY offset", (name, block_type))
+        return [IndexEntry(*row) for row in rows]
+
+    def blocks(self, block_type: Optional[str] = None) -> List[IndexEntry]:
+        if block_type is None:
+            rows = self._conn.execute("SELECT block_type, name, offset, length, line FROM blocks ORDER BY offset")
+        else:
+            rows = self._conn.execute(
+                "SELECT block_type, name, offset, length, line FROM blocks WHERE block_type = ? ORDER BY offset",
+                (block_type,))
+        return [IndexEntry(*row) for row in rows]
+
+    def is_fresh(self) -> bool:
+        """Checks the index against the file: size, then mtime, then content hash."""
+        try:
+            meta = self.meta()
+            st = self.path.stat()
+        except (sqlite3.DatabaseError, OSError):
+            return False
+        if meta.get("version") != str(INDEX_VERSION) or meta.get("size") != str(st.st_size):
+            return False
+        if meta.get("mtime_ns") == str(st.st_mtime_ns):
+            return True
+        if meta.get("hash") != _file_hash(self.path):
+            return False
+        # Same content, only touched: remember the new mtime so we skip the hash next time
+        with self._conn:
+            self._conn.execute("UPDATE meta SET value = ? WHERE key = 'mtime_ns'", (str(st.st_mtime_ns),))
+        return True
+
+
+def open_index(path: Union[str, Path], index_path: Optional[Union[str, Path]] = None) -> ZWIndex:
+    """Opens the sidecar index for path, building or rebuilding it if it is missing or stale."""
+    index_path = Path(index_path) if index_path else index_path_for(path)
+    if index_path.exists():
+        index = ZWIndex(path, index_path)
+        if index.is_fresh():
+            return index
+        index.close()
+    build_index(path, index_path)
+    return ZWIndex(path, index_path)
+
+
+def read_block(path: Union[str, Path], entry: IndexEntry, typed=False):
+    """Parses just the bytes of one indexed block and returns its value."""
+    with open(path, "rb") as f:
+        f.seek(entry.offset)
+        data = f.read(entry.length)
+    for block in iter_zw_blocks(data, typed=typed):
+        return block.value
+    raise ValueError(f"No ZW block at offset {entry.offset} of '{path}'; the index may be stale.")
+
+
+def load_block(path: Union[str, Path], name: str, block_type: Optional[str] = None, typed=False):
+    """Returns the first top-level block called `name` (optionally of `block_type`, e.g. "ZW-MESH").
+
+    Raises KeyError if no such block exists.
+    """
+    with open_index(path) as index:
+        entries = index.find(name, block_type)
+    if not entries:
+        raise KeyError(f"No block named '{name}' in '{path}'")
+    return read_block(path, entries[0], typed=typed)
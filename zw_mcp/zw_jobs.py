@@ -0,0 +1,225 @@
+# zw_mcp/zw_jobs.py
+"""Blender job queue for the daemon's `route_to_blender` requests.
+
+Each routed payload becomes a job with its own id and its own spool file
+(`<spool>/web_zw_<id>.zw`), so two requests in the same second no longer
+overwrite each other. A fixed pool of workers runs the jobs through
+tools/engain_orbit.py, at most ZW_MCP_BLENDER_WORKERS at a time; the rest wait
+in order, up to ZW_MCP_JOB_QUEUE of them.
+
+The spool file is only removed once its job has run, so payloads that were
+still queued (or running) when the daemon stopped are picked up again by
+recover() on the next start, under their old ids. Finished jobs stay
+queryable (GET /jobs/<id>) for the last JOB_HISTORY jobs, and every finished
+job is written to zw_mcp/logs/jobs.log.
+"""
+import asyncio
+import os
+import secrets
+import signal
+import sys
+import time
+from collections import Counter, OrderedDict
+from contextlib import suppress
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional
+
+try:
+    from zw_log import log_event
+except ImportError:
+    from zw_mcp.zw_log import log_event
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+ORBIT_SCRIPT = PROJECT_ROOT / "tools" / "engain_orbit.py"
+JOB_SPOOL_DIR = Path(os.getenv("ZW_MCP_JOB_DIR", "zw_mcp/jobs"))
+JOB_LOG_PATH = Path("zw_mcp/logs/jobs.log")
+BLENDER_WORKERS = int(os.getenv("ZW_MCP_BLENDER_WORKERS", "1"))
+JOB_QUEUE_LIMIT = int(os.getenv("ZW_MCP_JOB_QUEUE", "100"))
+JOB_TIMEOUT_SECONDS = float(os.getenv("ZW_MCP_BLENDER_TIMEOUT", "600"))
+JOB_HISTORY = 500
+JOB_OUTPUT_CHARS = 4000  # tail of the job's stdout/stderr kept for /jobs/<id>
+
+JOB_STATES = ("queued", "running", "succeeded", "failed", "timed_out")
+
+
+class JobQueueFull(Exception):
+    """Too many Blender jobs are already waiting."""
+
+
+def orbit_command(payload_path: Path) -> List[str]:
+    return [sys.executable, str(ORBIT_SCRIPT), str(payload_path)]
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat(timespec="milliseconds") if timestamp else None
+
+
+def _kill_group(process):
+    # engain_orbit runs Blender as its own child; kill the whole session so it isn't orphaned
+    with suppress(ProcessLookupError):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+class Job:
+    __slots__ = ("id", "payload_path", "state", "created", "started", "finished", "returncode", "error", "output")
+
+    def __init__(self, job_id: str, payload_path: Path, created: Optional[float] = None):
+        self.id = job_id
+        self.payload_path = payload_path
+        self.state = "queued"
+        self.created = created or time.time()
+        self.started = None
+        self.finished = None
+        self.returncode = None
+        self.error = None
+        self.output = ""
+
+    @property
+    def done(self) -> bool:
+        return self.finished is not None
+
+    def to_dict(self) -> dict:
+        now = time.time()
+        return {
+            "id": self.id,
+            "state": self.state,
+            "created": _iso(self.created),
+            "started": _iso(self.started),
+            "finished": _iso(self.finished),
+            "wait_seconds": round((self.started or now) - self.created, 3),
+            "run_seconds": round((self.finished or now) - self.started, 3) if self.started else None,
+            "returncode": self.returncode,
+            "error": self.error,
+            "output": self.output,
+        }
+
+
+class BlenderJobQueue:
+    def __init__(self, workers: int = BLENDER_WORKERS, max_queued: int = JOB_QUEUE_LIMIT,
+                 spool_dir=JOB_SPOOL_DIR, timeout: float = JOB_TIMEOUT_SECONDS,
+                 command: Callable[[Path], List[str]] = orbit_command, cwd=PROJECT_ROOT,
+                 log_path=JOB_LOG_PATH):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.spool_dir = Path(spool_dir)
+        self.timeout = timeout
+        self.command = command
+        self.cwd = cwd
+        self.log_path = log_path
+        self.finished = Counter()  # state -> jobs that ended in it
+        self._jobs = OrderedDict()  # id -> Job, oldest first
+        self._queue = None
+        self._tasks = []
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def running(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.state == "running")
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+
+    async def recover(self) -> int:
+        """Re-queues payloads left in the spool directory by an earlier run; returns how many."""
+        loop = asyncio.get_running_loop()
+        spooled = await loop.run_in_executor(None, self._spooled)
+        recovered = 0
+        for path, mtime in spooled:
+            job_id = path.stem[len("web_zw_"):]
+            if job_id not in self._jobs:
+                self._enqueue(Job(job_id, path, created=mtime))
+                recovered += 1
+        return recovered
+
+    def _spooled(self):
+        if not self.spool_dir.is_dir():
+            return []
+        files = [(path.resolve(), path.stat().st_mtime) for path in self.spool_dir.glob("web_zw_*.zw")]
+        return sorted(files, key=lambda item: item[1])
+
+    async def submit(self, zw_content: str) -> Job:
+        """Spools the payload and queues a job for it; raises JobQueueFull when the queue is at its limit."""
+        if self.queued >= self.max_queued:
+            raise JobQueueFull(f"{self.queued} Blender jobs already queued; try again later")
+        job_id = secrets.token_hex(8)
+        path = (self.spool_dir / f"web_zw_{job_id}.zw").resolve()
+        await asyncio.get_running_loop().run_in_executor(None, self._spool, path, zw_content)
+        job = Job(job_id, path)
+        self._enqueue(job)
+        return job
+
+    def _spool(self, path: Path, zw_content: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(zw_content, encoding="utf-8")
+
+    def _enqueue(self, job: Job):
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        # Forget the oldest finished jobs; queued and running ones are always kept
+        excess = len(self._jobs) - JOB_HISTORY
+        for old_id in [old.id for old in self._jobs.values() if old.done][:max(0, excess)]:
+            del self._jobs[old_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    # --- Workers ---
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            await self._run(job)
+
+    async def _run(self, job: Job):
+        job.state = "running"
+        job.started = time.time()
+        process = None
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self.command(job.payload_path), cwd=str(self.cwd),
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                start_new_session=True)
+            try:
+                output, _ = await asyncio.wait_for(process.communicate(), self.timeout)
+            except asyncio.TimeoutError:
+                _kill_group(process)
+                output, _ = await process.communicate()
+                job.state = "timed_out"
+                job.error = f"killed after {self.timeout:.0f}s"
+            else:
+                job.state = "succeeded" if process.returncode == 0 else "failed"
+            job.returncode = process.returncode
+            job.output = output.decode("utf-8", errors="replace")[-JOB_OUTPUT_CHARS:]
+        except asyncio.CancelledError:
+            # Daemon shutting down: keep the spool file so recover() runs the job next time
+            if process is not None and process.returncode is None:
+                _kill_group(process)
+            job.state = "queued"
+            job.started = None
+            raise
+        except Exception as e:
+            job.state = "failed"
+            job.error = str(e)
+        job.finished = time.time()
+        self.finished[job.state] += 1
+        await asyncio.get_running_loop().run_in_executor(None, job.payload_path.unlink, True)
+        log_event(self.log_path, "blender_job", **{k: v for k, v in job.to_dict().items() if k != "output"})
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self.queued,
+            "running": self.running,
+            "finished": {state: self.finished[state] for state in JOB_STATES[2:]},
+        }
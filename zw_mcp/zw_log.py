@@ -0,0 +1,230 @@
+# zw_mcp/zw_log.py
+"""Background JSONL log writer shared by the daemon, EngAIn-Orbit, the watchdog and agents.
+
+Callers hand a record to an in-memory queue and go on; one thread per log file
+does the disk work, so a slow disk never shows up in request latency:
+
+    log_event("zw_mcp/logs/daemon.log", "exchange", prompt=prompt, response=text)
+
+Every line is one JSON object with "ts" (local time, ISO 8601), "event" and
+the caller's fields. A file is rotated once it passes ZW_MCP_LOG_MAX_BYTES or
+is older than ZW_MCP_LOG_ROTATE_SECONDS (0 turns either check off); rotated
+files become `<name>.<YYYYmmdd-HHMMSS>.gz` and only the newest
+ZW_MCP_LOG_BACKUPS are kept.
+
+The queue holds at most ZW_MCP_LOG_QUEUE records. When it is full new records
+are dropped rather than blocking the caller; the drop count is in stats() and
+is written to the log itself as a "log_dropped" record once there is room.
+"""
+import atexit
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+LOG_MAX_BYTES = int(os.getenv("ZW_MCP_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_SECONDS = float(os.getenv("ZW_MCP_LOG_ROTATE_SECONDS", "86400"))
+LOG_BACKUPS = int(os.getenv("ZW_MCP_LOG_BACKUPS", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("ZW_MCP_LOG_QUEUE", "10000"))
+LOG_BATCH = 256  # records written per flush of the file
+
+_CLOSE = object()
+
+
+def _timestamp() -> str:
+    return datetime.now().isoformat(timespec="milliseconds")
+
+
+class LogWriter:
+    """Appends JSON lines to one file from a background thread."""
+
+    def __init__(self, path: Union[str, Path], max_bytes: int = LOG_MAX_BYTES,
+                 rotate_seconds: float = LOG_ROTATE_SECONDS, backups: int = LOG_BACKUPS,
+                 queue_size: int = LOG_QUEUE_SIZE, clock=time.time):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+        self.clock = clock
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.closed = False
+        self._reported_drops = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._file = None
+        self._opened_at = 0.0
+        self._thread = threading.Thread(target=self._run, name=f"log-writer:{self.path.name}", daemon=True)
+        self._thread.start()
+
+    # --- Caller side (any thread, never blocks) ---
+    def write(self, event: str, **fields):
+        record = {"ts": _timestamp(), "event": event}
+        record.update(fields)
+        if self.closed:
+            self._drop()
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._drop()
+
+    def _drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def flush(self, timeout: Optional[float] = 5.0) -> bool:
+        """Waits until everything queued so far is on disk; False on timeout."""
+        if self.closed:
+            return not self._thread.is_alive()
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._queue.put(_CLOSE, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "rotations": self.rotations,
+        }
+
+    # --- Writer thread ---
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < LOG_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [item for item in batch if isinstance(item, dict)]
+            self._write(records)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if any(item is _CLOSE for item in batch):
+                self._close_file()
+                return
+
+    def _write(self, records):
+        with self._lock:
+            missed = self.dropped - self._reported_drops
+            self._reported_drops = self.dropped
+        if missed:
+            records.append({"ts": _timestamp(), "event": "log_dropped", "dropped": missed})
+        if not records:
+            return
+        lines = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+        try:
+            f = self._open()
+            f.write(lines)
+            f.flush()
+            self.written += len(records)
+            if self._due_for_rotation(f):
+                self._rotate()
+        except OSError as e:
+            print(f"[!] Could not write to {self.path}: {e}")
+            with self._lock:
+                self.dropped += len(records)  # reported by the next batch that gets through
+            self._close_file()
+
+    def _open(self):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._opened_at = self.clock()
+        return self._file
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def _due_for_rotation(self, f) -> bool:
+        if self.max_bytes > 0 and f.tell() >= self.max_bytes:
+            return True
+        return self.rotate_seconds > 0 and self.clock() - self._opened_at >= self.rotate_seconds
+
+    def _rotate(self):
+        self._close_file()
+        stamp = datetime.fromtimestamp(self.clock()).strftime("%Y%m%d-%H%M%S")
+        target = self.path.with_name(f"{self.path.name}.{stamp}.gz")
+        suffix = 1
+        while target.exists():
+            target = self.path.with_name(f"{self.path.name}.{stamp}-{suffix}.gz")
+            suffix += 1
+        rotated = self.path.with_name(self.path.name + ".rotating")
+        os.replace(self.path, rotated)
+        with open(rotated, "rb") as src, gzip.open(target, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        rotated.unlink()
+        self.rotations += 1
+        self._prune()
+
+    def _prune(self):
+        backups = sorted(self.path.parent.glob(f"{self.path.name}.*.gz"), key=lambda p: p.stat().st_mtime)
+        for old in backups[:max(0, len(backups) - self.backups)]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+_writers: Dict[Path, LogWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(path: Union[str, Path]) -> LogWriter:
+    """The shared writer for `path`; every module logging to one file goes through the same thread."""
+    key = Path(path).resolve()
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None or writer.closed:
+            writer = _writers[key] = LogWriter(key)
+        return writer
+
+
+def log_event(path: Union[str, Path], event: str, **fields):
+    get_writer(path).write(event, **fields)
+
+
+def flush_all(timeout: Optional[float] = 5.0):
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.flush(timeout)
+
+
+def close_all(timeout: Optional[float] = 5.0):
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close(timeout)
+
+
+atexit.register(close_all)
@@ -1,13 +1,53 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
+# zw_mcp/zw_mcp_daemon.py
+"""ZW MCP daemon: the `///`-terminated TCP protocol and POST /process_zw over HTTP,
+both served from one asyncio event loop.
+
+Ollama calls are blocking, so they run on a thread pool capped at
+MAX_UPSTREAM_CALLS. Up to MAX_QUEUED_REQUESTS more requests wait for a free
+slot, granted by priority class and model (zw_scheduler.py). Past that, or
+when the expected wait is longer than the request's deadline, the request is
+refused at once with 503 and Retry-After; clients over their rate get 429
+(zw_admission.py). At most MAX_ACTIVE_REQUESTS requests are handled at a time;
+beyond that the daemon stops reading, so TCP flow control pushes back.
+Idle keep-alive HTTP connections and waiting clients cost a coroutine each.
+
+The TCP port also speaks the framed protocol from zw_protocol.py: clients that
+open with its magic byte can pipeline many requests over one connection and get
+replies tagged by request id, out of order.
+
+Responses stream: TCP clients get text as Ollama produces it, and POST
+/process_zw with `"stream": true` (or `Accept: text/event-stream`) answers with
+Server-Sent Events over a chunked response.
+
+Identical requests are answered from a ResponseCache (zw_response_cache.py)
+when the daemon has one; GET /stats reports its hit rate and bytes saved.
+Seeded requests are cached unless they opt out; others only if they opt in
+(`"cache": true|false`, or a first line of `#!cache` / `#!nocache` on the
+legacy TCP protocol).
+Identical requests that arrive while the first is still generating share its
+upstream call (single flight), streamed pieces included.
+"""
+import asyncio
 import json
-import socket
+import math
 import os
 import threading
-import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager, nullcontext, suppress
+from http import HTTPStatus
 from pathlib import Path
-from datetime import datetime
-from ollama_handler import query_ollama
+from typing import NamedTuple, Optional
+
+from ollama_handler import DEFAULT_MODEL, CircuitOpenError, backend_stats, query_ollama, stream_ollama
+from zw_response_cache import CACHE_ENABLED, ResponseCache, cache_from_env, cache_key, should_cache
+from zw_protocol import (FRAME_CANCEL, FRAME_CHUNK, FRAME_DONE, FRAME_ERROR, FRAME_MAGIC, FRAME_REQUEST,
+                         ProtocolError, encode_frame, read_frame)
+from zw_scheduler import DEFAULT_PRIORITY, PRIORITIES, RESERVED_INTERACTIVE, UpstreamScheduler
+from zw_log import get_writer, log_event
+from zw_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, DaemonMetrics
+from zw_jobs import BlenderJobQueue, JobQueueFull
+from zw_admission import AdmissionController, Overloaded
 
 # --- Config / Paths ---
 LOG_PATH = Path("zw_mcp/logs/daemon.log")
@@ -21,152 +61,848 @@ PORT = int(os.getenv("ZW_MCP_PORT", "7421"))
 HTTP_HOST = os.getenv("ZW_MCP_HTTP_HOST", "127.0.0.1")
 HTTP_PORT = int(os.getenv("ZW_MCP_HTTP_PORT", "1111"))
 
+# Upstream concurrency and queueing
+MAX_UPSTREAM_CALLS = int(os.getenv("ZW_MCP_MAX_UPSTREAM", "2"))
+MAX_QUEUED_REQUESTS = int(os.getenv("ZW_MCP_MAX_QUEUE", "64"))
+MAX_ACTIVE_REQUESTS = int(os.getenv("ZW_MCP_MAX_ACTIVE", "256"))  # cache hits, shared calls, streams, refusals
+MAX_REQUEST_BYTES = int(os.getenv("ZW_MCP_MAX_REQUEST_BYTES", str(8 * 1024 * 1024)))
+MAX_PIPELINED_REQUESTS = int(os.getenv("ZW_MCP_MAX_PIPELINED", "32"))  # per framed connection
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("ZW_MCP_KEEPALIVE_TIMEOUT", "15"))
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type",
+}
+
 # --- Logging ---
 def log(prompt: str, response: str):
-    LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with open(LOG_PATH, "a", encoding="utf-8") as f:
-        f.write(f"\n--- Incoming [{datetime.now()}] ---\n{prompt}\n")
-        f.write(f"\n--- Response ---\n{response}\n")
-
-# --- HTTP Handler ---
-class ZWHTTPHandler(BaseHTTPRequestHandler):
-    def _send_json(self, code: int, payload: dict):
-        self.send_response(code)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(payload).encode('utf-8'))
-
-    def do_OPTIONS(self):
-        # CORS preflight
-        self._send_json(200, {"ok": True})
-
-    def do_POST(self):
-        if self.path != "/process_zw":
-            self._send_json(404, {"error": "not found"})
+    """Queues one exchange for the background writer; never touches the disk itself."""
+    log_event(LOG_PATH, "exchange", prompt=prompt, response=response)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+LEGACY_CACHE_PRAGMAS = {"#!cache": True, "#!nocache": False}
+
+
+class ZWRequest(NamedTuple):
+    """One prompt for the upstream. cache=None lets the cache policy decide."""
+    prompt: str
+    model: Optional[str] = None
+    options: Optional[dict] = None
+    cache: Optional[bool] = None
+    priority: str = DEFAULT_PRIORITY  # interactive, agent or batch
+    deadline: Optional[float] = None  # longest acceptable queue wait in seconds; None = the daemon default
+
+    @classmethod
+    def from_json(cls, data: dict, prompt_field: str, default_priority: str) -> "ZWRequest":
+        """Builds a request from a JSON body; raises ValueError with a client-facing message."""
+        prompt = data.get(prompt_field, "")
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise ValueError(f"missing or empty '{prompt_field}'")
+        options = data.get("options")
+        if options is not None and not isinstance(options, dict):
+            raise ValueError("'options' must be an object")
+        priority = data.get("priority", default_priority)
+        if priority not in PRIORITIES:
+            raise ValueError(f"'priority' must be one of {', '.join(PRIORITIES)}")
+        deadline = data.get("deadline")
+        if deadline is not None and (isinstance(deadline, bool) or not isinstance(deadline, (int, float))
+                                     or deadline <= 0):
+            raise ValueError("'deadline' must be a positive number of seconds")
+        use_cache = data.get("cache")
+        return cls(prompt, data.get("model") or None, options or None,
+                   None if use_cache is None else bool(use_cache), priority, deadline)
+
+    @classmethod
+    def from_legacy(cls, text: str) -> "ZWRequest":
+        """A legacy `///` request; a first line of `#!cache` or `#!nocache` sets the cache flag."""
+        first, _, rest = text.partition("\n")
+        flag = LEGACY_CACHE_PRAGMAS.get(first.strip().lower())
+        if flag is None:
+            return cls(text)
+        return cls(rest.strip(), cache=flag)
+
+    def upstream_kwargs(self) -> dict:
+        # Only pass what was asked for, so plain query(prompt) callables still work
+        kwargs = {}
+        if self.model:
+            kwargs["model"] = self.model
+        if self.options:
+            kwargs["options"] = self.options
+        return kwargs
+
+
+_STREAM_END = object()
+
+
+class _Flight:
+    """One upstream call shared by every concurrent request with the same key.
+
+    Pieces are kept, so a request that joins late still gets the whole stream.
+    """
+
+    def __init__(self):
+        self.pieces = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self.ticket = None  # scheduler ticket of the shared call
+        self._changed = asyncio.Condition()
+
+    async def publish(self, piece: str):
+        async with self._changed:
+            self.pieces.append(piece)
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None):
+        async with self._changed:
+            self.done, self.error = True, error
+            self._changed.notify_all()
+
+    async def subscribe(self):
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.pieces) > sent or self.done)
+                new, done = self.pieces[sent:], self.done
+            for piece in new:
+                yield piece
+            sent += len(new)
+            if done and sent == len(self.pieces):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class ZWDaemon:
+    """Both front ends plus the bounded upstream pool.
+
+    `query(prompt, model=..., options=...) -> str` is the blocking upstream
+    call; `query_stream` yields the same text in pieces. Without query_stream,
+    streams are one piece.
+    """
+
+    def __init__(self, query=query_ollama, query_stream=stream_ollama, max_upstream: int = MAX_UPSTREAM_CALLS,
+                 max_queue: int = MAX_QUEUED_REQUESTS, cache: Optional[ResponseCache] = None,
+                 cache_by_default: bool = False, model_limits: Optional[dict] = None,
+                 reserved_interactive: int = RESERVED_INTERACTIVE, jobs: Optional[BlenderJobQueue] = None,
+                 admission: Optional[AdmissionController] = None):
+        self.query = query
+        self.query_stream = query_stream
+        self.cache = cache
+        self.cache_by_default = cache_by_default
+        self.max_upstream = max_upstream
+        self.max_queue = max_queue
+        self.servers = []
+        self.queued = 0     # requests waiting for an upstream slot
+        self.in_flight = 0  # upstream calls running right now
+        self.coalesced = 0  # requests that shared another request's upstream call
+        self._flights = {}  # request key -> _Flight in progress
+        self.metrics = DaemonMetrics()
+        self.jobs = jobs if jobs is not None else BlenderJobQueue()
+        self.admission = admission or AdmissionController(max_upstream, max_queue)
+        self.scheduler = UpstreamScheduler(max_upstream, model_limits, reserved_interactive=reserved_interactive)
+        self._executor = ThreadPoolExecutor(max_workers=max_upstream, thread_name_prefix="zw-upstream")
+        self._active_slots = None  # created on the serving loop in start()
+
+    # --- Lifecycle ---
+    async def start(self, host: str = HOST, port: int = PORT, http_host: str = HTTP_HOST,
+                    http_port: int = HTTP_PORT):
+        # Requests in hand; when it runs out we stop reading new ones. Queue limits and
+        # deadlines are enforced by self.admission, which answers 429/503 well before that.
+        self._active_slots = asyncio.Semaphore(max(MAX_ACTIVE_REQUESTS, self.max_upstream + self.max_queue + 1))
+        await self.jobs.start()
+        tcp_server = await asyncio.start_server(self.handle_tcp, host, port)
+        http_server = await asyncio.start_server(self.handle_http, http_host, http_port)
+        self.servers = [tcp_server, http_server]
+        return tcp_server, http_server
+
+    async def serve_forever(self):
+        await asyncio.gather(*(server.serve_forever() for server in self.servers))
+
+    async def close(self):
+        for server in self.servers:
+            server.close()
+        for server in self.servers:
+            with suppress(Exception):
+                await server.wait_closed()
+        await self.jobs.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.cache is not None:
+            self.cache.close()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "coalesced": self.coalesced,
+            "scheduler": self.scheduler.stats(),
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "log": get_writer(LOG_PATH).stats(),
+            "jobs": self.jobs.stats(),
+            "admission": self.admission.stats(),
+            "backends": backend_stats(),
+        }
+
+    def metrics_text(self) -> str:
+        """Prometheus text for GET /metrics; gauges, and counters whose totals live elsewhere, are read off
+        the live state here."""
+        metrics = self.metrics
+        metrics.queued.set(self.queued)
+        metrics.upstream_in_flight.set(self.in_flight)
+        if self.cache is not None:
+            cache = self.cache.stats()
+            metrics.cache_hits.labels().set(cache["hits"])  # mirrors the cache's own totals
+            metrics.cache_misses.labels().set(cache["misses"])
+        metrics.log_dropped.labels().set(get_writer(LOG_PATH).dropped)
+        jobs = self.jobs.stats()
+        metrics.blender_jobs.labels("queued").set(jobs["queued"])
+        metrics.blender_jobs.labels("running").set(jobs["running"])
+        for state, count in jobs["finished"].items():
+            metrics.blender_jobs_finished.labels(state).set(count)
+        return metrics.render()
+
+    @contextmanager
+    def _track(self, transport: str):
+        """Counts and times one request from the moment it was read until it is answered."""
+        metrics = self.metrics
+        metrics.requests.labels(transport).inc()
+        in_progress = metrics.requests_in_progress.labels(transport)
+        in_progress.inc()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            in_progress.dec()
+            metrics.request_duration.labels(transport).observe(time.monotonic() - started)
+
+    def _count_error(self, transport: str, error):
+        """error: an exception, or a reason string."""
+        if isinstance(error, Overloaded):
+            reason = error.reason
+        elif isinstance(error, CircuitOpenError):
+            reason = "circuit_open"
+        elif isinstance(error, (ConnectionError, asyncio.CancelledError)):
+            reason = "client_gone"
+        elif isinstance(error, Exception):
+            reason = "upstream"
+        else:
+            reason = error
+        self.metrics.request_errors.labels(transport, reason).inc()
+
+    # --- Upstream ---
+    def _ticket(self, request: ZWRequest):
+        return self.scheduler.ticket(request.model or DEFAULT_MODEL, request.priority)
+
+    @asynccontextmanager
+    async def _upstream_slot(self, ticket):
+        started = time.monotonic()
+        self.queued += 1
+        try:
+            await ticket.acquire()
+        finally:
+            self.queued -= 1
+        granted = time.monotonic()
+        self.metrics.queue_wait.labels(ticket.priority).observe(granted - started)
+        self.in_flight += 1
+        try:
+            yield
+        except Exception as e:
+            reason = "circuit_open" if isinstance(e, CircuitOpenError) else "error"
+            self.metrics.upstream_errors.labels(ticket.model, reason).inc()
+            raise
+        finally:
+            self.in_flight -= 1
+            ticket.release()
+            duration = time.monotonic() - granted
+            self.metrics.upstream_duration.labels(ticket.model).observe(duration)
+            self.admission.observe(duration)
+
+    def _admit(self, request: ZWRequest):
+        """Raises Overloaded if a new upstream call for request should not even be queued."""
+        scheduler = self.scheduler
+        self.admission.admit(scheduler.queued, scheduler.queued_ahead(request.priority),
+                             scheduler.total_running, request.deadline)
+
+    async def _call_upstream(self, request: ZWRequest, ticket=None):
+        """Async generator of pieces from one real upstream call, once the scheduler grants it a slot."""
+        loop = asyncio.get_running_loop()
+        ticket = ticket or self._ticket(request)
+        if self.query_stream is None:
+            async with self._upstream_slot(ticket):
+                yield await loop.run_in_executor(
+                    self._executor, lambda: self.query(request.prompt, **request.upstream_kwargs()))
             return
 
-        # Read body safely
+        pieces = asyncio.Queue()
+        stop = threading.Event()
+
+        def put(item):
+            with suppress(RuntimeError):  # loop already closed
+                loop.call_soon_threadsafe(pieces.put_nowait, item)
+
+        def pump():
+            # Runs on the upstream pool; hands pieces to the loop as they arrive
+            stream = self.query_stream(request.prompt, **request.upstream_kwargs())
+            try:
+                for piece in stream:
+                    if stop.is_set():
+                        break
+                    put(piece)
+                put(_STREAM_END)
+            except Exception as e:
+                put(e)
+            finally:
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+
+        async with self._upstream_slot(ticket):
+            done = loop.run_in_executor(self._executor, pump)
+            try:
+                while True:
+                    item = await pieces.get()
+                    if item is _STREAM_END:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                # The client may have gone away; let the upstream call wind down
+                stop.set()
+                with suppress(Exception):
+                    await done
+
+    # --- Response cache ---
+    def _request_key(self, request: ZWRequest) -> str:
+        return cache_key(request.prompt, request.model or DEFAULT_MODEL, request.options)
+
+    def _cache_key(self, request: ZWRequest) -> Optional[str]:
+        if self.cache is None or not should_cache(request.options, request.cache, self.cache_by_default):
+            return None
+        return self._request_key(request)
+
+    async def _cache_call(self, fn, *args):
+        # The SQLite tier does disk I/O; keep that off the loop
+        if self.cache.persistent:
+            return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+        return fn(*args)
+
+    # --- Single flight ---
+    async def _fly(self, flight: "_Flight", request: ZWRequest, key: str):
+        """Runs the shared upstream call for a flight and publishes what it yields."""
+        try:
+            async for piece in self._call_upstream(request, flight.ticket):
+                await flight.publish(piece)
+            cache_key_ = self._cache_key(request)
+            if cache_key_:
+                await self._cache_call(self.cache.put, cache_key_, "".join(flight.pieces))
+            await flight.finish()
+        except asyncio.CancelledError:
+            await flight.finish(ConnectionAbortedError("upstream call cancelled"))
+        except Exception as e:
+            await flight.finish(e)
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def _shared(self, request: ZWRequest):
+        """Joins the in-progress call for an identical request, or starts one."""
+        key = self._request_key(request)
+        flight = self._flights.get(key)
+        if flight is None:
+            self._admit(request)
+            flight = self._flights[key] = _Flight()
+            flight.ticket = self._ticket(request)
+            flight.task = asyncio.get_running_loop().create_task(self._fly(flight, request, key))
+        else:
+            self.coalesced += 1
+            self.metrics.coalesced.inc()
+            # An interactive request must not wait behind the batch call it joined
+            flight.ticket.promote(request.priority)
+        flight.subscribers += 1
+        try:
+            async for piece in flight.subscribe():
+                yield piece
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Everyone went away; stop paying for the call
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    # --- Requests ---
+    async def process_stream(self, request):
+        """Async generator of response pieces for one ZWRequest (or prompt string).
+
+        Order of preference: the cache, an identical call already in progress,
+        a new upstream call. cache=False asks for a fresh answer, so it skips both.
+        """
+        if isinstance(request, str):
+            request = ZWRequest(request)
+        key = self._cache_key(request)
+        if key:
+            cached = await self._cache_call(self.cache.get, key)
+            if cached is not None:
+                yield cached
+                return
+
+        if request.cache is False:
+            self._admit(request)
+            pieces = self._call_upstream(request)
+        else:
+            pieces = self._shared(request)
+        try:
+            async for piece in pieces:
+                yield piece
+        finally:
+            await pieces.aclose()
+
+    async def process(self, request) -> str:
+        """Like process_stream(), but returns the whole text."""
+        return "".join([piece async for piece in self.process_stream(request)])
+
+    # --- TCP (legacy `///` protocol) ---
+    async def _read_legacy_prompt(self, reader: asyncio.StreamReader, data: bytes = b""):
+        """Reads until the data ends with `///`; None if the client hangs up first."""
+        data = bytearray(data)
+        if not data:
+            return None
+        while not bytes(data[-BUFFER_SIZE:]).rstrip().endswith(b"///"):
+            # Checked on the raw bytes, so a multi-byte character split across reads is fine
+            chunk = await reader.read(BUFFER_SIZE)
+            if not chunk:
+                return None
+            data += chunk
+            if len(data) > MAX_REQUEST_BYTES:
+                raise HTTPError(413, f"request larger than {MAX_REQUEST_BYTES} bytes")
+        return data.decode("utf-8", errors="replace").strip().rstrip("///").strip()
+
+    async def handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        addr = writer.get_extra_info("peername")
+        print(f"[+] Connected: {addr}")
         try:
-            length = int(self.headers.get("Content-Length", "0"))
-            raw = self.rfile.read(length) if length > 0 else b"{}"
-            data = json.loads(raw.decode("utf-8"))
+            # The first byte tells the protocols apart: framed clients open with 0xFF, never valid UTF-8 text
+            first = await reader.read(1)
+            if first == FRAME_MAGIC[:1]:
+                await self._serve_framed(reader, writer, addr, first)
+                return
+            async with self._active_slots:
+                prompt = await self._read_legacy_prompt(reader, first)
+                if prompt is None:
+                    print(f"[-] Connection from {addr} closed prematurely.")
+                    return
+                request = ZWRequest.from_legacy(prompt)
+                prompt = request.prompt
+                if not prompt:
+                    print(f"[-] Empty prompt received from {addr} after stripping '///'. Closing connection.")
+                    return
+
+                print(f"[>] Received prompt from {addr}:\n{prompt}\n")
+                pieces = []
+                with self._track("tcp"):
+                    try:
+                        self.admission.check_client(_peer_host(writer))
+                        # Forward each piece as it arrives; the client reads until we close
+                        async for piece in self.process_stream(request):
+                            pieces.append(piece)
+                            writer.write(piece.encode("utf-8"))
+                            await writer.drain()
+                        print(f"[✔] Responded to {addr}.")
+                    except Overloaded as e:
+                        # This protocol has no error channel; the text is all the client gets
+                        self._count_error("tcp", e)
+                        print(f"[!] Refused {addr}: {e}")
+                        if not pieces:
+                            writer.write(f"ERROR: daemon busy: {e}; retry after {e.retry_after}s".encode("utf-8"))
+                            await writer.drain()
+                    except Exception as e:
+                        self._count_error("tcp", e)
+                        print(f"[!] Error processing or sending response to {addr}: {e}")
+                log(prompt, "".join(pieces) if pieces else "ERROR: No response generated")
+        except ConnectionError:
+            print(f"[!] Connection reset by {addr}.")
         except Exception as e:
-            self._send_json(400, {"error": f"bad json: {e}"})
+            print(f"[!] Error handling {addr}: {e}")
+        finally:
+            writer.close()
+            with suppress(Exception):
+                await writer.wait_closed()
+
+    # --- TCP (framed protocol) ---
+    async def _serve_framed(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, addr, prefix: bytes):
+        """Reads pipelined request frames and answers each one as soon as it is done."""
+        write_lock = asyncio.Lock()
+        slots = asyncio.Semaphore(MAX_PIPELINED_REQUESTS)
+        peer = _peer_host(writer)
+        tasks = {}
+
+        async def send(frame_type: int, request_id: int, payload):
+            async with write_lock:
+                writer.write(encode_frame(frame_type, request_id, payload))
+                await writer.drain()
+
+        def finished(request_id, task):
+            if tasks.get(request_id) is task:
+                del tasks[request_id]
+            slots.release()
+            if not task.cancelled() and task.exception() is not None:
+                print(f"[!] Framed request {request_id} from {addr} failed: {task.exception()}")
+
+        clean_eof = False
+        try:
+            while True:
+                frame = await read_frame(reader, prefix, MAX_REQUEST_BYTES)
+                prefix = b""
+                if frame is None:
+                    clean_eof = True
+                    break
+                if frame.type == FRAME_CANCEL:
+                    task = tasks.get(frame.request_id)
+                    if task:
+                        task.cancel()
+                    continue
+                if frame.type != FRAME_REQUEST:
+                    await send(FRAME_ERROR, frame.request_id, {"error": f"unexpected frame type {frame.type}"})
+                    continue
+                if frame.request_id in tasks:
+                    await send(FRAME_ERROR, frame.request_id, {"error": "request id already in use"})
+                    continue
+                # Stop reading once this connection has enough requests in flight
+                await slots.acquire()
+                task = asyncio.get_running_loop().create_task(self._serve_frame_request(frame, send, peer))
+                tasks[frame.request_id] = task
+                task.add_done_callback(lambda t, request_id=frame.request_id: finished(request_id, t))
+        except ProtocolError as e:
+            with suppress(Exception):
+                await send(FRAME_ERROR, 0, {"error": str(e)})
+        finally:
+            if clean_eof:
+                # The client is done sending but still wants its replies
+                await asyncio.gather(*tasks.values(), return_exceptions=True)
+            else:
+                for task in tasks.values():
+                    task.cancel()
+
+    async def _serve_frame_request(self, frame, send, peer: str):
+        request_id = frame.request_id
+        try:
+            data = frame.json()
+            request = ZWRequest.from_json(data, "prompt", DEFAULT_PRIORITY)
+        except ValueError as e:
+            self._count_error("framed", "bad_request")
+            await send(FRAME_ERROR, request_id, {"error": f"bad request: {e}"})
+            return
+        stream = bool(data.get("stream"))
+        try:
+            self.admission.check_client(str(data.get("client") or peer))
+        except Overloaded as e:
+            self._count_error("framed", e)
+            await send(FRAME_ERROR, request_id, {"error": str(e), "status": e.status, "retry_after": e.retry_after})
             return
 
-        zw_content = data.get("zw_data", "")
-        if not isinstance(zw_content, str) or not zw_content.strip():
-            self._send_json(400, {"error": "missing or empty 'zw_data'"})
+        async with self._active_slots:
+            with self._track("framed"):
+                await self._answer_frame_request(request, request_id, stream, send)
+
+    async def _answer_frame_request(self, request: ZWRequest, request_id: int, stream: bool, send):
+        pieces = []
+        try:
+            async for piece in self.process_stream(request):
+                pieces.append(piece)
+                if stream:
+                    await send(FRAME_CHUNK, request_id, piece)
+        except (ConnectionError, asyncio.CancelledError) as e:
+            self._count_error("framed", e)
+            raise
+        except Exception as e:
+            self._count_error("framed", e)
+            if isinstance(e, Overloaded):
+                error = {"error": str(e), "status": e.status, "retry_after": e.retry_after}
+            else:
+                error = {"error": f"ollama: {e}"}
+                if isinstance(e, CircuitOpenError):
+                    error["retry_after"] = e.retry_after
+            await send(FRAME_ERROR, request_id, error)
             return
+        response_text = "".join(pieces)
+        log(request.prompt, response_text)
+        await send(FRAME_DONE, request_id, {"status": "success"} if stream
+                   else {"status": "success", "response": response_text})
+
+    # --- HTTP ---
+    async def _read_http_head(self, reader: asyncio.StreamReader):
+        """Returns (method, path, version, headers), or None when the client closed the connection."""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise HTTPError(400, "incomplete request head")
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "request head too large")
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, path, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, f"bad request line: {lines[0]!r}")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        return method.upper(), path, version, headers
+
+    async def _read_http_body(self, reader: asyncio.StreamReader, headers: dict) -> bytes:
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(411, "chunked request bodies are not supported; send Content-Length")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HTTPError(400, "bad Content-Length")
+        if length > MAX_REQUEST_BYTES:
+            raise HTTPError(413, f"request larger than {MAX_REQUEST_BYTES} bytes")
+        return await reader.readexactly(length) if length > 0 else b""
+
+    def _http_head(self, status: int, headers: dict, keep_alive: bool) -> bytes:
+        head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+        head += [f"{name}: {value}" for name, value in {**CORS_HEADERS, **headers}.items()]
+        head.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1")
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool):
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Content-Length": len(body)}
+        if "retry_after" in payload:
+            headers["Retry-After"] = max(1, math.ceil(payload["retry_after"]))
+        writer.write(self._http_head(status, headers, keep_alive) + body)
+        await writer.drain()
+
+    async def _send_text(self, writer: asyncio.StreamWriter, status: int, text: str, content_type: str,
+                         keep_alive: bool):
+        body = text.encode("utf-8")
+        writer.write(self._http_head(status, {"Content-Type": content_type, "Content-Length": len(body)},
+                                     keep_alive) + body)
+        await writer.drain()
+
+    async def _send_events(self, writer: asyncio.StreamWriter, events, keep_alive: bool):
+        """Sends (event name or None, payload) pairs as Server-Sent Events in a chunked response."""
+        writer.write(self._http_head(200, {"Content-Type": "text/event-stream",
+                                           "Cache-Control": "no-cache",
+                                           "Transfer-Encoding": "chunked"}, keep_alive))
+        try:
+            async for name, payload in events:
+                event = f"event: {name}\n" if name else ""
+                data = f"{event}data: {json.dumps(payload)}\n\n".encode("utf-8")
+                writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                await writer.drain()
+        finally:
+            await events.aclose()  # stops the upstream call if the client went away
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        keep_alive = False
+        peer = _peer_host(writer)
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_http_head(reader), HTTP_KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if request is None:
+                    break
+                method, path, version, headers = request
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                # Agents on one host can name themselves, so each gets its own rate limit
+                client = headers.get("x-zw-client") or peer
+
+                async with self._active_slots:
+                    body = await self._read_http_body(reader, headers)
+                    with self._track("http") if path == "/process_zw" else nullcontext():
+                        status, payload = await self.handle_http_request(method, path, body, headers, client)
+                        if isinstance(payload, dict):
+                            await self._send_json(writer, status, payload, keep_alive)
+                        elif isinstance(payload, str):
+                            await self._send_text(writer, status, payload, METRICS_CONTENT_TYPE, keep_alive)
+                        else:
+                            await self._send_events(writer, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except HTTPError as e:
+            # The rest of the request may still be unread, so this connection cannot be reused
+            with suppress(Exception):
+                await self._send_json(writer, e.status, {"error": str(e)}, keep_alive=False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"[!] HTTP connection error: {e}")
+        finally:
+            writer.close()
+            with suppress(Exception):
+                await writer.wait_closed()
+
+    async def handle_http_request(self, method: str, path: str, body: bytes, headers: dict = None,
+                                  client: Optional[str] = None):
+        """Returns (status, JSON payload) for one request, (200, event stream) when streaming,
+        or (200, Prometheus text) for /metrics. `client` is who the rate limit is kept for."""
+        if method == "OPTIONS":
+            return 200, {"ok": True}  # CORS preflight
+        if method == "GET" and path == "/stats":
+            return 200, self.stats()
+        if method == "GET" and path == "/metrics":
+            return 200, self.metrics_text()
+        if method == "GET" and path.startswith("/jobs/"):
+            job = self.jobs.get(path[len("/jobs/"):])
+            return (200, job.to_dict()) if job else (404, {"error": "unknown job"})
+        if method != "POST" or path != "/process_zw":
+            return 404, {"error": "not found"}
+        if client is not None:
+            try:
+                self.admission.check_client(client)
+            except Overloaded as e:
+                self._count_error("http", e)
+                return e.status, {"error": str(e), "retry_after": e.retry_after}
+
+        try:
+            data = json.loads(body.decode("utf-8") if body else "{}")
+            if not isinstance(data, dict):
+                raise ValueError("expected an object")
+        except Exception as e:
+            self._count_error("http", "bad_request")
+            return 400, {"error": f"bad json: {e}"}
+
+        try:
+            request = ZWRequest.from_json(data, "zw_data", "interactive")
+        except ValueError as e:
+            self._count_error("http", "bad_request")
+            return 400, {"error": str(e)}
+        zw_content = request.prompt
+
+        accept = (headers or {}).get("accept", "")
+        if data.get("stream") or "text/event-stream" in accept:
+            events = self._stream_process_zw(request, bool(data.get("route_to_blender")))
+            try:
+                # Wait for the first event before answering, so a refusal can still be a 429/503
+                first = await events.__anext__()
+            except Overloaded as e:
+                self._count_error("http", e)
+                return e.status, {"error": str(e), "retry_after": e.retry_after}
+            return 200, _prepend(first, events)
 
         # Call Ollama and (optionally) route to Blender BEFORE we reply
         try:
-            response_text = query_ollama(zw_content)
-            log(zw_content, response_text)
+            response_text = await self.process(request)
+        except Overloaded as e:
+            self._count_error("http", e)
+            return e.status, {"error": str(e), "retry_after": e.retry_after}
+        except CircuitOpenError as e:
+            self._count_error("http", e)
+            return 503, {"error": f"ollama: {e}", "retry_after": e.retry_after}
         except Exception as e:
-            self._send_json(502, {"error": f"ollama: {e}"})
-            return
+            self._count_error("http", e)
+            return 502, {"error": f"ollama: {e}"}
+        log(zw_content, response_text)
+        return 200, await self._finish_process_zw(zw_content, response_text, data.get("route_to_blender"))
 
-        if data.get("route_to_blender"):
+    async def _finish_process_zw(self, zw_content: str, response_text: str, route: bool) -> dict:
+        result = {"status": "success", "response": response_text}
+        if route:
             try:
-                temp_file = f"/tmp/web_zw_{int(time.time())}.zw"
-                with open(temp_file, "w", encoding="utf-8") as f:
-                    f.write(zw_content)
-
-                project_root = Path(__file__).resolve().parents[1]  # repo root
-                # Fire-and-forget; if you want to block, use run(..., check=True)
-                subprocess.Popen(
-                    ["python3", "tools/engain_orbit.py", temp_file],
-                    cwd=str(project_root)
-                )
-            except Exception as e:
+                job = await self.jobs.submit(zw_content)
+                result["blender_job"] = {"id": job.id, "state": job.state, "url": f"/jobs/{job.id}"}
+            except (JobQueueFull, OSError) as e:
                 # Non-fatal: return response but include routing error
-                self._send_json(200, {"status": "success", "response": response_text, "blender_error": str(e)})
-                return
+                result["blender_error"] = str(e)
+        return result
 
-        self._send_json(200, {"status": "success", "response": response_text})
+    async def _stream_process_zw(self, request: ZWRequest, route: bool):
+        """Events for a streamed /process_zw: one per piece, then "done" with the full result (or "error")."""
+        zw_content = request.prompt
+        pieces = []
+        try:
+            async for piece in self.process_stream(request):
+                pieces.append(piece)
+                yield None, {"response": piece}
+        except Exception as e:
+            if isinstance(e, Overloaded) and not pieces:
+                raise  # refused before anything was sent; handle_http_request answers with a status
+            # Headers are already out, so the failure travels as an event
+            self._count_error("http", e)
+            error = {"error": f"ollama: {e}"}
+            if isinstance(e, CircuitOpenError):
+                error["retry_after"] = e.retry_after
+            yield "error", error
+            return
+        response_text = "".join(pieces)
+        log(zw_content, response_text)
+        yield "done", await self._finish_process_zw(zw_content, response_text, route)
 
-# --- HTTP server thread ---
-def start_http_server():
-    # allow quick rebinds after crash
-    HTTPServer.allow_reuse_address = True
-    server = HTTPServer((HTTP_HOST, HTTP_PORT), ZWHTTPHandler)
-    print(f"🌐 ZW MCP HTTP Server listening on {HTTP_HOST}:{HTTP_PORT}")
-    server.serve_forever()
 
-# --- TCP client handling ---
-def handle_client(conn, addr):
-    print(f"[+] Connected: {addr}")
-    data_chunks = []
+def _peer_host(writer: asyncio.StreamWriter) -> str:
+    peer = writer.get_extra_info("peername")
+    return str(peer[0]) if isinstance(peer, tuple) else str(peer)
+
+
+async def _prepend(first, events):
     try:
-        while True:
-            chunk = conn.recv(BUFFER_SIZE)
-            if not chunk:
-                print(f"[-] Connection from {addr} closed prematurely.")
-                return
-            decoded = chunk.decode("utf-8", errors="replace")
-            data_chunks.append(decoded)
-            if decoded.strip().endswith("///"):
-                break
-    except ConnectionResetError:
-        print(f"[!] Connection reset by {addr} during receive.")
-        return
-    except Exception as e:
-        print(f"[!] Error receiving data from {addr}: {e}")
-        return
+        yield first
+        async for event in events:
+            yield event
+    finally:
+        await events.aclose()
 
-    prompt = "".join(data_chunks).strip().rstrip("///").strip()
-    if not prompt:
-        print(f"[-] Empty prompt received from {addr} after stripping '///'. Closing connection.")
-        conn.close()
-        return
 
-    print(f"[>] Received prompt from {addr}:\n{prompt}\n")
+async def _serve():
+    daemon = ZWDaemon(cache=cache_from_env() if CACHE_ENABLED else None)
+    try:
+        await daemon.start()
+    except OSError as e:
+        print(f"[!] Failed to bind: {e}")
+        return
 
+    print(f"🌐 ZW MCP Daemon listening on {HOST}:{PORT} ...")
+    print(f"🌐 ZW MCP HTTP Server listening on {HTTP_HOST}:{HTTP_PORT}")
+    print(f"ℹ️ Upstream calls: {daemon.max_upstream} at a time, {daemon.max_queue} queued")
+    cache = daemon.cache
+    if cache is None:
+        print("ℹ️ Response cache: off (ZW_MCP_CACHE=0)")
+    else:
+        print(f"ℹ️ Response cache: {cache.max_entries} entries, {cache.ttl:.0f}s TTL, "
+              f"{'persisted to ' + str(cache.path) if cache.persistent else 'memory only'}"
+              f"{'' if daemon.cache_by_default else ' (seeded requests unless opted in)'}")
+    print(f"ℹ️ Logging interactions to: {LOG_PATH.resolve()}")
+    recovered = await daemon.jobs.recover()
+    print(f"ℹ️ Blender jobs: {daemon.jobs.workers} at a time"
+          f"{f', {recovered} recovered from {daemon.jobs.spool_dir}' if recovered else ''}")
     try:
-        response = query_ollama(prompt)
-        conn.sendall(response.encode("utf-8"))
-    except Exception as e:
-        print(f"[!] Error processing or sending response to {addr}: {e}")
+        await daemon.serve_forever()
     finally:
-        conn.close()
-        print(f"[✔] Responded to {addr} and closed connection.")
+        if cache is not None:
+            stats = cache.stats()
+            print(f"ℹ️ Cache: {stats['hits']} hits / {stats['misses']} misses "
+                  f"({stats['hit_rate']:.0%}), {stats['bytes_saved']} bytes saved")
+        await daemon.close()
 
-    log(prompt, response if 'response' in locals() else "ERROR: No response generated")
 
-# --- TCP accept loop + HTTP thread ---
 def start_server():
     # Ensure log dir exists once
     LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        asyncio.run(_serve())
+    except KeyboardInterrupt:
+        print("\n[!] Server shutting down...")
 
-    # HTTP in background
-    http_thread = threading.Thread(target=start_http_server, daemon=True)
-    http_thread.start()
-
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
-        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        try:
-            server.bind((HOST, PORT))
-        except OSError as e:
-            print(f"[!] Failed to bind to {HOST}:{PORT}: {e}")
-            return
-
-        server.listen()
-        print(f"🌐 ZW MCP Daemon listening on {HOST}:{PORT} ...")
-        print(f"ℹ️ Logging interactions to: {LOG_PATH.resolve()}")
-
-        while True:
-            try:
-                conn, addr = server.accept()
-                threading.Thread(target=handle_client, args=(conn, addr), daemon=True).start()
-            except KeyboardInterrupt:
-                print("\n[!] Server shutting down...")
-                break
-            except Exception as e:
-                print(f"[!] Error accepting connection: {e}")
 
 if __name__ == "__main__":
     start_server()
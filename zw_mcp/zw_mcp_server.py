@@ -2,7 +2,7 @@
 import argparse
 from ollama_handler import query_ollama # Assuming ollama_handler.py is in the same directory or PYTHONPATH
 from pathlib import Path
-from datetime import datetime
+from zw_log import log_event
 
 def read_zw_from_file(filepath: str) -> str:
     with open(filepath, "r", encoding="utf-8") as f:
@@ -15,11 +15,7 @@ def save_response_to_file(content: str, output_path: str):
         f.write(content)
 
 def log_interaction(prompt: str, response: str, log_path: str):
-    # Ensure the log directory exists
-    Path(log_path).parent.mkdir(parents=True, exist_ok=True)
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(f"\n--- Prompt [{datetime.now()}] ---\n{prompt}\n")
-        f.write(f"\n--- Response ---\n{response}\n")
+    log_event(log_path, "exchange", prompt=prompt, response=response)
 
 def main():
     parser = argparse.ArgumentParser(description="ZW MCP ↔ Ollama")
@@ -1,6 +1,7 @@
 # zw_mcp/zw_mesh.py
 import bpy
 import math
+from collections.abc import Mapping, Sequence
 from pathlib import Path
 from mathutils import Vector  # Explicitly import Vector
 
@@ -274,7 +275,7 @@ def apply_material(blender_obj: bpy.types.Object, material_def: dict):
     # Apply base color if not overridden by texture
     texture_data = material_def.get("TEXTURE")
     texture_will_set_base_color = False
-    if isinstance(texture_data, dict) and texture_data.get("TYPE", "").lower() in ["image", "noise"]:
+    if isinstance(texture_data, Mapping) and texture_data.get("TYPE", "").lower() in ["image", "noise"]:
         texture_will_set_base_color = True # Assume texture connection replaces base color input
 
     if not texture_will_set_base_color and "BASE_COLOR" in material_def:
@@ -294,7 +295,7 @@ def apply_material(blender_obj: bpy.types.Object, material_def: dict):
              principled_bsdf.inputs["Emission Color"].default_value = principled_bsdf.inputs["Base Color"].default_value
 
     # Apply Texture
-    if isinstance(texture_data, dict):
+    if isinstance(texture_data, Mapping):
         print(f"    Processing TEXTURE block for material '{mat_name}'")
         apply_texture_to_material_nodes(principled_bsdf, texture_data, blender_obj)
     else:
@@ -367,7 +368,7 @@ def handle_zw_mesh_block(mesh_def: dict, collection_to_link=None):
     if not bpy:
         print("[Critical Error] bpy module not available. Cannot process ZW-MESH.")
         return None
-    if not isinstance(mesh_def, dict):
+    if not isinstance(mesh_def, Mapping):
         print("[Error] ZW-MESH definition is not a dictionary. Skipping.")
         return None
 
@@ -407,11 +408,11 @@ def handle_zw_mesh_block(mesh_def: dict, collection_to_link=None):
 
         # Apply Deformations
         deformations = mesh_def.get("DEFORMATIONS")
-        if isinstance(deformations, list) and deformations:
+        if isinstance(deformations, Sequence) and not isinstance(deformations, str) and deformations:
             apply_deformations(created_obj, deformations)
 
         # Apply Material
-        if isinstance(material_data, dict) and material_data: # Check if material_data is a non-empty dict
+        if isinstance(material_data, Mapping) and material_data: # Check if material_data is a non-empty dict
             apply_material(created_obj, material_data)
 
         # Link to collection
@@ -440,7 +441,7 @@ def handle_zw_mesh_block(mesh_def: dict, collection_to_link=None):
 
         # Export if defined
         export_def = mesh_def.get("EXPORT")
-        if isinstance(export_def, dict) and export_def.get("FORMAT", "").lower() == "glb":
+        if isinstance(export_def, Mapping) and export_def.get("FORMAT", "").lower() == "glb":
             file_path_str = export_def.get("FILE")
             if file_path_str:
                 export_to_glb(created_obj, file_path_str)
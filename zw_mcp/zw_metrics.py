@@ -0,0 +1,269 @@
+# zw_mcp/zw_metrics.py
+"""In-process metrics in the Prometheus text format (GET /metrics on the daemon).
+
+Just enough of the Prometheus data model for the daemon: counters, gauges and
+histograms, each optionally split by labels. Everything is kept in plain
+Python numbers; each labelled series has its own lock, so threads only meet
+when they update the very same series (and the daemon's loop thread is the
+only writer for most of them).
+
+Ollama reports what a generation cost in its final response (`eval_count`,
+`eval_duration`, `prompt_eval_count`, `prompt_eval_duration`,
+`load_duration`, durations in nanoseconds). `ollama_handler` passes that to
+OLLAMA.observe_generation(), which lives in the process-wide REGISTRY; the
+daemon keeps its own request metrics in a DaemonMetrics and renders both.
+"""
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; generations take anywhere from tens of milliseconds (cache, short answers) to minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 150, 250)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        self.value = value  # a single store; no read-modify-write to protect
+
+    def samples(self, name: str, names, values) -> List[str]:
+        return [f"{name}{_label_text(names, values)} {_format_value(self.value)}"]
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # per bucket, not cumulative; the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self, name: str, names, values) -> List[str]:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines, running = [], 0
+        for bound, n in zip(self.bounds + (float("inf"),), counts):
+            running += n
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{name}_bucket{_label_text(names, values, le)} {running}")
+        lines.append(f"{name}_sum{_label_text(names, values)} {_format_value(total)}")
+        lines.append(f"{name}_count{_label_text(names, values)} {count}")
+        return lines
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        series = self._series.get(key)
+        if series is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name} takes labels {self.label_names}, got {key}")
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+
+    def _new_series(self):
+        return _Value()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, series in sorted(self._series.items()):
+            lines += series.samples(self.name, self.label_names, key)
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), registry: Optional["Registry"] = None,
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels, registry)
+
+    def _new_series(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+class OllamaMetrics:
+    """What each Ollama generation reported about itself, per model."""
+
+    def __init__(self, registry: Registry):
+        self.generations = Counter("zw_ollama_generations_total", "Completed Ollama generations.",
+                                   ["model"], registry)
+        self.prompt_tokens = Counter("zw_ollama_prompt_tokens_total", "Prompt tokens evaluated (prompt_eval_count).",
+                                     ["model"], registry)
+        self.eval_tokens = Counter("zw_ollama_eval_tokens_total", "Tokens generated (eval_count).",
+                                   ["model"], registry)
+        self.prompt_eval_seconds = Counter("zw_ollama_prompt_eval_seconds_total",
+                                           "Time spent evaluating prompts (prompt_eval_duration).", ["model"], registry)
+        self.eval_seconds = Counter("zw_ollama_eval_seconds_total", "Time spent generating (eval_duration).",
+                                    ["model"], registry)
+        self.load_seconds = Counter("zw_ollama_load_seconds_total", "Time spent loading models (load_duration).",
+                                    ["model"], registry)
+        self.tokens_per_second = Histogram("zw_ollama_tokens_per_second",
+                                           "Generation speed per request (eval_count / eval_duration).",
+                                           ["model"], registry, TOKEN_RATE_BUCKETS)
+        self.load_duration = Histogram("zw_ollama_load_duration_seconds", "Model load time per request.",
+                                       ["model"], registry)
+        self.total_duration = Histogram("zw_ollama_total_duration_seconds",
+                                        "Time Ollama spent on each request (total_duration).", ["model"], registry)
+        self.retries = Counter("zw_ollama_retries_total", "Upstream attempts that were retried.", [], registry)
+        self.backend_requests = Counter("zw_ollama_backend_requests_total", "Calls routed to each Ollama backend.",
+                                        ["backend"], registry)
+        self.backend_outstanding = Gauge("zw_ollama_backend_outstanding", "Calls running on each Ollama backend.",
+                                         ["backend"], registry)
+        self.backend_up = Gauge("zw_ollama_backend_up", "1 while a backend is in rotation, 0 while ejected.",
+                                ["backend"], registry)
+        self.backend_ejections = Counter("zw_ollama_backend_ejections_total", "Times a backend was taken out of "
+                                         "rotation.", ["backend"], registry)
+
+    def observe_generation(self, model: str, data: dict):
+        """Records the stats from a final Ollama response (`"done": true`); other dicts are ignored."""
+        if not data.get("done"):
+            return
+        model = data.get("model") or model or ""
+        self.generations.labels(model).inc()
+        eval_count = data.get("eval_count") or 0
+        eval_seconds = (data.get("eval_duration") or 0) / 1e9
+        load_seconds = (data.get("load_duration") or 0) / 1e9
+        self.prompt_tokens.labels(model).inc(data.get("prompt_eval_count") or 0)
+        self.prompt_eval_seconds.labels(model).inc((data.get("prompt_eval_duration") or 0) / 1e9)
+        self.eval_tokens.labels(model).inc(eval_count)
+        self.eval_seconds.labels(model).inc(eval_seconds)
+        self.load_seconds.labels(model).inc(load_seconds)
+        self.load_duration.labels(model).observe(load_seconds)
+        if data.get("total_duration"):
+            self.total_duration.labels(model).observe(data["total_duration"] / 1e9)
+        if eval_count and eval_seconds > 0:
+            self.tokens_per_second.labels(model).observe(eval_count / eval_seconds)
+
+
+class DaemonMetrics:
+    """Request, queue and upstream metrics for one ZWDaemon."""
+
+    def __init__(self):
+        self.registry = registry = Registry()
+        self.requests = Counter("zw_requests_total", "Requests handled, by transport.", ["transport"], registry)
+        self.request_errors = Counter("zw_request_errors_total", "Requests that ended in an error.",
+                                      ["transport", "reason"], registry)
+        self.request_duration = Histogram("zw_request_duration_seconds",
+                                          "Time from reading a request to its last byte of response.",
+                                          ["transport"], registry)
+        self.requests_in_progress = Gauge("zw_requests_in_progress", "Requests being handled right now.",
+                                          ["transport"], registry)
+        self.queue_wait = Histogram("zw_queue_wait_seconds", "Time waiting for an upstream slot.",
+                                    ["priority"], registry)
+        self.upstream_duration = Histogram("zw_upstream_duration_seconds", "Time holding an upstream slot.",
+                                           ["model"], registry)
+        self.upstream_errors = Counter("zw_upstream_errors_total", "Upstream calls that failed.",
+                                       ["model", "reason"], registry)
+        self.queued = Gauge("zw_queued_requests", "Requests waiting for an upstream slot.", [], registry)
+        self.upstream_in_flight = Gauge("zw_upstream_in_flight", "Upstream calls running right now.", [], registry)
+        self.coalesced = Counter("zw_coalesced_requests_total", "Requests that shared another request's "
+                                 "upstream call.", [], registry)
+        # Counters mirrored from totals kept elsewhere (the cache, the job queue, the log writer) at scrape time
+        self.cache_hits = Counter("zw_cache_hits_total", "Response cache hits.", [], registry)
+        self.cache_misses = Counter("zw_cache_misses_total", "Response cache misses.", [], registry)
+        self.blender_jobs = Gauge("zw_blender_jobs", "Blender jobs waiting or running.", ["state"], registry)
+        self.blender_jobs_finished = Counter("zw_blender_jobs_finished_total", "Blender jobs finished, by outcome.",
+                                             ["state"], registry)
+        self.log_dropped = Counter("zw_log_dropped_records_total", "Log records dropped because the writer "
+                                   "fell behind.", [], registry)
+
+    def render(self) -> str:
+        return self.registry.render() + REGISTRY.render()
+
+
+REGISTRY = Registry()
+OLLAMA = OllamaMetrics(REGISTRY)
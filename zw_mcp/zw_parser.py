@@ -1,70 +1,1235 @@
 # zw_mcp/zw_parser.py
+import codecs
+import hashlib
+import io
+import mmap
+import pickle
 import re
-import json # Not strictly needed for this version, but good if extending to JSON more directly
-from collections import defaultdict # Not strictly needed for this version
+import struct
+import sys
+import tempfile
+import os
+from array import array
+from collections import defaultdict
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, NamedTuple, Optional, Union
+
+try:
+    from zw_cache import ParseCache, content_key, file_content_key
+    from utils import clean_literal, parse_color, parse_number, parse_vector
+except ImportError:
+    from zw_mcp.zw_cache import ParseCache, content_key, file_content_key
+    from zw_mcp.utils import clean_literal, parse_color, parse_number, parse_vector
+
+# --- Parse cache ---
+# Shared by parse_zw, parse_zw_file, iter_zw_file_blocks and prettify_zw. validate_zw streams
+# through zw_schema instead and never touches it. Set ZW_PARSE_CACHE_DIR to add the on-disk
+# tier that survives between processes.
+PARSE_CACHE = ParseCache(
+    max_entries=int(os.getenv("ZW_PARSE_CACHE_ENTRIES", "128")),
+    cache_dir=os.getenv("ZW_PARSE_CACHE_DIR") or None,
+    max_disk_bytes=int(os.getenv("ZW_PARSE_CACHE_DISK_MB", "1024")) * 1024 * 1024,
+)
+# Texts shorter than this parse faster than they hash and unpickle
+PARSE_CACHE_MIN_BYTES = 1024
+# Files bigger than this are streamed without caching: the cache entry is built from
+# every block, so it would undo the bounded memory of iter_zw_file_blocks
+PARSE_CACHE_MAX_FILE_BYTES = int(os.getenv("ZW_PARSE_CACHE_MAX_FILE_MB", "64")) * 1024 * 1024
+
+# --- Streaming events ---
+# Event kinds yielded by iter_zw_events
+ZW_START = "start"  # `KEY:` opens a nested block
+ZW_VALUE = "value"  # `KEY: VALUE` scalar entry
+ZW_END = "end"      # the block opened by the matching ZW_START is closed
+ZW_SEPARATOR = "separator"  # `///` (or `---`) document boundary, only with documents=True
+
+# Lines that end one ZW document and start the next in multi-document files
+DOCUMENT_SEPARATORS = ("///", "---")
+
+READ_CHUNK_SIZE = 64 * 1024
 
-def parse_zw(zw_text: str) -> dict:
-    """Parses ZW-formatted text into a nested dictionary."""
-    result = {}
-    # stack keeps track of the current dictionary we're adding to
-    # at different indentation levels.
-    stack = [result]
-    # indent_stack keeps track of the indentation level corresponding
-    # to each dictionary on the stack.
-    indent_stack = [-1] # Start with -1 to handle first line at indent 0
 
-    lines = zw_text.strip().splitlines()
-    for line_number, line_text in enumerate(lines):
-        line = line_text # Keep original for potential error reporting later
+class ZWEvent(NamedTuple):
+    kind: str
+    key: str
+    value: Optional[str]
+    line: int    # 1-based line number in the source
+    indent: int
+
+
+class ZWBlock(NamedTuple):
+    key: str
+    value: Any   # dict for `KEY:` blocks, str for top-level `KEY: VALUE`
+    line: int
+    document: int  # 0-based index of the `///`-separated document
+
+
+def _split_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """Re-joins arbitrary text chunks into lines (without line terminators)."""
+    pending = ""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        pending += chunk
+        start = 0
+        while True:
+            nl = pending.find("\n", start)
+            if nl < 0:
+                break
+            yield pending[start:nl].rstrip("\r")
+            start = nl + 1
+        pending = pending[start:]
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def _decode_chunks(chunks: Iterable[Union[bytes, str]]) -> Iterator[str]:
+    """Decodes a mixed stream of bytes/str chunks as UTF-8, safe across split characters."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            text = decoder.decode(bytes(chunk))
+            if text:
+                yield text
+        else:
+            yield chunk
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
 
-        if not line.strip() or line.strip().startswith("#"):
-            continue  # Skip blank lines or comments
 
-        current_indent = len(line) - len(line.lstrip())
+def iter_zw_lines(source) -> Iterator[str]:
+    """Yields the lines of a ZW source: a str, bytes, a (text or binary) file object,
+    or any iterable of str/bytes chunks."""
+    if isinstance(source, str):
+        yield from _split_lines((source,))
+        return
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield from _split_lines(_decode_chunks((source,)))
+        return
+    if hasattr(source, "read"):
+        read = source.read
+        source = iter(lambda: read(READ_CHUNK_SIZE), source.read(0))
+    yield from _split_lines(_decode_chunks(source))
 
-        key_value_part = line.strip()
 
-        parts = key_value_part.split(":", 1)
+def iter_zw_events(source, documents: bool = False) -> Iterator[ZWEvent]:
+    """Pull-parses ZW text in a single pass, yielding ZWEvent tuples as lines arrive.
+
+    Every ZW_START is matched by exactly one ZW_END, so consumers can act on
+    a block as soon as it closes instead of waiting for the whole document.
+    With documents=True, `///`/`---` lines close all open blocks and emit a
+    ZW_SEPARATOR, and `//` lines are skipped as comments.
+    """
+    # open_blocks holds (indent, key, line) for every block that is still open
+    open_blocks = []
+    seen_content = False
+
+    for line_number, line in enumerate(iter_zw_lines(source), 1):
+        stripped = line.strip()
+        if not stripped:
+            continue
+
+        if seen_content:
+            current_indent = len(line) - len(line.lstrip())
+        else:
+            # parse_zw has always stripped the document, so the first line counts as indent 0
+            current_indent = 0
+            seen_content = True
+
+        if documents and stripped in DOCUMENT_SEPARATORS:
+            while open_blocks:
+                _, closed_key, _ = open_blocks.pop()
+                yield ZWEvent(ZW_END, closed_key, None, line_number, current_indent)
+            yield ZWEvent(ZW_SEPARATOR, stripped, None, line_number, current_indent)
+            continue
+
+        if stripped.startswith("#") or (documents and stripped.startswith("//")):
+            continue  # Skip comments
+
+        parts = stripped.split(":", 1)
         key = parts[0].strip()
         value_str = parts[1].strip() if len(parts) > 1 else None
 
-        # Adjust stack for current indentation level
-        while current_indent <= indent_stack[-1]:
-            stack.pop()
-            indent_stack.pop()
+        # Close every block that this line is not nested in
+        while open_blocks and current_indent <= open_blocks[-1][0]:
+            _, closed_key, _ = open_blocks.pop()
+            yield ZWEvent(ZW_END, closed_key, None, line_number, current_indent)
+
+        if not value_str:  # Handles `KEY:` (empty value implies dict)
+            open_blocks.append((current_indent, key, line_number))
+            yield ZWEvent(ZW_START, key, None, line_number, current_indent)
+        else:  # Handles `KEY: VALUE`
+            yield ZWEvent(ZW_VALUE, key, value_str, line_number, current_indent)
+
+    end_line = line_number + 1 if seen_content else 1
+    while open_blocks:
+        indent, closed_key, _ = open_blocks.pop()
+        yield ZWEvent(ZW_END, closed_key, None, end_line, indent)
+
+
+# --- Typed parse mode ---
+def decode_number(value: str):
+    return parse_number(clean_literal(value))
+
+
+def decode_vector(value: str):
+    """Float tuple from `(x, y, z)`; a bare number (uniform SCALE) stays a float."""
+    val = clean_literal(value)
+    vec = parse_vector(val)
+    if vec is not None:
+        return tuple(float(v) for v in vec)
+    num = parse_number(val)
+    return float(num) if num is not None else None
 
-        parent_dict = stack[-1]
 
-        if value_str == "" or value_str is None : # Handles `KEY:` (empty value implies dict)
+def decode_rgba(value: str):
+    return parse_color(clean_literal(value), None)
+
+
+FIELD_DECODERS = {
+    "number": decode_number,
+    "vector": decode_vector,
+    "rgba": decode_rgba,
+}
+
+# Field name -> decoder name (or callable). "BLOCK/*" applies to every scalar inside BLOCK.
+DEFAULT_FIELD_SCHEMA = {
+    "LOCATION": "vector",
+    "ROTATION": "vector",
+    "SCALE": "vector",
+    "BASE_COLOR": "rgba",
+    "EMISSION_COLOR": "rgba",
+    "COLOR": "rgba",
+    "EMISSION": "number",
+    "EMISSION_STRENGTH": "number",
+    "ROUGHNESS": "number",
+    "METALLIC": "number",
+    "ENERGY": "number",
+    "SIZE": "number",
+    "SIZE_X": "number",
+    "SIZE_Y": "number",
+    "ANGLE": "number",
+    "BLEND": "number",
+    "FOCAL_LENGTH": "number",
+    "SENSOR_WIDTH": "number",
+    "SENSOR_HEIGHT": "number",
+    "ORTHO_SCALE": "number",
+    "PARAMS/*": "number",
+}
+
+
+class _FieldTyper:
+    """Compiled field schema; decodes scalars once while the tree is being built."""
+
+    def __init__(self, schema: dict, vectors: str = "tuple"):
+        self.fields = {}
+        self.blocks = {}
+        for field, decoder in schema.items():
+            if isinstance(decoder, str):
+                decoder = FIELD_DECODERS[decoder]
+            if vectors == "numpy" and decoder in (decode_vector, decode_rgba):
+                decoder = _as_numpy(decoder)
+            if field.endswith("/*"):
+                self.blocks[field[:-2]] = decoder
+            else:
+                self.fields[field] = decoder
+
+    def decode(self, parent_key: Optional[str], key: str, value: str):
+        decoder = self.fields.get(key) or self.blocks.get(parent_key)
+        if decoder is None:
+            return value
+        decoded = decoder(value)
+        # Undecodable values stay strings so handlers keep their own fallbacks
+        return value if decoded is None else decoded
+
+
+def _as_numpy(decoder):
+    import numpy as np  # optional; only needed for vectors="numpy"
+
+    def decode(value):
+        decoded = decoder(value)
+        if isinstance(decoded, tuple):
+            return np.asarray(decoded, dtype=np.float64)
+        return decoded
+    return decode
+
+
+def _field_typer(typed, vectors: str) -> Optional[_FieldTyper]:
+    if not typed:
+        return None
+    return _FieldTyper(DEFAULT_FIELD_SCHEMA if typed is True else typed, vectors)
+
+
+def _cache_namespace(base: str, typed, vectors: str) -> Optional[str]:
+    """Cache namespace for a parse mode; custom schemas are not cached."""
+    if not typed:
+        return base
+    if typed is True:
+        return f"{base}:typed:{vectors}"
+    return None
+
+
+def _build_tree(source, typer: Optional[_FieldTyper] = None) -> dict:
+    result = {}
+    # stack keeps track of the current dictionary we're adding to
+    stack = [result]
+    keys = [None]  # key of each dict on the stack, for "BLOCK/*" schema fields
+
+    for event in iter_zw_events(source):
+        if event.kind == ZW_VALUE:
+            if typer is None:
+                stack[-1][event.key] = event.value
+            else:
+                stack[-1][event.key] = typer.decode(keys[-1], event.key, event.value)
+        elif event.kind == ZW_START:
             new_dict = {}
-            parent_dict[key] = new_dict
+            stack[-1][event.key] = new_dict
             stack.append(new_dict)
-            indent_stack.append(current_indent)
-        else: # Handles `KEY: VALUE`
-            parent_dict[key] = value_str
+            keys.append(event.key)
+        else:
+            stack.pop()
+            keys.pop()
 
     return result
 
-def to_zw(d: dict, current_indent_level: int = 0) -> str: # Renamed for clarity
-    """Converts a nested dictionary back to ZW-formatted text."""
-    lines = []
-    for key, value in d.items():
-        line_prefix = " " * current_indent_level
 
+def parse_zw(zw_text, use_cache: bool = True, typed=False, vectors: str = "tuple") -> dict:
+    """Parses ZW-formatted text (or a file object / chunk iterator) into a nested dictionary.
+
+    str/bytes input goes through PARSE_CACHE, so unchanged text is only parsed once.
+    typed=True decodes the fields in DEFAULT_FIELD_SCHEMA (vectors, colors, numbers)
+    during the parse; pass a dict to use a custom schema. vectors="numpy" returns
+    vectors and colors as NumPy arrays instead of tuples.
+    """
+    typer = _field_typer(typed, vectors)
+    namespace = _cache_namespace("parse_zw", typed, vectors)
+    if (use_cache and namespace and isinstance(zw_text, (str, bytes))
+            and len(zw_text) >= PARSE_CACHE_MIN_BYTES):
+        key = content_key(zw_text, namespace)
+        return PARSE_CACHE.get_or_compute(key, lambda: _build_tree(zw_text, typer))
+    return _build_tree(zw_text, typer)
+
+
+def parse_zw_file(path: Union[str, Path], use_cache: bool = True, typed=False, vectors: str = "tuple") -> dict:
+    """Parses a ZW file, streaming it on a cache miss. A hit costs one pass of hashing."""
+    typer = _field_typer(typed, vectors)
+
+    def parse():
+        with open(path, "rb") as f:
+            return _build_tree(f, typer)
+
+    namespace = _cache_namespace("parse_zw", typed, vectors)
+    if not use_cache or not namespace:
+        return parse()
+    return PARSE_CACHE.get_or_compute(file_content_key(path, namespace), parse)
+
+
+def zw_cache_stats() -> Dict[str, int]:
+    """Hit/miss counters of the shared parse cache."""
+    return PARSE_CACHE.stats()
+
+
+def _iter_top_level(source, typer: Optional[_FieldTyper] = None) -> Iterator[Optional[ZWBlock]]:
+    """Yields each closed top-level ZWBlock, and None at every document separator."""
+    document = 0
+    stack = []
+    keys = []
+    top_line = 0
+
+    for event in iter_zw_events(source, documents=True):
+        if event.kind == ZW_START:
+            new_dict = {}
+            if stack:
+                stack[-1][event.key] = new_dict
+            else:
+                top_line = event.line
+            stack.append(new_dict)
+            keys.append(event.key)
+        elif event.kind == ZW_VALUE:
+            value = event.value
+            if typer is not None:
+                value = typer.decode(keys[-1] if keys else None, event.key, value)
+            if stack:
+                stack[-1][event.key] = value
+            else:
+                yield ZWBlock(event.key, value, event.line, document)
+        elif event.kind == ZW_END:
+            closed = stack.pop()
+            closed_key = keys.pop()
+            if not stack:
+                yield ZWBlock(closed_key, closed, top_line, document)
+        else:  # ZW_SEPARATOR
+            document += 1
+            yield None
+
+
+def iter_zw_blocks(source, typed=False, vectors: str = "tuple") -> Iterator[ZWBlock]:
+    """Yields every top-level block of a (multi-document) ZW source as soon as it closes.
+
+    Repeated keys such as several `ZW-MESH:` blocks are all yielded, so a caller
+    only ever holds one block in memory.
+    """
+    for block in _iter_top_level(source, _field_typer(typed, vectors)):
+        if block is not None:
+            yield block
+
+
+def iter_zw_file_blocks(path: Union[str, Path], use_cache: bool = True, typed=False,
+                        vectors: str = "tuple") -> Iterator[ZWBlock]:
+    """iter_zw_blocks over a file, streamed with bounded memory.
+
+    With a persistent PARSE_CACHE (opt-in via ZW_PARSE_CACHE_DIR), files up to
+    PARSE_CACHE_MAX_FILE_BYTES are also cached on disk: blocks are still yielded
+    as they are parsed, and the entry is written once the whole file has been
+    read, so re-running an unchanged scene skips parsing entirely.
+    """
+    # Entries hold one pickle per block, taken before the caller sees (and maybe edits) it
+    namespace = _cache_namespace("zw_block_pickles", typed, vectors)
+    key = None
+    if (use_cache and namespace and PARSE_CACHE.persistent
+            and os.path.getsize(path) <= PARSE_CACHE_MAX_FILE_BYTES):
+        key = file_content_key(path, namespace)
+        cached = PARSE_CACHE.get(key)
+        if cached is not None:
+            for blob in cached:
+                yield pickle.loads(blob)
+            return
+
+    blocks = [] if key is not None else None
+    with open(path, "rb") as f:
+        for block in iter_zw_blocks(f, typed, vectors):
+            if blocks is not None:
+                blocks.append(pickle.dumps(block, protocol=pickle.HIGHEST_PROTOCOL))
+            yield block
+    if blocks is not None:
+        PARSE_CACHE.put(key, blocks)  # only reached when the caller read every block
+
+
+def iter_zw_documents(source, typed=False, vectors: str = "tuple") -> Iterator[dict]:
+    """Lazily yields one dict per `///`-separated ZW document, as soon as its separator is read.
+
+    Unlike parse_zw, a top-level key that repeats within a document keeps every
+    occurrence: its value becomes a list of the blocks in file order.
+    Empty documents are skipped.
+    """
+    current = {}
+    repeated = set()
+
+    for block in _iter_top_level(source, _field_typer(typed, vectors)):
+        if block is None:
+            if current:
+                yield current
+            current, repeated = {}, set()
+        elif block.key in repeated:
+            current[block.key].append(block.value)
+        elif block.key in current:
+            current[block.key] = [current[block.key], block.value]
+            repeated.add(block.key)
+        else:
+            current[block.key] = block.value
+
+    if current:
+        yield current
+
+# --- Parallel parsing ---
+PARALLEL_MIN_CHUNK_BYTES = 1024 * 1024
+PARALLEL_CHUNKS_PER_WORKER = 4
+
+
+def _find_document_boundary(mm, pos: int, end: int) -> int:
+    """Offset just past the first separator line at or after pos, or end if there is none."""
+    while pos < end:
+        nl = mm.find(b"\n", pos, end)
+        if nl < 0:
+            return end
+        line_end = mm.find(b"\n", nl + 1, end)
+        if line_end < 0:
+            line_end = end
+        if mm[nl + 1:line_end].strip() in (b"///", b"---"):
+            return min(line_end + 1, end)
+        pos = line_end
+    return end
+
+
+def split_zw_documents(path: Union[str, Path], chunks: int) -> list:
+    """Splits a file into about `chunks` (start, end) byte ranges that each end on a
+    document separator, so every range parses independently."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        ranges = []
+        start = 0
+        step = max(size // max(chunks, 1), 1)
+        while start < size:
+            end = _find_document_boundary(mm, min(start + step, size) - 1, size) if start + step < size else size
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _parse_zw_range(path: str, start: int, end: int, typed, vectors: str) -> list:
+    """Worker: maps the file itself and parses one byte range (nothing is sent over the pipe but offsets)."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            pieces = (view[pos:min(pos + READ_CHUNK_SIZE, end)] for pos in range(start, end, READ_CHUNK_SIZE))
+            return list(iter_zw_documents(pieces, typed, vectors))
+        finally:
+            view.release()
+
+
+def parse_zw_parallel(path: Union[str, Path], workers: Optional[int] = None, typed=False,
+                      vectors: str = "tuple") -> list:
+    """Parses a `///`-separated multi-document file on a process pool.
+
+    Returns the same list as `list(iter_zw_documents(f))`, in document order.
+    Small files, or files without separators, are parsed in-process.
+    """
+    path = str(path)
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(path)
+    chunks = min(workers * PARALLEL_CHUNKS_PER_WORKER, max(size // PARALLEL_MIN_CHUNK_BYTES, 1))
+    ranges = split_zw_documents(path, chunks) if workers > 1 else [(0, size)]
+    if len(ranges) <= 1:
+        with open(path, "rb") as f:
+            return list(iter_zw_documents(f, typed, vectors))
+
+    documents = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        futures = [pool.submit(_parse_zw_range, path, start, end, typed, vectors) for start, end in ranges]
+        for future in futures:  # submission order == document order
+            documents.extend(future.result())
+    return documents
+
+
+# --- Compiled binary form (.zwb) ---
+# Layout (little-endian, sections 8-byte aligned):
+#   header | string end-offsets (u64 x n+1) | string bytes | nodes (16 B each)
+#   | entries (key id u32, node id u32) | float64 values
+# A dict/list node points at a contiguous run of entries; lists use ZWB_NO_KEY.
+# Nodes are decoded only when touched, straight out of the mmap.
+ZWB_MAGIC = b"ZWB1"
+ZWB_VERSION = 1
+ZWB_HEADER = struct.Struct("<4sHH11Q")
+ZWB_NODE = struct.Struct("<B3xIQ")
+ZWB_NODE_INT = struct.Struct("<B3xIq")
+ZWB_NODE_FLOAT = struct.Struct("<B3xId")
+ZWB_ENTRY = struct.Struct("<II")
+ZWB_NO_KEY = 0xFFFFFFFF
+ZWB_SCALAR_CACHE_SIZE = 1 << 16
+
+ZWB_DICT, ZWB_LIST, ZWB_STR, ZWB_INT, ZWB_FLOAT, ZWB_VEC = range(6)
+
+
+class _ZWBWriter:
+    def __init__(self):
+        self.strings = {}
+        self.string_data = bytearray()
+        self.string_ends = [0]
+        self.nodes = bytearray()
+        self.entries = bytearray()
+        self.floats = array("d")
+        self.node_count = 0
+        # Nodes are immutable, so equal scalars ("Cube", "#33AAFF", 1.0) share one node
+        self.scalar_nodes = {}
+
+    def string_id(self, text: str) -> int:
+        sid = self.strings.get(text)
+        if sid is None:
+            sid = self.strings[text] = len(self.strings)
+            self.string_data += text.encode("utf-8")
+            self.string_ends.append(len(self.string_data))
+        return sid
+
+    def _node(self, packer: struct.Struct, kind: int, a: int, b) -> int:
+        self.nodes += packer.pack(kind, a, b)
+        self.node_count += 1
+        return self.node_count - 1
+
+    def _reserve_entries(self, count: int) -> int:
+        start = len(self.entries) // ZWB_ENTRY.size
+        self.entries += bytes(ZWB_ENTRY.size * count)
+        return start
+
+    def _set_entry(self, index: int, key_id: int, node_id: int):
+        ZWB_ENTRY.pack_into(self.entries, index * ZWB_ENTRY.size, key_id, node_id)
+
+    def add(self, value) -> int:
+        if isinstance(value, dict):
+            return self.add_dict([(key, self.add(child)) for key, child in value.items()])
+        if isinstance(value, list):
+            return self.add_list([self.add(item) for item in value])
+        cache_key = (type(value), value)
+        node_id = self.scalar_nodes.get(cache_key)
+        if node_id is None:
+            if len(self.scalar_nodes) >= ZWB_SCALAR_CACHE_SIZE:
+                self.scalar_nodes.clear()
+            node_id = self.scalar_nodes[cache_key] = self._add_scalar(value)
+        return node_id
+
+    def _add_scalar(self, value) -> int:
+        if isinstance(value, str):
+            return self._node(ZWB_NODE, ZWB_STR, 0, self.string_id(value))
+        if isinstance(value, bool):
+            return self._node(ZWB_NODE, ZWB_STR, 0, self.string_id(str(value)))
+        if isinstance(value, int):
+            if -(1 << 63) <= value < (1 << 63):
+                return self._node(ZWB_NODE_INT, ZWB_INT, 0, value)
+            return self._node(ZWB_NODE, ZWB_STR, 0, self.string_id(str(value)))
+        if isinstance(value, float):
+            return self._node(ZWB_NODE_FLOAT, ZWB_FLOAT, 0, value)
+        if isinstance(value, tuple):
+            offset = len(self.floats)
+            self.floats.extend(float(v) for v in value)
+            return self._node(ZWB_NODE, ZWB_VEC, len(value), offset)
+        raise TypeError(f"cannot store {type(value).__name__} in a .zwb file")
+
+    def add_dict(self, children) -> int:
+        start = self._reserve_entries(len(children))
+        for i, (key, node_id) in enumerate(children):
+            self._set_entry(start + i, self.string_id(key), node_id)
+        return self._node(ZWB_NODE, ZWB_DICT, len(children), start)
+
+    def add_list(self, node_ids) -> int:
+        start = self._reserve_entries(len(node_ids))
+        for i, node_id in enumerate(node_ids):
+            self._set_entry(start + i, ZWB_NO_KEY, node_id)
+        return self._node(ZWB_NODE, ZWB_LIST, len(node_ids), start)
+
+    def write(self, f, root: int):
+        def pad(pos):
+            return (-pos) % 8
+
+        offsets = []
+        pos = ZWB_HEADER.size
+        sections = [
+            array("Q", self.string_ends).tobytes(),
+            bytes(self.string_data),
+            bytes(self.nodes),
+            bytes(self.entries),
+            self.floats.tobytes(),
+        ]
+        if sys.byteorder != "little":
+            raise RuntimeError(".zwb files are little-endian; big-endian hosts are not supported")
+        for section in sections:
+            pos += pad(pos)
+            offsets.append(pos)
+            pos += len(section)
+
+        f.write(ZWB_HEADER.pack(
+            ZWB_MAGIC, ZWB_VERSION, 0,
+            len(self.strings), offsets[0], offsets[1],
+            self.node_count, offsets[2],
+            len(self.entries) // ZWB_ENTRY.size, offsets[3],
+            len(self.floats), offsets[4],
+            root, 0,
+        ))
+        written = ZWB_HEADER.size
+        for offset, section in zip(offsets, sections):
+            f.write(bytes(offset - written))
+            f.write(section)
+            written = offset + len(section)
+
+
+def _write_blocks(blocks: Iterable[ZWBlock]):
+    """Packs blocks into a _ZWBWriter one at a time; returns (writer, root node id)."""
+    writer = _ZWBWriter()
+    top_level = {}  # key -> [node ids], in first-seen order
+    for block in blocks:
+        top_level.setdefault(block.key, []).append(writer.add(block.value))
+
+    root = writer.add_dict([
+        (key, ids[0] if len(ids) == 1 else writer.add_list(ids))
+        for key, ids in top_level.items()
+    ])
+    return writer, root
+
+
+def compile_zwb(src_path: Union[str, Path], dst_path: Optional[Union[str, Path]] = None,
+                typed=True) -> Path:
+    """Compiles a (multi-document) .zw file into a .zwb file next to it.
+
+    Blocks are streamed one at a time; repeated top-level keys become lists,
+    as in iter_zw_documents. With typed=True, schema fields are stored as
+    native numbers and float vectors.
+    """
+    src_path = Path(src_path)
+    dst_path = Path(dst_path) if dst_path else src_path.with_suffix(".zwb")
+    with open(src_path, "rb") as f:
+        writer, root = _write_blocks(iter_zw_blocks(f, typed=typed))
+
+    fd, tmp_name = tempfile.mkstemp(dir=dst_path.parent or ".", suffix=".zwb.tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            writer.write(f, root)
+        os.replace(tmp_name, dst_path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return dst_path
+
+
+class ZWBFile:
+    """A memory-mapped .zwb file. Worker processes that open the same file share its pages.
+
+    Pass `buffer` to read a .zwb image that is already in memory (see parse_zw_compact).
+    """
+
+    def __init__(self, path: Union[str, Path], vectors: str = "tuple", buffer=None):
+        self.path = Path(path)
+        self.vectors = vectors
+        if buffer is None:
+            with open(self.path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._mmap = buffer
+        self._view = memoryview(self._mmap)
+
+        (magic, version, _flags, self.string_count, str_index_off, self._str_data_off,
+         self.node_count, self._nodes_off, self.entry_count, self._entries_off,
+         self.float_count, self._floats_off, self.root_id, _) = ZWB_HEADER.unpack_from(self._view, 0)
+        if magic != ZWB_MAGIC or version != ZWB_VERSION:
+            self.close()
+            raise ValueError(f"'{path}' is not a version {ZWB_VERSION} .zwb file")
+
+        self._string_ends = self._view[str_index_off:str_index_off + 8 * (self.string_count + 1)].cast("Q")
+        self._floats = self._view[self._floats_off:self._floats_off + 8 * self.float_count].cast("d")
+        self._key_cache = {}
+
+    def close(self):
+        # Drop the derived views first, or mmap.close() refuses with live exports
+        for name in ("_string_ends", "_floats", "_view"):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def root(self) -> "ZWBMapping":
+        return self.node(self.root_id)
+
+    def string(self, sid: int) -> str:
+        start = self._str_data_off + self._string_ends[sid]
+        end = self._str_data_off + self._string_ends[sid + 1]
+        return str(self._view[start:end], "utf-8")
+
+    def key(self, sid: int) -> str:
+        key = self._key_cache.get(sid)
+        if key is None:
+            key = self._key_cache[sid] = sys.intern(self.string(sid))
+        return key
+
+    def entries(self, start: int, count: int):
+        return ZWB_ENTRY.iter_unpack(
+            self._view[self._entries_off + start * ZWB_ENTRY.size:
+                       self._entries_off + (start + count) * ZWB_ENTRY.size])
+
+    def node(self, node_id: int):
+        offset = self._nodes_off + node_id * ZWB_NODE.size
+        kind, a, b = ZWB_NODE.unpack_from(self._view, offset)
+        if kind == ZWB_DICT:
+            return ZWBMapping(self, a, b)
+        if kind == ZWB_LIST:
+            return ZWBList(self, a, b)
+        if kind == ZWB_STR:
+            return self.string(b)
+        if kind == ZWB_INT:
+            return ZWB_NODE_INT.unpack_from(self._view, offset)[2]
+        if kind == ZWB_FLOAT:
+            return ZWB_NODE_FLOAT.unpack_from(self._view, offset)[2]
+        if kind == ZWB_VEC:
+            if self.vectors == "numpy":
+                import numpy as np
+                # Copied out: a live view onto the map would make close() raise BufferError
+                return np.frombuffer(self._mmap, dtype="<f8", count=a, offset=self._floats_off + 8 * b).copy()
+            return tuple(self._floats[b:b + a])
+        raise ValueError(f"corrupt .zwb node {node_id} (kind {kind})")
+
+
+class ZWBMapping(Mapping):
+    """Read-only, lazily decoded view of a dict node in a .zwb file."""
+
+    __slots__ = ("_file", "_count", "_start", "_index")
+
+    def __init__(self, zwb_file: ZWBFile, count: int, start: int):
+        self._file = zwb_file
+        self._count = count
+        self._start = start
+        self._index = None  # key -> node id, built on first lookup
+
+    def _items(self):
+        for key_id, node_id in self._file.entries(self._start, self._count):
+            yield self._file.key(key_id), node_id
+
+    def __getitem__(self, key):
+        if self._index is None:
+            self._index = {}
+            for k, node_id in self._items():
+                self._index[k] = node_id
+        return self._file.node(self._index[key])
+
+    def __iter__(self):
+        for key, _ in self._items():
+            yield key
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def zwb_file(self) -> ZWBFile:
+        return self._file
+
+    def to_dict(self) -> dict:
+        """Fully decodes this subtree into plain dicts/lists."""
+        return {key: _zwb_materialize(self._file.node(node_id)) for key, node_id in self._items()}
+
+    def __repr__(self):
+        return f"<ZWBMapping {self._count} keys of {self._file.path.name}>"
+
+
+class ZWBList(Sequence):
+    """Read-only, lazily decoded view of a list node (repeated top-level blocks)."""
+
+    __slots__ = ("_file", "_count", "_start")
+
+    def __init__(self, zwb_file: ZWBFile, count: int, start: int):
+        self._file = zwb_file
+        self._count = count
+        self._start = start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        (_, node_id), = self._file.entries(self._start + index, 1)
+        return self._file.node(node_id)
+
+    def __len__(self):
+        return self._count
+
+    def __eq__(self, other):
+        if isinstance(other, (list, ZWBList)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"<ZWBList {self._count} items of {self._file.path.name}>"
+
+
+def _zwb_materialize(value):
+    if isinstance(value, ZWBMapping):
+        return value.to_dict()
+    if isinstance(value, ZWBList):
+        return [_zwb_materialize(item) for item in value]
+    return value
+
+
+def open_zwb(path: Union[str, Path], vectors: str = "tuple") -> ZWBMapping:
+    """Opens a .zwb file via mmap and returns its lazy read-only root mapping.
+
+    The mapping keeps the file open; call `.close()` on `mapping.zwb_file` (or
+    let it be garbage collected) when done. vectors="numpy" returns float
+    vectors as NumPy arrays (copies, so they outlive the file).
+    """
+    return ZWBFile(path, vectors).root()
+
+
+# --- Structural hashing ---
+HASH_DIGEST_SIZE = 16
+_WS_RE = re.compile(r"\s+")
+_NUMBER_STARTS = frozenset("0123456789+-.")
+
+
+class ZWHash(NamedTuple):
+    """Merkle digest of one node. children mirrors the node: a dict of key -> ZWHash
+    for blocks, a list of ZWHash for lists, None for scalars."""
+    digest: bytes
+    children: Union[None, Dict[str, "ZWHash"], list]
+
+    @property
+    def hexdigest(self) -> str:
+        return self.digest.hex()
+
+
+def _canonical_scalar(value) -> bytes:
+    """Scalars hash by meaning, not layout: `(0,0,1)` == `( 0, 0, 1 )`, trailing `//` comments
+    and quotes are dropped, and typed numbers/vectors hash like their text."""
+    if hasattr(value, "tolist"):  # numpy vectors from typed mode
+        value = value.tolist()
+    if isinstance(value, str):
+        text = clean_literal(value)
+        first = text[:1]
+        # Only try the decoders that can match; failed int()/float() calls are not cheap
+        if first in _NUMBER_STARTS:
+            decoded = parse_number(text)
+        elif first in ("(", "["):
+            decoded = parse_vector(text)
+        else:
+            decoded = None
+        if decoded is None:
+            return b"s" + _WS_RE.sub(" ", text).encode("utf-8", "surrogatepass")
+        value = decoded
+    # Numbers compare as floats, so "1", "1.0" and a typed 1.0 are the same value
+    if isinstance(value, (tuple, list)):
+        return b"v" + ",".join(repr(float(v)) for v in value).encode("ascii")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return b"n" + repr(float(value)).encode("ascii")
+    if value is None:
+        return b"s"
+    return b"s" + str(value).encode("utf-8", "surrogatepass")
+
+
+def _scalar_digest(value) -> ZWHash:
+    return ZWHash(hashlib.blake2b(_canonical_scalar(value), digest_size=HASH_DIGEST_SIZE).digest(), None)
+
+
+# Scene files repeat the same few values (colors, unit vectors, flags) over and over
+_text_digest = lru_cache(maxsize=1 << 16)(_scalar_digest)
+
+
+def zw_hash_tree(node) -> ZWHash:
+    """Hashes a parsed tree bottom-up so every subtree carries its own digest.
+
+    Blocks are key-order-insensitive, lists keep their order. Works on parse_zw
+    output (plain or typed), iter_zw_documents output and open_zwb mappings.
+    """
+    if type(node) is str:
+        return _text_digest(node)
+    if isinstance(node, Mapping):
+        children = {str(key): zw_hash_tree(value) for key, value in node.items()}
+        h = hashlib.blake2b(b"D", digest_size=HASH_DIGEST_SIZE)
+        for key in sorted(children):
+            h.update(key.encode("utf-8", "surrogatepass") + b"\0" + children[key].digest)
+        return ZWHash(h.digest(), children)
+    if isinstance(node, (list, tuple, ZWBList)) and not (node and _is_vector(node)):
+        children = [zw_hash_tree(item) for item in node]
+        h = hashlib.blake2b(b"L", digest_size=HASH_DIGEST_SIZE)
+        for child in children:
+            h.update(child.digest)
+        return ZWHash(h.digest(), children)
+    return _scalar_digest(node)
+
+
+def _is_vector(values) -> bool:
+    return all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values)
+
+
+def zw_hash(node) -> str:
+    """Hex digest of a whole tree (or any subtree); stable across runs and processes."""
+    return zw_hash_tree(node).hexdigest
+
+
+def zw_changed_paths(old: ZWHash, new: ZWHash, path: tuple = ()) -> Iterator[tuple]:
+    """Yields the key paths of the outermost nodes that differ between two hash trees.
+
+    Equal digests prune whole subtrees, so the walk costs O(changed nodes), not O(tree).
+    A path whose node exists on only one side marks an addition or a removal.
+    """
+    if old.digest == new.digest:
+        return
+    if isinstance(old.children, dict) and isinstance(new.children, dict):
+        for key, child in old.children.items():
+            other = new.children.get(key)
+            if other is None:
+                yield path + (key,)
+            else:
+                yield from zw_changed_paths(child, other, path + (key,))
+        for key in new.children.keys() - old.children.keys():
+            yield path + (key,)
+    elif isinstance(old.children, list) and isinstance(new.children, list):
+        for index in range(max(len(old.children), len(new.children))):
+            if index >= len(old.children) or index >= len(new.children):
+                yield path + (index,)
+            else:
+                yield from zw_changed_paths(old.children[index], new.children[index], path + (index,))
+    else:
+        yield path
+
+
+# --- Diff / patch ---
+# A patch is a list of plain dicts, so it can go over the wire as JSON:
+#   {"op": "add" | "remove" | "replace", "block": "ZW-OBJECT", "name": "Orb",
+#    "path": ["MATERIAL", "BASE_COLOR"], "value": "#FF0000"}
+# "block" + "name" pick a top-level block (name is None for blocks without NAME);
+# "index" is added when several blocks share the same type and name.
+# An empty path means the whole block.
+ZW_PATCH_ADD = "add"
+ZW_PATCH_REMOVE = "remove"
+ZW_PATCH_REPLACE = "replace"
+
+
+class ZWSnapshot:
+    """Top-level blocks of one version of a scene, with their hash trees.
+
+    Pass a snapshot as `old` to diff_zw to avoid re-hashing the previous round.
+    """
+
+    def __init__(self, source):
+        self.blocks = {}  # (block type, name, index) -> (value, ZWHash), in document order
+        seen = defaultdict(int)
+        for key, value in _top_level_items(source):
+            name = _block_name(value)
+            index = seen[(key, name)]
+            seen[(key, name)] += 1
+            self.blocks[(key, name, index)] = (value, zw_hash_tree(value))
+
+    @property
+    def digest(self) -> str:
+        return zw_hash([{key: value} for (key, _, _), (value, _) in self.blocks.items()])
+
+
+def _top_level_items(source) -> Iterator[tuple]:
+    if isinstance(source, (str, bytes)) or hasattr(source, "read"):
+        for block in iter_zw_blocks(source):
+            yield block.key, block.value
+        return
+    documents = source if isinstance(source, list) else [source]
+    for document in documents:
+        for key, value in document.items():
+            # iter_zw_documents keeps repeated blocks as lists
+            if isinstance(value, list) and all(isinstance(item, dict) for item in value):
+                for item in value:
+                    yield key, item
+            else:
+                yield key, value
+
+
+def _block_name(value) -> Optional[str]:
+    if isinstance(value, Mapping) and isinstance(value.get("NAME"), str):
+        return clean_literal(value["NAME"]) or None
+    return None
+
+
+def _patch_op(op: str, address: tuple, path: list, value=None) -> dict:
+    block, name, index = address
+    entry = {"op": op, "block": block, "name": name, "path": path}
+    if index:
+        entry["index"] = index
+    if op != ZW_PATCH_REMOVE:
+        entry["value"] = value
+    return entry
+
+
+def _diff_node(address: tuple, path: list, old, new, old_hash: ZWHash, new_hash: ZWHash, ops: list):
+    if old_hash.digest == new_hash.digest:
+        return
+    if isinstance(old_hash.children, dict) and isinstance(new_hash.children, dict):
+        for key in old_hash.children:
+            if key not in new_hash.children:
+                ops.append(_patch_op(ZW_PATCH_REMOVE, address, path + [key]))
+        for key, child_hash in new_hash.children.items():
+            if key not in old_hash.children:
+                ops.append(_patch_op(ZW_PATCH_ADD, address, path + [key], new[key]))
+            else:
+                _diff_node(address, path + [key], old[key], new[key], old_hash.children[key], child_hash, ops)
+    elif (isinstance(old_hash.children, list) and isinstance(new_hash.children, list)
+          and len(old_hash.children) == len(new_hash.children)):
+        for index, (old_child, new_child) in enumerate(zip(old_hash.children, new_hash.children)):
+            _diff_node(address, path + [index], old[index], new[index], old_child, new_child, ops)
+    else:
+        ops.append(_patch_op(ZW_PATCH_REPLACE, address, path, new))
+
+
+def diff_zw(old, new) -> list:
+    """Returns the add/remove/replace operations that turn `old` into `new`.
+
+    Both sides may be ZW text, a parsed tree (parse_zw or iter_zw_documents output,
+    or a list of documents) or a ZWSnapshot. Blocks are matched by type + NAME, and
+    unchanged subtrees are skipped by digest, so the walk itself only visits changes.
+    Removals come first, then changes in the new document's order.
+    """
+    old = old if isinstance(old, ZWSnapshot) else ZWSnapshot(old)
+    new = new if isinstance(new, ZWSnapshot) else ZWSnapshot(new)
+    # Removed blocks go last-first so the index of a repeated type + NAME stays valid while applying
+    ops = [_patch_op(ZW_PATCH_REMOVE, address, []) for address in reversed(old.blocks) if address not in new.blocks]
+    for address, (value, value_hash) in new.blocks.items():
+        previous = old.blocks.get(address)
+        if previous is None:
+            ops.append(_patch_op(ZW_PATCH_ADD, address, [], value))
+        else:
+            _diff_node(address, [], previous[0], value, previous[1], value_hash, ops)
+    return ops
+
+
+def _find_block(tree: dict, op: dict):
+    """Returns (container, slot) holding the block the op points at, or None."""
+    if op["block"] not in tree:
+        return None
+    value = tree[op["block"]]
+    if isinstance(value, list) and all(isinstance(item, dict) for item in value):
+        slots = [(value, index) for index in range(len(value))]
+    else:
+        slots = [(tree, op["block"])]
+    matches = [(container, slot) for container, slot in slots if _block_name(container[slot]) == op["name"]]
+    wanted = op.get("index", 0)
+    return matches[wanted] if wanted < len(matches) else None
+
+
+def apply_zw_patch(tree, patch: list) -> dict:
+    """Applies a diff_zw patch and returns the patched tree; the input is not modified.
+
+    `tree` is ZW text or a parsed tree; repeated blocks come back as lists, like
+    iter_zw_documents. Raises KeyError when an op points at something that is not there.
+    """
+    if isinstance(tree, (str, bytes)) or hasattr(tree, "read"):
+        merged = {}
+        for key, value in _top_level_items(tree):
+            if key in merged:
+                if not isinstance(merged[key], list):
+                    merged[key] = [merged[key]]
+                merged[key].append(value)
+            else:
+                merged[key] = value
+        tree = merged
+    else:
+        tree = pickle.loads(pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL))
+
+    for op in patch:
+        path = op["path"]
+        if op["op"] == ZW_PATCH_ADD and not path:
+            if op["block"] not in tree:
+                tree[op["block"]] = op["value"]
+            elif isinstance(tree[op["block"]], list):
+                tree[op["block"]].append(op["value"])
+            else:
+                tree[op["block"]] = [tree[op["block"]], op["value"]]
+            continue
+
+        found = _find_block(tree, op)
+        if found is None:
+            raise KeyError(f"No {op['block']} block named {op['name']!r} to {op['op']}")
+        container, slot = found
+        if not path:
+            if op["op"] == ZW_PATCH_REPLACE:
+                container[slot] = op["value"]
+            elif container is tree:
+                del tree[slot]
+            else:
+                del container[slot]
+                if len(container) == 1:
+                    tree[op["block"]] = container[0]
+            continue
+
+        parent = container[slot]
+        for step in path[:-1]:
+            parent = parent[step]
+        if op["op"] == ZW_PATCH_REMOVE:
+            del parent[path[-1]]
+        else:
+            parent[path[-1]] = op["value"]
+    return tree
+
+
+# --- Compact in-memory trees ---
+def parse_zw_compact(source, typed=False, vectors: str = "tuple") -> ZWBMapping:
+    """Parses ZW text into a compact read-only tree instead of nested dicts.
+
+    The tree is a .zwb image held in memory: one shared string table, packed
+    node/entry arrays and a float array, read through __slots__ views with
+    interned keys. It takes roughly a tenth of the memory of parse_zw output.
+    The root is a Mapping, so `.get`/`[]`/iteration work as on a dict; repeated
+    top-level keys become lists, as in iter_zw_documents. Call `.to_dict()`
+    to get plain dicts back.
+    """
+    writer, root = _write_blocks(iter_zw_blocks(source, typed=typed))
+    image = io.BytesIO()
+    writer.write(image, root)
+    del writer
+    return ZWBFile("<memory>", vectors, buffer=image.getvalue()).root()
+
+
+# --- Serialization ---
+WRITE_BUFFER_SIZE = 64 * 1024
+
+
+def _iter_zw_lines(d: dict, current_indent_level: int) -> Iterator[str]:
+    prefix = " " * current_indent_level
+    for key, value in d.items():
         if isinstance(value, dict):
-            lines.append(line_prefix + f"{key}:")
-            lines.append(to_zw(value, current_indent_level + 2))
+            yield f"{prefix}{key}:"
+            if value:
+                yield from _iter_zw_lines(value, current_indent_level + 2)
+            else:
+                yield ""  # to_zw has always written an empty block as a blank line
+        elif isinstance(value, list):
+            yield f"{prefix}{key}:"
+            yield from _iter_zw_list_lines(value, current_indent_level + 2)
         elif value is None:
-             lines.append(line_prefix + f"{key}:")
+            yield f"{prefix}{key}:"
+        else:
+            yield f"{prefix}{key}: {value}"
+
+
+def _iter_zw_list_lines(items: list, current_indent_level: int) -> Iterator[str]:
+    """Writes list items with the `- ` syntax the prompts use, e.g. ZW-STAGE TRACKS."""
+    prefix = " " * current_indent_level
+    for item in items:
+        if isinstance(item, dict) and item:
+            # The item's first key goes on the `- ` line, the rest line up under it
+            lines = _iter_zw_lines(item, current_indent_level + 2)
+            yield f"{prefix}- {next(lines)[current_indent_level + 2:]}"
+            yield from lines
+        elif isinstance(item, list):
+            yield f"{prefix}-"
+            yield from _iter_zw_list_lines(item, current_indent_level + 2)
+        elif isinstance(item, dict) or item is None:
+            yield f"{prefix}-"
         else:
-            lines.append(line_prefix + f"{key}: {value}")
-    return "\n".join(lines)
+            yield f"{prefix}- {item}"
+
+
+def iterencode(d: dict, current_indent_level: int = 0) -> Iterator[str]:
+    """Yields the ZW text for d incrementally, one newline-terminated line at a time."""
+    for line in _iter_zw_lines(d, current_indent_level):
+        yield line + "\n"
+
+
+def dump_zw(d: dict, fp, current_indent_level: int = 0) -> None:
+    """Writes d as ZW text to a text file object without building the whole string."""
+    buffer = []
+    size = 0
+    for chunk in iterencode(d, current_indent_level):
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= WRITE_BUFFER_SIZE:
+            fp.write("".join(buffer))
+            buffer.clear()
+            size = 0
+    if buffer:
+        fp.write("".join(buffer))
+
+
+def to_zw(d: dict, current_indent_level: int = 0) -> str: # Renamed for clarity
+    """Converts a nested dictionary back to ZW-formatted text."""
+    return "\n".join(_iter_zw_lines(d, current_indent_level))
 
 def validate_zw(zw_text: str) -> bool:
-    """Checks if ZW formatting appears structurally valid by attempting to parse it."""
+    """Checks ZW text against the block schema in zw_schema in one streaming pass.
+
+    Stops at the first error; use zw_schema.check_zw to get the errors with line numbers.
+    """
+    try:
+        from zw_schema import check_zw
+    except ImportError:
+        from zw_mcp.zw_schema import check_zw
     try:
-        parsed = parse_zw(zw_text)
-        return isinstance(parsed, dict) and bool(parsed)
+        return not check_zw(zw_text, max_errors=1)
     except Exception:
         return False
 
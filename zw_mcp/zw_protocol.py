@@ -0,0 +1,234 @@
+# zw_mcp/zw_protocol.py
+"""Framed TCP protocol for the ZW MCP daemon, next to the legacy `///` one.
+
+Every frame is a fixed 13-byte header followed by a payload:
+
+    magic   3 bytes  b"\\xffZW" (0xFF never starts UTF-8 text, so the daemon
+                     can tell framed clients from legacy ones by the first byte)
+    version 1 byte   PROTOCOL_VERSION
+    type    1 byte   FRAME_REQUEST, FRAME_CHUNK, FRAME_DONE, FRAME_ERROR, FRAME_CANCEL
+    id      4 bytes  request id chosen by the client, echoed on every reply
+    length  4 bytes  payload length
+
+all big-endian. Requests carry a JSON object: {"prompt": ..., plus optional
+"model", "options", "cache", "priority", "stream", "deadline", "client"}.
+Replies for a request are CHUNK frames (UTF-8 text, only when "stream" is
+true) and then either DONE (JSON; includes "response" when not streaming) or
+ERROR (JSON with "error"; a request the daemon refused under load also has
+"status" 429 or 503 and "retry_after" in seconds).
+A client may send many requests on one connection without waiting; replies
+come back tagged with their id, in whatever order they finish. CANCEL (empty
+payload) drops a request the client no longer wants.
+"""
+import asyncio
+import itertools
+import json
+import socket
+import struct
+from typing import Callable, Dict, NamedTuple, Optional, Union
+
+FRAME_MAGIC = b"\xffZW"
+PROTOCOL_VERSION = 1
+FRAME_HEADER = struct.Struct("!3sBBII")
+MAX_FRAME_BYTES = 8 * 1024 * 1024
+
+FRAME_REQUEST = 1
+FRAME_CHUNK = 2
+FRAME_DONE = 3
+FRAME_ERROR = 4
+FRAME_CANCEL = 5
+FRAME_TYPES = {FRAME_REQUEST, FRAME_CHUNK, FRAME_DONE, FRAME_ERROR, FRAME_CANCEL}
+
+
+class ProtocolError(Exception):
+    """The byte stream is not valid framed protocol; the connection cannot continue."""
+
+
+class RemoteError(RuntimeError):
+    """An ERROR frame from the daemon."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, status: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+
+
+class Frame(NamedTuple):
+    type: int
+    request_id: int
+    payload: bytes
+
+    def json(self) -> dict:
+        data = json.loads(self.payload.decode("utf-8")) if self.payload else {}
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        return data
+
+    def text(self) -> str:
+        return self.payload.decode("utf-8")
+
+
+def encode_frame(frame_type: int, request_id: int, payload: Union[bytes, str, dict] = b"") -> bytes:
+    if isinstance(payload, dict):
+        payload = json.dumps(payload).encode("utf-8")
+    elif isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return FRAME_HEADER.pack(FRAME_MAGIC, PROTOCOL_VERSION, frame_type, request_id, len(payload)) + payload
+
+
+def decode_header(header: bytes, max_bytes: int = MAX_FRAME_BYTES):
+    """Returns (frame type, request id, payload length), or raises ProtocolError."""
+    magic, version, frame_type, request_id, length = FRAME_HEADER.unpack(header)
+    if magic != FRAME_MAGIC:
+        raise ProtocolError("bad frame magic")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"unsupported protocol version {version}; this daemon speaks {PROTOCOL_VERSION}")
+    if frame_type not in FRAME_TYPES:
+        raise ProtocolError(f"unknown frame type {frame_type}")
+    if length > max_bytes:
+        raise ProtocolError(f"frame larger than {max_bytes} bytes")
+    return frame_type, request_id, length
+
+
+async def read_frame(reader, prefix: bytes = b"", max_bytes: int = MAX_FRAME_BYTES) -> Optional[Frame]:
+    """Reads one frame from an asyncio StreamReader; None on a clean end of stream.
+
+    `prefix` is header bytes the caller already consumed (the daemon reads one
+    byte to pick the protocol).
+    """
+    try:
+        header = prefix + await reader.readexactly(FRAME_HEADER.size - len(prefix))
+    except asyncio.IncompleteReadError as e:
+        if e.partial or prefix:
+            raise ProtocolError("connection closed in the middle of a frame header")
+        return None
+    frame_type, request_id, length = decode_header(header, max_bytes)
+    try:
+        payload = await reader.readexactly(length) if length else b""
+    except asyncio.IncompleteReadError:
+        raise ProtocolError("connection closed in the middle of a frame")
+    return Frame(frame_type, request_id, payload)
+
+
+def recv_frame(rfile, max_bytes: int = MAX_FRAME_BYTES) -> Optional[Frame]:
+    """Blocking read of one frame from a binary file object (e.g. socket.makefile("rb"))."""
+    header = rfile.read(FRAME_HEADER.size)
+    if not header:
+        return None
+    if len(header) < FRAME_HEADER.size:
+        raise ProtocolError("connection closed in the middle of a frame header")
+    frame_type, request_id, length = decode_header(header, max_bytes)
+    payload = rfile.read(length) if length else b""
+    if len(payload) < length:
+        raise ProtocolError("connection closed in the middle of a frame")
+    return Frame(frame_type, request_id, payload)
+
+
+class _Pending:
+    __slots__ = ("pieces", "delivered", "result", "error", "done")
+
+    def __init__(self):
+        self.pieces = []
+        self.delivered = 0  # pieces already handed to on_token
+        self.result = None
+        self.error = None
+        self.done = False
+
+
+class ZWClient:
+    """Blocking client that keeps one connection open and can pipeline requests.
+
+        with ZWClient("127.0.0.1", 7421) as client:
+            ids = [client.submit(p) for p in prompts]   # all in flight at once
+            answers = [client.result(i) for i in ids]   # replies may arrive in any order
+
+    Not thread-safe; use one client per thread.
+    """
+
+    def __init__(self, host: str, port: int, timeout: Optional[float] = None):
+        self.address = (host, port)
+        self.sock = socket.create_connection(self.address, timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._rfile = self.sock.makefile("rb")
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, _Pending] = {}
+
+    def submit(self, prompt: str, stream: bool = False, **fields) -> int:
+        """Sends one request without waiting; returns its id.
+
+        fields: model, options, cache, priority, deadline, client.
+        """
+        request_id = self._next_id()
+        body = {"prompt": prompt, "stream": stream}
+        body.update((key, value) for key, value in fields.items() if value is not None)
+        self._pending[request_id] = _Pending()
+        self.sock.sendall(encode_frame(FRAME_REQUEST, request_id, body))
+        return request_id
+
+    def _next_id(self) -> int:
+        while True:
+            request_id = next(self._ids) & 0xFFFFFFFF
+            # 0 is reserved for connection-level errors; after a wrap, skip ids still in flight
+            if request_id and request_id not in self._pending:
+                return request_id
+
+    def cancel(self, request_id: int):
+        if self._pending.pop(request_id, None) is not None:
+            self.sock.sendall(encode_frame(FRAME_CANCEL, request_id))
+
+    def result(self, request_id: int, on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Waits for one request to finish and returns its text; raises RemoteError on an ERROR reply.
+
+        Replies for other requests that arrive meanwhile are kept for their own result() call.
+        """
+        pending = self._pending[request_id]
+        while True:
+            if on_token:
+                while pending.delivered < len(pending.pieces):
+                    on_token(pending.pieces[pending.delivered])
+                    pending.delivered += 1
+            if pending.done:
+                del self._pending[request_id]
+                if pending.error is not None:
+                    raise pending.error
+                return pending.result
+            self._receive_one()
+
+    def request(self, prompt: str, on_token: Optional[Callable[[str], None]] = None, **fields) -> str:
+        """submit() + result(); streams when on_token is given."""
+        return self.result(self.submit(prompt, stream=on_token is not None, **fields), on_token)
+
+    def _receive_one(self):
+        frame = recv_frame(self._rfile)
+        if frame is None:
+            raise ConnectionError("daemon closed the connection")
+        if frame.type == FRAME_ERROR and frame.request_id == 0:
+            # Not tied to any request: the whole connection failed
+            data = frame.json()
+            raise RemoteError(data.get("error", "protocol error"), data.get("retry_after"), data.get("status"))
+        pending = self._pending.get(frame.request_id)
+        if pending is None:
+            return  # a late reply (even an ERROR) to something we cancelled
+        if frame.type == FRAME_CHUNK:
+            pending.pieces.append(frame.text())
+        elif frame.type == FRAME_DONE:
+            data = frame.json()
+            pending.result = data["response"] if "response" in data else "".join(pending.pieces)
+            pending.done = True
+        elif frame.type == FRAME_ERROR:
+            data = frame.json()
+            pending.error = RemoteError(data.get("error", "request failed"), data.get("retry_after"),
+                                        data.get("status"))
+            pending.done = True
+
+    def close(self):
+        try:
+            self._rfile.close()
+        finally:
+            self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
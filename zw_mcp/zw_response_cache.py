@@ -0,0 +1,173 @@
+# zw_mcp/zw_response_cache.py
+"""Exact-match cache for Ollama responses.
+
+Entries are keyed by a hash of (normalized prompt, model, generation options),
+so an agent hub re-sending the same prompt gets the earlier answer instead of
+another few seconds of GPU time. The in-memory tier is an LRU with a TTL; an
+optional SQLite file keeps entries across daemon restarts, capped at
+ZW_MCP_CACHE_DB_SIZE rows (expired and then oldest rows go first).
+
+Normalizing only evens out line endings, trailing whitespace and surrounding
+blank lines. Indentation is meaningful in ZW, so it is left alone.
+
+Whether a request is cached: an explicit per-request flag wins; otherwise only
+requests that pin a `seed` (or `temperature: 0`) are, since their answer is
+reproducible. A sampled answer is one draw of many and is not handed out again
+unless the request asks for it. ZW_MCP_CACHE=0 turns the cache off altogether.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union
+
+CACHE_ENABLED = os.getenv("ZW_MCP_CACHE", "1").lower() not in ("0", "false", "no", "off")  # kill switch
+CACHE_MAX_ENTRIES = int(os.getenv("ZW_MCP_CACHE_SIZE", "1024"))
+CACHE_MAX_DB_ENTRIES = int(os.getenv("ZW_MCP_CACHE_DB_SIZE", "100000"))
+CACHE_DB_PRUNE_TO = 0.9  # pruning the SQLite tier leaves it this full, so it is not pruned on every insert
+CACHE_TTL_SECONDS = float(os.getenv("ZW_MCP_CACHE_TTL", "3600"))
+CACHE_PATH = os.getenv("ZW_MCP_CACHE_PATH", "")  # e.g. zw_mcp/cache/responses.sqlite; empty = memory only
+CACHE_MAX_ENTRY_CHARS = 1 << 20
+
+
+def normalize_prompt(prompt: str) -> str:
+    lines = [line.rstrip() for line in prompt.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    return "\n".join(lines).strip("\n")
+
+
+def cache_key(prompt: str, model: Optional[str] = None, options: Optional[dict] = None) -> str:
+    material = json.dumps([normalize_prompt(prompt), model or "", options or {}], sort_keys=True)
+    return hashlib.blake2b(material.encode("utf-8"), digest_size=20).hexdigest()
+
+
+def is_deterministic(options: Optional[dict]) -> bool:
+    if not options:
+        return False
+    return options.get("seed") is not None or options.get("temperature") == 0
+
+
+def should_cache(options: Optional[dict] = None, requested: Optional[bool] = None,
+                 default: bool = False) -> bool:
+    if requested is not None:
+        return bool(requested)
+    return default or is_deterministic(options)
+
+
+class ResponseCache:
+    """Thread-safe LRU+TTL cache of response text, optionally backed by SQLite."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS,
+                 path: Optional[Union[str, Path]] = None, max_db_entries: int = CACHE_MAX_DB_ENTRIES):
+        self.max_entries = max_entries
+        self.max_db_entries = max_db_entries
+        self.ttl = ttl
+        self.path = Path(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._entries = OrderedDict()  # key -> (expires_at, text)
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_rows = 0  # upper bound on the rows in the SQLite tier; exact after each prune
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            with self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, expires REAL)")
+                self._db.execute("CREATE INDEX IF NOT EXISTS responses_by_expiry ON responses (expires)")
+            self._prune_db()
+
+    @property
+    def persistent(self) -> bool:
+        return self._db is not None
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] >= now:
+                    self._entries.move_to_end(key)
+                    return self._hit(entry[1])
+                del self._entries[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT response, expires FROM responses WHERE key = ?", (key,)).fetchone()
+                if row and row[1] >= now:
+                    self._remember(key, row[1], row[0])
+                    return self._hit(row[0])
+                if row:
+                    with self._db:
+                        self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.misses += 1
+            return None
+
+    def put(self, key: str, text: str):
+        if len(text) > CACHE_MAX_ENTRY_CHARS:
+            return
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires, text)
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, text, expires))
+                self._db_rows += 1  # may count a replaced row twice; the next prune recounts
+                if self._db_rows > self.max_db_entries:
+                    self._prune_db()
+
+    def _prune_db(self):
+        """Drops expired rows, then the oldest ones until the SQLite tier is back under its cap."""
+        with self._db:
+            self._db.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+            rows = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if rows > self.max_db_entries:
+                excess = rows - int(self.max_db_entries * CACHE_DB_PRUNE_TO)
+                self._db.execute("DELETE FROM responses WHERE key IN "
+                                 "(SELECT key FROM responses ORDER BY expires LIMIT ?)", (excess,))
+                rows -= excess
+        self._db_rows = rows
+
+    def _hit(self, text: str) -> str:
+        self.hits += 1
+        self.bytes_saved += len(text.encode("utf-8"))
+        return text
+
+    def _remember(self, key: str, expires: float, text: str):
+        self._entries[key] = (expires, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM responses")
+                self._db_rows = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "persistent": self.persistent,
+            "db_entries": self._db_rows if self.persistent else None,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def cache_from_env() -> ResponseCache:
+    return ResponseCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_PATH or None)
@@ -0,0 +1,196 @@
+# zw_mcp/zw_scheduler.py
+"""Priority scheduler for upstream (Ollama) calls.
+
+Every call takes a ticket with a priority class and a model. When a slot is
+free the scheduler grants the best waiting ticket:
+
+1. highest priority class first (interactive, then agent, then batch), with
+   waiting tickets moving up one class every PRIORITY_AGING_SECONDS so batch
+   work is never starved for good;
+2. within a class, tickets for a model that is already loaded (running now,
+   or the last one used), so Ollama swaps models less often;
+3. then arrival order.
+
+Each model has its own concurrency cap on top of the global one, and
+`reserved_interactive` slots are kept free for interactive work so a full batch
+queue cannot push interactive latency up. Queue times are kept per class for
+stats().
+"""
+import asyncio
+import itertools
+import os
+import time
+from collections import Counter, deque
+from typing import Dict, Optional
+
+PRIORITIES = ("interactive", "agent", "batch")
+DEFAULT_PRIORITY = "agent"
+PRIORITY_AGING_SECONDS = float(os.getenv("ZW_MCP_PRIORITY_AGING", "30"))
+RESERVED_INTERACTIVE = int(os.getenv("ZW_MCP_RESERVED_INTERACTIVE", "0"))
+WAIT_SAMPLES = 1000  # recent queue times kept per class for percentiles
+
+
+def parse_model_limits(spec: str) -> Dict[str, int]:
+    """Parses "llama3.2=1,mistral=2" into {"llama3.2": 1, "mistral": 2}."""
+    limits = {}
+    for item in spec.split(","):
+        name, sep, value = item.strip().rpartition("=")
+        if sep and name:
+            limits[name.strip()] = int(value)
+    return limits
+
+
+MODEL_LIMITS = parse_model_limits(os.getenv("ZW_MCP_MODEL_LIMITS", ""))
+
+
+def _percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Ticket:
+    """A place in the scheduler queue; `async with ticket:` waits for and holds a slot."""
+    __slots__ = ("scheduler", "model", "rank", "seq", "enqueued", "granted", "_future")
+
+    def __init__(self, scheduler: "UpstreamScheduler", model: str, priority: str):
+        self.scheduler = scheduler
+        self.model = model
+        self.rank = PRIORITIES.index(priority)
+        self.seq = 0
+        self.enqueued = 0.0
+        self.granted = False
+        self._future = None
+
+    @property
+    def priority(self) -> str:
+        return PRIORITIES[self.rank]
+
+    def promote(self, priority: str):
+        """Moves the ticket up to `priority` if that is more urgent (e.g. an interactive request joined it)."""
+        self.rank = min(self.rank, PRIORITIES.index(priority))
+        if not self.granted:
+            self.scheduler._dispatch()
+
+    async def acquire(self):
+        await self.scheduler._acquire(self)
+
+    def release(self):
+        self.scheduler._release(self)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class UpstreamScheduler:
+    def __init__(self, max_concurrent: int, model_limits: Optional[Dict[str, int]] = None,
+                 default_model_limit: Optional[int] = None, reserved_interactive: int = RESERVED_INTERACTIVE,
+                 aging: float = PRIORITY_AGING_SECONDS, clock=time.monotonic):
+        self.max_concurrent = max_concurrent
+        self.model_limits = MODEL_LIMITS if model_limits is None else model_limits
+        self.default_model_limit = default_model_limit or max_concurrent
+        self.reserved_interactive = min(reserved_interactive, max_concurrent - 1)
+        self.aging = aging
+        self.clock = clock
+        self.running = Counter()  # model -> calls running
+        self.total_running = 0
+        self.last_model = None
+        self.served = Counter()   # priority -> tickets granted
+        self.wait_times = {priority: deque(maxlen=WAIT_SAMPLES) for priority in PRIORITIES}
+        self._waiting = []        # tickets in arrival order; short, so a scan per grant is cheap
+        self._seq = itertools.count()
+
+    def ticket(self, model: str, priority: str = DEFAULT_PRIORITY) -> Ticket:
+        if priority not in PRIORITIES:
+            raise ValueError(f"unknown priority {priority!r}; expected one of {', '.join(PRIORITIES)}")
+        return Ticket(self, model, priority)
+
+    def limit_for(self, model: str) -> int:
+        return self.model_limits.get(model, self.default_model_limit)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    def queued_ahead(self, priority: str) -> int:
+        """Waiting tickets that a new `priority` ticket would not overtake."""
+        rank = PRIORITIES.index(priority)
+        return sum(1 for ticket in self._waiting if ticket.rank <= rank)
+
+    # --- Granting ---
+    async def _acquire(self, ticket: Ticket):
+        ticket.seq = next(self._seq)
+        ticket.enqueued = self.clock()
+        ticket._future = asyncio.get_running_loop().create_future()
+        self._waiting.append(ticket)
+        self._dispatch()
+        try:
+            await ticket._future
+        except asyncio.CancelledError:
+            if ticket.granted:
+                self._release(ticket)
+            else:
+                self._waiting.remove(ticket)
+            raise
+
+    def _release(self, ticket: Ticket):
+        if not ticket.granted:
+            return
+        ticket.granted = False
+        self.running[ticket.model] -= 1
+        self.total_running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._waiting and self.total_running < self.max_concurrent:
+            ticket = self._pick()
+            if ticket is None:
+                return
+            self._waiting.remove(ticket)
+            ticket.granted = True
+            self.running[ticket.model] += 1
+            self.total_running += 1
+            self.last_model = ticket.model
+            self.served[ticket.priority] += 1
+            self.wait_times[ticket.priority].append(self.clock() - ticket.enqueued)
+            ticket._future.set_result(None)
+
+    def _pick(self) -> Optional[Ticket]:
+        now = self.clock()
+        loaded = {model for model, count in self.running.items() if count > 0} or {self.last_model}
+        shared_slots_full = self.total_running >= self.max_concurrent - self.reserved_interactive
+        best, best_key = None, None
+        for ticket in self._waiting:
+            if self.running[ticket.model] >= self.limit_for(ticket.model):
+                continue
+            rank = ticket.rank
+            if self.aging > 0:
+                rank = max(0, rank - int((now - ticket.enqueued) / self.aging))
+            if rank > 0 and shared_slots_full:
+                continue  # the rest is held back for interactive work
+            key = (rank, ticket.model not in loaded, ticket.seq)
+            if best_key is None or key < best_key:
+                best, best_key = ticket, key
+        return best
+
+    # --- Metrics ---
+    def stats(self) -> dict:
+        waiting = Counter(ticket.priority for ticket in self._waiting)
+        classes = {}
+        for priority in PRIORITIES:
+            waits = sorted(self.wait_times[priority])
+            classes[priority] = {
+                "queued": waiting[priority],
+                "served": self.served[priority],
+                "wait_p50_ms": round(_percentile(waits, 0.50) * 1000, 1),
+                "wait_p95_ms": round(_percentile(waits, 0.95) * 1000, 1),
+                "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+            }
+        return {
+            "running": {model: count for model, count in self.running.items() if count},
+            "classes": classes,
+        }
@@ -0,0 +1,349 @@
+# zw_mcp/zw_schema.py
+"""Declarative schema for the ZW block types the adapter understands, and a
+streaming validator compiled from it.
+
+ZW_SCHEMA describes each block type: required keys, groups where at least one
+key must be present ("one_of"; with "inline_payload" a following `---`
+document also counts, as in .zwx files), and the expected kind of each known field. Field paths are
+relative to the block ("MATERIAL/BASE_COLOR"); "PARAMS/*" matches any key in
+PARAMS. Unknown keys and block types are allowed, since prompts keep growing new
+ones. compile_schema() turns the tables into per-depth lookup tries once, so
+checking a value is a dict lookup plus one small function call.
+
+iter_zw_errors() reads the text line by line, so validation never builds the
+tree and stops as soon as enough errors are found.
+"""
+import re
+from typing import Iterator, List, NamedTuple, Optional
+
+try:
+    from zw_parser import DOCUMENT_SEPARATORS, iter_zw_lines
+    from utils import NUMBER_PATTERN, clean_literal, parse_color, parse_number, parse_vector
+except ImportError:
+    from zw_mcp.zw_parser import DOCUMENT_SEPARATORS, iter_zw_lines
+    from zw_mcp.utils import NUMBER_PATTERN, clean_literal, parse_color, parse_number, parse_vector
+
+# Field kinds: "text", "number", "vector", "scale" (number or vector), "color", "block",
+# or a tuple of allowed values (case-insensitive)
+_TRANSFORM = {"LOCATION": "vector", "ROTATION": "vector", "SCALE": "scale", "COLLECTION": "text"}
+_MATERIAL = {
+    "MATERIAL/BASE_COLOR": "color",
+    "MATERIAL/EMISSION": "number",
+    "MATERIAL/EMISSION_COLOR": "color",
+    "MATERIAL/EMISSION_STRENGTH": "number",
+    "MATERIAL/ROUGHNESS": "number",
+    "MATERIAL/METALLIC": "number",
+}
+
+ZW_SCHEMA = {
+    "ZW-MESH": {
+        "required": ["NAME"],
+        "fields": {"NAME": "text", "TYPE": "text", "PARAMS": "block", "PARAMS/*": "number",
+                   **_TRANSFORM, **_MATERIAL},
+    },
+    "ZW-OBJECT": {
+        "fields": {"NAME": "text", "TYPE": "text", "COLOR": "color", **_TRANSFORM, **_MATERIAL},
+    },
+    "ZW-LIGHT": {
+        "fields": {"NAME": "text", "TYPE": ("POINT", "SUN", "SPOT", "AREA"), "ENERGY": "number",
+                   "COLOR": "color", "SIZE": "number", **_TRANSFORM},
+    },
+    "ZW-CAMERA": {
+        "fields": {"NAME": "text", "TYPE": ("PERSPECTIVE", "ORTHOGRAPHIC"), "FOCAL_LENGTH": "number",
+                   "SENSOR_WIDTH": "number", "SENSOR_HEIGHT": "number", "ORTHO_SCALE": "number",
+                   **_TRANSFORM},
+    },
+    "ZW-STAGE": {
+        "required": ["TRACKS"],
+        "fields": {"NAME": "text", "TRACKS": "block"},
+    },
+    "ZW-COMPOSE": {
+        "required": ["NAME"],
+        "fields": {"NAME": "text", "BASE_MODEL": "text", "ATTACHMENTS": "block", **_TRANSFORM},
+    },
+    "ZW-INTENT": {
+        "required": ["TARGET_SYSTEM"],
+        "one_of": [["ROUTE_FILE", "ZW-PAYLOAD"]],
+        "inline_payload": "---",
+        "fields": {"TARGET_SYSTEM": "text", "ROUTE_FILE": "text", "PRIORITY": "number"},
+    },
+}
+
+DEFAULT_MAX_ERRORS = 20
+
+# Top-level keys must look like block names; prose ("Here is your scene:") does not
+_BLOCK_KEY_RE = re.compile(r"^[\w-]+$")
+_COMMENT_PREFIXES = ("#", "//")
+
+
+class ZWValidationError(NamedTuple):
+    line: int
+    block: Optional[str]
+    path: str
+    message: str
+
+    def __str__(self):
+        where = ".".join(part for part in (self.block, self.path) if part)
+        return f"line {self.line}: {where}: {self.message}" if where else f"line {self.line}: {self.message}"
+
+
+# --- Value checks: return an error message, or None if the value is fine ---
+# Values arrive stripped and are nearly always clean, so the common shapes are matched
+# straight away; anything else goes through clean_literal and the full decoders
+_NUMBER_RE = re.compile(NUMBER_PATTERN)
+_N = rf"\s*{NUMBER_PATTERN}\s*"
+_VECTOR3_RE = re.compile(rf"\({_N},{_N},{_N},?\s*\)|\[{_N},{_N},{_N},?\s*\]")
+
+
+def _check_text(value: str) -> Optional[str]:
+    if value[0] not in "\"'/":
+        return None
+    return None if clean_literal(value) else "expected a non-empty value"
+
+
+def _check_number(value: str) -> Optional[str]:
+    if _NUMBER_RE.fullmatch(value) or parse_number(clean_literal(value)) is not None:
+        return None
+    return f"expected a number, got {value!r}"
+
+
+def _check_vector(value: str) -> Optional[str]:
+    if _VECTOR3_RE.fullmatch(value):
+        return None
+    vec = parse_vector(clean_literal(value))
+    return None if vec is not None and len(vec) == 3 else f"expected an (x, y, z) vector, got {value!r}"
+
+
+def _check_scale(value: str) -> Optional[str]:
+    if _NUMBER_RE.fullmatch(value) or _VECTOR3_RE.fullmatch(value):
+        return None
+    text = clean_literal(value)
+    if parse_number(text) is not None:
+        return None
+    vec = parse_vector(text)
+    return None if vec is not None and len(vec) == 3 else f"expected a number or (x, y, z) vector, got {value!r}"
+
+
+_BAD_COLOR = (-1.0, -1.0, -1.0, -1.0)
+
+
+def _check_color(value: str) -> Optional[str]:
+    ok = parse_color(clean_literal(value), default=_BAD_COLOR) is not _BAD_COLOR
+    return None if ok else f"expected a #RRGGBB[AA] or (r, g, b[, a]) color, got {value!r}"
+
+
+def _enum_check(allowed):
+    allowed_upper = frozenset(v.upper() for v in allowed)
+    expected = ", ".join(allowed)
+
+    def check(value: str) -> Optional[str]:
+        if clean_literal(value).upper() in allowed_upper:
+            return None
+        return f"expected one of {expected}, got {value!r}"
+    return check
+
+
+_KIND_CHECKS = {
+    "text": _check_text,
+    "number": _check_number,
+    "vector": _check_vector,
+    "scale": _check_scale,
+    "color": _check_color,
+}
+
+
+# --- Compilation ---
+class _Level:
+    """What is allowed directly inside one block: value checks and nested levels."""
+    __slots__ = ("checks", "children", "block_keys", "wildcard")
+
+    def __init__(self):
+        self.checks = {}         # key -> value check
+        self.children = {}       # key -> _Level for keys whose contents are checked
+        self.block_keys = set()  # keys declared as "block", which must not be plain values
+        self.wildcard = None
+
+    def prune(self) -> bool:
+        """Drops nested levels with nothing to check, so the validator skips their lines; True if empty."""
+        self.children = {key: child for key, child in self.children.items() if not child.prune()}
+        return not (self.checks or self.children or self.block_keys or self.wildcard)
+
+
+class _CompiledBlock(NamedTuple):
+    level: _Level
+    required: tuple
+    one_of: tuple
+    inline_payload: Optional[str]
+
+
+def compile_schema(schema: dict) -> dict:
+    """Compiles a ZW_SCHEMA-style table into {block type: _CompiledBlock}."""
+    compiled = {}
+    for block_type, spec in schema.items():
+        root = _Level()
+        for path, kind in spec.get("fields", {}).items():
+            *parents, key = path.split("/")
+            level = root
+            for parent in parents:
+                level = level.children.setdefault(parent, _Level())
+            if kind == "block":
+                level.children.setdefault(key, _Level())
+                level.block_keys.add(key)
+                continue
+            check = _enum_check(kind) if isinstance(kind, (tuple, list)) else _KIND_CHECKS[kind]
+            if key == "*":
+                level.wildcard = check
+            else:
+                level.checks[key] = check
+        root.prune()
+        compiled[block_type] = _CompiledBlock(
+            root, tuple(spec.get("required", ())), tuple(tuple(group) for group in spec.get("one_of", ())),
+            spec.get("inline_payload"))
+    return compiled
+
+
+COMPILED_SCHEMA = compile_schema(ZW_SCHEMA)
+
+
+# --- Streaming validation ---
+def _closing_errors(block: _CompiledBlock, block_type: str, block_line: int, seen_keys) -> tuple:
+    """(errors, errors an inline payload may still settle) for a top-level block that just closed."""
+    errors = [ZWValidationError(block_line, block_type, key, "required key is missing")
+              for key in block.required if key not in seen_keys]
+    one_of = [ZWValidationError(block_line, block_type, "", f"needs one of {', '.join(group)}")
+              for group in block.one_of if seen_keys.isdisjoint(group)]
+    if block.inline_payload:
+        return errors, one_of
+    return errors + one_of, []
+
+
+def iter_zw_errors(source, schema: Optional[dict] = None) -> Iterator[ZWValidationError]:
+    """Yields schema errors as the text streams past, in line order.
+
+    `source` is anything iter_zw_lines accepts. `///` separators are allowed.
+    Pass a compile_schema() result as `schema` to check against other rules.
+
+    This reads lines the same way iter_zw_events(documents=True) does, but
+    inline: validation is on the hot path for every prompt, and building an
+    event tuple per line cost more than the checks themselves.
+    test_zw_schema checks the two still agree on generated and mutated text.
+    """
+    compiled = COMPILED_SCHEMA if schema is None else schema
+    # One entry per open block: (indent, _Level or None, path inside the top-level block).
+    # Nothing is pushed above a None level: lines nested in it are skipped outright.
+    stack = []
+    block = None          # compiled rules of the open top-level block
+    block_type = None
+    block_line = 0
+    seen_keys = None      # keys seen directly inside the top-level block, when its rules need them
+    blocks = 0
+    # one_of errors that an inline payload after the block may still settle
+    deferred = []
+    deferred_separator = None
+    payload_started = False
+    seen_content = False
+
+    for line_number, line in enumerate(iter_zw_lines(source), 1):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if seen_content:
+            indent = len(line) - len(line.lstrip())
+        else:
+            indent = 0  # the first line counts as indent 0, as in iter_zw_events
+            seen_content = True
+
+        if stripped in DOCUMENT_SEPARATORS:
+            if stack:
+                stack.clear()
+                if block is not None:
+                    errors, deferred = _closing_errors(block, block_type, block_line, seen_keys)
+                    yield from errors
+                    deferred_separator, payload_started, block = block.inline_payload, False, None
+            if deferred:
+                if stripped == deferred_separator:
+                    payload_started = True
+                    continue
+                yield from deferred
+                deferred = []
+            continue
+        if stripped.startswith(_COMMENT_PREFIXES):
+            continue
+        if stack and stack[-1][1] is None and indent > stack[-1][0]:
+            continue  # inside a block whose contents are not checked; only its indent matters
+
+        key, _, value = stripped.partition(":")
+        key = key.strip()
+        value = value.strip()
+
+        # Close every block that this line is not nested in
+        if stack and indent <= stack[-1][0]:
+            stack.pop()
+            while stack and indent <= stack[-1][0]:
+                stack.pop()
+            if not stack and block is not None:
+                errors, deferred = _closing_errors(block, block_type, block_line, seen_keys)
+                yield from errors
+                deferred_separator, payload_started, block = block.inline_payload, False, None
+
+        if not stack:
+            if deferred:
+                if not payload_started:
+                    yield from deferred
+                deferred = []
+            blocks += 1
+            if not _BLOCK_KEY_RE.match(key):
+                yield ZWValidationError(line_number, None, "", f"not a ZW block: {key!r}")
+            if value:
+                continue
+            block_type, block_line = key, line_number
+            block = compiled.get(key)
+            if block is None:
+                stack.append((indent, None, None))
+            else:
+                seen_keys = set() if block.required or block.one_of else None
+                stack.append((indent, block.level, ""))
+            continue
+
+        _, level, path = stack[-1]
+        if seen_keys is not None and len(stack) == 1:
+            seen_keys.add(key)
+        if value:
+            check = level.checks.get(key) or level.wildcard
+            if check is not None:
+                message = check(value)
+                if message:
+                    yield ZWValidationError(line_number, block_type, path + key, message)
+            elif key in level.block_keys:
+                yield ZWValidationError(line_number, block_type, path + key, "expected a nested block")
+            continue
+
+        child = level.children.get(key)
+        if child is None and key in level.checks:
+            yield ZWValidationError(line_number, block_type, path + key, "expected a value, got a nested block")
+        stack.append((indent, child, f"{path}{key}/"))
+
+    if stack and block is not None:
+        errors, deferred = _closing_errors(block, block_type, block_line, seen_keys)
+        yield from errors
+    yield from deferred  # still here: no payload followed the separator
+    if not blocks:
+        yield ZWValidationError(1, None, "", "no ZW blocks found")
+
+
+def check_zw(source, max_errors: int = DEFAULT_MAX_ERRORS, schema: Optional[dict] = None) -> List[ZWValidationError]:
+    """Returns up to max_errors validation errors (an empty list means valid).
+
+    Stops reading the source as soon as max_errors errors have been found.
+    """
+    errors = []
+    for error in iter_zw_errors(source, schema):
+        errors.append(error)
+        if len(errors) >= max_errors:
+            break
+    return errors
+
+
+def check_zw_file(path, max_errors: int = DEFAULT_MAX_ERRORS, schema: Optional[dict] = None) -> List[ZWValidationError]:
+    with open(path, "rb") as f:
+        return check_zw(f, max_errors, schema)